@@ -0,0 +1,162 @@
+# Copyright 2014 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+:mod:`~giza.changes` supports incremental builds, i.e. ``giza sphinx --since
+<commit>``, which limit the build to the files that changed in git since
+``<commit>``, and the files affected by those changes.
+
+A :class:`~giza.changes.ChangeSet` holds the changed files, as reported by
+:meth:`~giza.libgiza.git.GitRepo.changed_files()`, and answers whether a
+source file, a content YAML file, or an image is affected. The source
+transfer, content generation, image generation, and dependency refresh
+operations consult the change set, when there is one, and skip the files that
+it does not include.
+
+Incremental builds assume that the build directory holds the output of a
+build of ``<commit>``, for example from a cached build environment.
+"""
+
+import logging
+import os.path
+
+from giza.libgiza.git import GitRepo
+
+logger = logging.getLogger('giza.changes')
+
+
+class ChangeSet(object):
+    """
+    The set of files that changed since the ``since`` commit in the git
+    repository that holds the project in ``projectroot``. Paths within the
+    source directory are recorded as ``/``-prefixed paths relative to the
+    source directory, as in the include graph
+    (:func:`~giza.includes.include_files()`).
+    """
+
+    def __init__(self, since, projectroot, source):
+        self.since = since
+        self.projectroot = projectroot
+        self.source = source
+
+        repo = GitRepo(projectroot)
+        top_level = repo.top_level()
+        self.files = set(os.path.join(top_level, fn) for fn in repo.changed_files(since))
+
+        source_dir = os.path.join(projectroot, source) + os.path.sep
+        self.source_files = set(fn[len(source_dir) - 1:] for fn in self.files
+                                if fn.startswith(source_dir))
+
+        self._content = None
+
+        logger.info('{0} files, {1} in the source, changed since {2}'.format(
+            len(self.files), len(self.source_files), since))
+
+    def relative(self, fn, conf):
+        """
+        :returns: ``fn`` as a ``/``-prefixed path relative to the source
+           directory, given a path in either the source directory or the
+           current build's copy of the source directory (``branch_source``),
+           or ``None`` for other paths.
+        """
+
+        if fn is None:
+            return None
+        elif fn.startswith('/') and not fn.startswith(conf.paths.projectroot):
+            return fn
+
+        fn = os.path.join(conf.paths.projectroot, fn)
+        for path in (conf.paths.branch_source, conf.paths.source):
+            path = os.path.join(conf.paths.projectroot, path)
+            if fn.startswith(path + os.path.sep):
+                return fn[len(path):]
+
+        return None
+
+    def content(self, conf):
+        """
+        :returns: The set of changed content YAML files, and all of the
+           content YAML files that inherit, directly or indirectly, from
+           them.
+        """
+
+        if self._content is None:
+            from giza.includes import generated_includes
+
+            inherited_by = {}
+            for fn, deps in generated_includes(conf).items():
+                for dep in deps:
+                    inherited_by.setdefault(dep, []).append(fn)
+
+            affected = set(fn for fn in self.source_files if fn.endswith('.yaml'))
+            queue = list(affected)
+            while len(queue) > 0:
+                for fn in inherited_by.get(queue.pop(), []):
+                    if fn not in affected:
+                        affected.add(fn)
+                        queue.append(fn)
+
+            self._content = affected
+            logger.debug('{0} content files affected by changes'.format(len(affected)))
+
+        return self._content
+
+    def is_changed(self, fn):
+        "Returns ``True`` if the file ``fn`` changed, given an absolute path."
+
+        return os.path.abspath(fn) in self.files
+
+    def is_affected(self, dependency, conf):
+        """
+        :returns: ``True`` if any of the files in ``dependency`` (a file name
+           or a list of file names) changed, or is content that inherits from a
+           changed file.
+        """
+
+        if not isinstance(dependency, list):
+            dependency = [dependency]
+
+        for fn in dependency:
+            if fn is None:
+                return True
+
+            rel = self.relative(fn, conf)
+            if rel is None:
+                if self.is_changed(os.path.join(conf.paths.projectroot, fn)):
+                    return True
+            elif rel in self.source_files or rel in self.content(conf):
+                return True
+
+        return False
+
+
+_change_sets = {}
+
+
+def get_change_set(conf):
+    """
+    :returns: The :class:`~giza.changes.ChangeSet` for ``conf.runstate.since``,
+       shared by all calls in this process, or ``None`` when the build is not
+       incremental.
+    """
+
+    if conf.runstate.since is None:
+        return None
+
+    key = (conf.paths.projectroot, conf.paths.source, conf.runstate.since)
+    if key not in _change_sets:
+        _change_sets[key] = ChangeSet(conf.runstate.since, conf.paths.projectroot,
+                                      conf.paths.source)
+
+    return _change_sets[key]
@@ -33,6 +33,7 @@ import giza.operations.tx
 import giza.operations.code_review
 import giza.operations.test
 import giza.operations.changelog
+import giza.operations.benchmark
 
 logger = logging.getLogger('giza.main')
 
@@ -49,6 +50,7 @@ commands = {
         giza.operations.make.main,
         giza.operations.test.integration_main,
         giza.operations.changelog.main,
+        giza.operations.benchmark.main,
     ],
     'git': [
         giza.operations.git.apply_patch,
@@ -129,6 +131,7 @@ def get_base_parser():
                         const='process', action='store_const')
     parser.add_argument('--force', '-f', default=False, action='store_true')
     parser.add_argument('--fast', action='store_true')
+    parser.add_argument('--profile', default=None, metavar='TRACE_FILE')
 
     return parser
 
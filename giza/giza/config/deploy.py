@@ -111,6 +111,30 @@ class DeployTargetConfig(giza.libgiza.config.ConfigurationBase):
             logger.critical('deployment targets must be a list')
             raise TypeError
 
+    @property
+    def parallel(self):
+        return self.state['parallel']
+
+    @parallel.setter
+    def parallel(self, value):
+        if isinstance(value, int) and value > 0:
+            self.state['parallel'] = value
+        else:
+            logger.critical('the number of parallel deployments must be a positive integer')
+            raise TypeError
+
+    @property
+    def retries(self):
+        return self.state['retries']
+
+    @retries.setter
+    def retries(self, value):
+        if isinstance(value, int) and value >= 0:
+            self.state['retries'] = value
+        else:
+            logger.critical('the number of deployment retries must be a non-negative integer')
+            raise TypeError
+
 
 class StagingTargetConfig(giza.libgiza.config.ConfigurationBase):
     """Configuration for a project's staging environment, specifying both an S3
@@ -20,6 +20,8 @@ import yaml
 
 import multiprocessing
 
+import giza.libgiza.profile
+
 from giza.libgiza.git import GitError
 from giza.libgiza.config import ConfigurationBase
 from giza.config.sphinx_config import available_sphinx_builders
@@ -29,6 +31,9 @@ import collections
 
 logger = logging.getLogger('giza.config.runtime')
 
+if sys.version_info >= (3, 0):
+    basestring = str
+
 
 class RuntimeStateConfigurationBase(ConfigurationBase):
     def __init__(self, obj=None):
@@ -251,6 +256,51 @@ class RuntimeStateConfig(RuntimeStateConfigurationBase):
         else:
             self.state['serial_sphinx'] = value
 
+    @property
+    def shared_env(self):
+        if 'shared_env' in self.state:
+            return self.state['shared_env']
+        else:
+            return False
+
+    @shared_env.setter
+    def shared_env(self, value):
+        if isinstance(value, bool):
+            self.state['shared_env'] = value
+        else:
+            raise TypeError
+
+    @property
+    def profile(self):
+        if 'profile' in self.state:
+            return self.state['profile']
+        else:
+            return None
+
+    @profile.setter
+    def profile(self, value):
+        if value is None:
+            return
+        elif isinstance(value, basestring):
+            self.state['profile'] = value
+            giza.libgiza.profile.enable_profiling(value)
+        else:
+            raise TypeError('{0} is not a file name'.format(value))
+
+    @property
+    def since(self):
+        if 'since' in self.state:
+            return self.state['since']
+        else:
+            return None
+
+    @since.setter
+    def since(self, value):
+        if value is None or isinstance(value, basestring):
+            self.state['since'] = value
+        else:
+            raise TypeError('{0} is not a git commit'.format(value))
+
     @property
     def conf_path(self):
         if 'conf_path' not in self.state:
@@ -15,8 +15,7 @@
 import logging
 import os.path
 
-import yaml
-
+from giza.libgiza.cache import get_document_cache
 from giza.libgiza.config import RecursiveConfigurationBase, ConfigurationBase
 from giza.config.sphinx_local import SphinxLocalConfig
 from giza.config.manpage import ManpageConfig
@@ -117,6 +116,58 @@ class SystemConfig(RecursiveConfigurationBase):
         else:
             self.state['dependency_cache_fn'] = value
 
+    @property
+    def task_cache(self):
+        if 'task_cache' not in self.state:
+            self.task_cache = None
+
+        return self.state['task_cache']
+
+    @task_cache.setter
+    def task_cache(self, value):
+        if value is not None:
+            self.state['task_cache'] = value
+        else:
+            self.state['task_cache'] = os.path.join(self.conf.paths.projectroot,
+                                                    self.conf.paths.branch_output,
+                                                    'task-cache.json')
+
+    @property
+    def yaml_cache(self):
+        if 'yaml_cache' not in self.state:
+            self.yaml_cache = None
+
+        return self.state['yaml_cache']
+
+    @yaml_cache.setter
+    def yaml_cache(self, value):
+        if value is not None:
+            self.state['yaml_cache'] = value
+        elif 'paths' in self.conf and 'output' in self.conf.paths:
+            # documents are cached by content, so all branches share a cache.
+            self.state['yaml_cache'] = os.path.join(self.conf.paths.projectroot,
+                                                    self.conf.paths.output,
+                                                    'yaml-cache.pickle')
+        else:
+            # without an output directory, only cache documents in memory.
+            self.state['yaml_cache'] = None
+
+    @property
+    def include_index(self):
+        if 'include_index' not in self.state:
+            self.include_index = None
+
+        return self.state['include_index']
+
+    @include_index.setter
+    def include_index(self, value):
+        if value is not None:
+            self.state['include_index'] = value
+        else:
+            self.state['include_index'] = os.path.join(self.conf.paths.projectroot,
+                                                       self.conf.paths.branch_output,
+                                                       'include-index.json')
+
     @property
     def runstate(self):
         return self.conf.runstate
@@ -388,27 +439,25 @@ class SystemConfigData(RecursiveConfigurationBase):
             }
             self._always_list_configs.extend(special_lists.keys())
 
-            with open(fn, 'r') as f:
-                if basename in self._single_document_configs:
-                    data = yaml.safe_load(f)
-                else:
-                    data = yaml.safe_load_all(f)
-
-                if basename in mapping:
-                    data = [mapping[basename](doc) for doc in data]
-                elif basename in recur_mapping:
-                    data = [recur_mapping[basename](doc, self.conf) for doc in data]
-                elif basename in special_lists:
-                    l = special_lists[basename]()
-                    l.conf = self.conf
-                    l.extend([d for d in data])
-                    data = l
-                elif basename == 'replacement':
-                    data = ReplacementData([d for d in data], self.conf)
-                    return data
-
-                if not isinstance(data, list):
-                    data = [item for item in data]
+            data = get_document_cache(self.conf.system.yaml_cache).documents(fn)
+            if basename in self._single_document_configs:
+                data = data[0] if len(data) > 0 else None
+
+            if basename in mapping:
+                data = [mapping[basename](doc) for doc in data]
+            elif basename in recur_mapping:
+                data = [recur_mapping[basename](doc, self.conf) for doc in data]
+            elif basename in special_lists:
+                l = special_lists[basename]()
+                l.conf = self.conf
+                l.extend([d for d in data])
+                data = l
+            elif basename == 'replacement':
+                data = ReplacementData([d for d in data], self.conf)
+                return data
+
+            if not isinstance(data, list):
+                data = [item for item in data]
 
             if len(data) == 1 and (basename not in self._always_list_configs):
                 return data[0]
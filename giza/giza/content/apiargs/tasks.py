@@ -15,10 +15,9 @@
 import os
 import logging
 
-from giza.libgiza.task import Task
-
 from giza.content.apiargs.inheritance import ApiArgDataCache
 from giza.content.apiargs.views import render_apiargs
+from giza.content.output import content_output_tasks
 from giza.config.content import new_content_type
 
 logger = logging.getLogger('giza.content.apiargs.tasks')
@@ -32,27 +31,17 @@ def register_apiargs(conf):
     conf.system.content.add(name='apiargs', definition=content_def)
 
 
-def write_apiargs(apiargs, fn):
-    content = render_apiargs(apiargs)
-    content.write(fn)
-    logger.debug('wrote apiarg table to: ' + fn)
-
-
 def apiarg_tasks(conf):
     a = ApiArgDataCache(conf.system.content.apiargs.sources, conf)
     a.create_output_dir()
 
-    tasks = []
+    outputs = []
     for dep_fn, apiargs in a.file_iter():
         basename = conf.system.content.steps.get_basename(dep_fn)[2:]
         out_fn = os.path.join(conf.system.content.apiargs.output_dir, basename) + '.rst'
+        outputs.append((render_apiargs, (apiargs,), out_fn, dep_fn))
 
-        t = Task(job=write_apiargs,
-                 args=(apiargs, out_fn),
-                 target=out_fn,
-                 dependency=dep_fn,
-                 description="write apiarg table for: " + dep_fn)
-        tasks.append(t)
+    tasks = content_output_tasks(outputs, conf, 'apiarg')
 
     logger.debug('added tasks for {0} apiarg table generation tasks'.format(len(tasks)))
 
@@ -118,11 +118,12 @@ def assets_tasks(conf):
                 args['commit'] = asset.commit
 
             description = "setup assets for: {0} in {1}".format(asset.repository, path)
-            tasks.append(giza.libgiza.task.Task(job=assets_setup,
+            setup_task = giza.libgiza.task.Task(job=assets_setup,
                                                 args=args,
                                                 target=path,
                                                 dependency=None,
-                                                description=description))
+                                                description=description)
+            tasks.append(setup_task)
 
             # If you specify a list of "generate" items, giza will call ``giza
             # generate`` to build content after updating the
@@ -131,11 +132,13 @@ def assets_tasks(conf):
                 for content_type in asset.generate:
                     description = 'generating objects in {0}'.format(path)
                     args = dict(cwd=path, args=['giza', 'generate', content_type])
-                    generate_tasks.append(giza.libgiza.task.Task(job=subprocess.call,
-                                                                 target=path,
-                                                                 dependency=None,
-                                                                 args=args,
-                                                                 description=description))
+                    generate_task = giza.libgiza.task.Task(job=subprocess.call,
+                                                           target=path,
+                                                           dependency=None,
+                                                           args=args,
+                                                           description=description)
+                    generate_task.requires = setup_task
+                    generate_tasks.append(generate_task)
 
     if len(generate_tasks) > 0:
         tasks.append(generate_tasks)
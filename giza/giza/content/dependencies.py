@@ -27,44 +27,147 @@ building files.
 import datetime
 import json
 import logging
+import multiprocessing.dummy
 import os
 
 import giza.libgiza.task
 
+from giza.changes import get_change_set
 from giza.includes import include_files
+from giza.libgiza.cache import stat_signature
 from giza.tools.files import expand_tree, safe_create_directory, md5_file
 from giza.tools.timing import Timer
 
 logger = logging.getLogger('giza.content.dependencies')
 
+# the dependency cache stores the stat signature (size, mtime_ns, inode) of
+# each file alongside its hash, so that files only need to be hashed again
+# when their signature changes.
+
+parallel_hash_threshold = 64
+
+
+def load_dependency_cache(fn):
+    """
+    :returns: The dependency cache stored in ``fn`` as a dict with ``files``
+       (a mapping of file names to hashes) and ``signatures`` (a mapping of file
+       names to stat signatures) fields, or ``None`` if there is no valid cache.
+    """
+
+    if not os.path.exists(fn):
+        return None
+
+    with open(fn, 'r') as f:
+        try:
+            dep_cache = json.load(f)
+        except ValueError:
+            return None
+
+    if 'files' not in dep_cache:
+        return None
+    elif 'signatures' not in dep_cache:
+        dep_cache['signatures'] = {}
+
+    return dep_cache
+
+
+def hash_files(files):
+    """
+    :returns: A list of md5 hashes for ``files``. Hashes large numbers of files
+       in a thread pool: ``hashlib`` releases the GIL while hashing.
+    """
+
+    if len(files) <= parallel_hash_threshold:
+        return [md5_file(fn) for fn in files]
+
+    pool = multiprocessing.dummy.Pool()
+    try:
+        return pool.map(md5_file, files, chunksize=16)
+    finally:
+        pool.close()
+        pool.join()
+
 # Update File Hashes
 
 
 def dump_file_hashes(conf):
     output = conf.system.dependency_cache
 
+    previous = load_dependency_cache(output)
+    if previous is None:
+        previous = {'files': {}, 'signatures': {}}
+
     o = {'time': datetime.datetime.utcnow().strftime("%s"),
-         'files': {}}
+         'files': {},
+         'signatures': {}}
 
-    files = expand_tree(os.path.join(conf.paths.projectroot, conf.paths.branch_source), None)
+    branch_source = os.path.join(conf.paths.projectroot, conf.paths.branch_source)
+    changes = get_change_set(conf)
 
     fmap = o['files']
+    smap = o['signatures']
+
+    if changes is not None and len(previous['files']) > 0:
+        # in incremental builds, only the files that changed need updating.
+        fmap.update(previous['files'])
+        smap.update(previous['signatures'])
+
+        files = []
+        for fn in changes.source_files:
+            fn = branch_source + fn
+            if os.path.isfile(fn):
+                files.append(fn)
+            else:
+                fmap.pop(fn, None)
+                smap.pop(fn, None)
+
+        # generated content isn't in the change set, but this build may have
+        # written it; files that weren't written keep their signature.
+        source = os.path.join(conf.paths.projectroot, conf.paths.source)
+        files.extend(fn for fn in expand_tree(branch_source, None)
+                     if not os.path.isfile(source + fn[len(branch_source):]))
+    else:
+        files = expand_tree(branch_source, None)
 
+    to_hash = []
     for fn in files:
-        if os.path.exists(fn):
-            fmap[fn] = md5_file(fn)
+        try:
+            signature = stat_signature(fn)
+        except OSError:
+            continue
+
+        smap[fn] = signature
+        if previous['signatures'].get(fn) == signature and fn in previous['files']:
+            fmap[fn] = previous['files'][fn]
+        else:
+            to_hash.append(fn)
+
+    for fn, digest in zip(to_hash, hash_files(to_hash)):
+        fmap[fn] = digest
 
     safe_create_directory(os.path.dirname(output))
 
     with open(output, 'w') as f:
         json.dump(o, f)
 
-    logger.debug('wrote dependency cache to: {0}'.format(output))
+    m = 'wrote dependency cache to: {0}, hashing {1} of {2} files'
+    logger.debug(m.format(output, len(to_hash), len(fmap)))
 
 # Update Dependencies
 
 
-def _refresh_deps(graph, dep_map, conf):
+def _touch_dependents(file, dependents, conf):
+    count = 0
+    for dep in [normalize_dep_path(dep, conf, branch=True) for dep in dependents]:
+        if os.path.exists(dep):
+            logger.debug('updating timestamp of "{0}" because of "{1}"'.format(dep, file))
+            os.utime(dep, None)
+            count += 1
+
+    return count
+
+
+def _refresh_deps(graph, dep_map, conf, signatures=None):
     warned = set()
     count = 0
 
@@ -72,29 +175,25 @@ def _refresh_deps(graph, dep_map, conf):
     # include it, if the file changed since the last build.
 
     for file, dependents in graph.items():
-        if check_hashed_dependency(file, dep_map, conf) is True:
-            core_file = normalize_dep_path(file, conf, False)
-            norm_file = normalize_dep_path(file, conf, True)
-
-            if os.path.isfile(norm_file) and not os.path.isfile(core_file):
-                # these are generated files in the build/<branch>/source. No
-                # need to touch these files.
-                continue
-            for dep in [normalize_dep_path(dep, conf, branch=True) for dep in dependents]:
-                if not os.path.exists(core_file):
-                    # this file doesn't exist in the source. Sphinx will
-                    # warn about this file later (though the output silently
-                    # ignores the unavailable content.)
-
-                    if core_file in warned:
-                        continue
-                    else:
-                        warned.add(core_file)
-                        logger.warning('included file does not exist: ' + core_file)
-                elif os.path.exists(dep):
-                    logger.debug('updating timestamp of "{0}" because of "{1}"'.format(dep, file))
-                    os.utime(dep, None)
-                    count += 1
+        core_file = normalize_dep_path(file, conf, False)
+        norm_file = normalize_dep_path(file, conf, True)
+
+        if os.path.isfile(norm_file) and not os.path.isfile(core_file):
+            # these are generated files in the build/<branch>/source, which
+            # change when the content generation tasks of this build write them.
+            if check_generated_dependency(norm_file, dep_map, signatures) is True:
+                count += _touch_dependents(file, dependents, conf)
+        elif check_hashed_dependency(file, dep_map, conf, signatures) is True:
+            if not os.path.exists(core_file):
+                # this file doesn't exist in the source. Sphinx will
+                # warn about this file later (though the output silently
+                # ignores the unavailable content.)
+
+                if len(dependents) > 0 and core_file not in warned:
+                    warned.add(core_file)
+                    logger.warning('included file does not exist: ' + core_file)
+            else:
+                count += _touch_dependents(file, dependents, conf)
 
     logger.debug('bumped timestamps for {0} files'.format(count))
 
@@ -105,22 +204,29 @@ def refresh_deps(conf):
         # (i.e. the ones that they include).
         graph = include_files(conf=conf)
 
-        # load, if possible, a mappping of all source files with hashes from the
-        # last build.
-        if not os.path.exists(conf.system.dependency_cache):
+        # in incremental builds, only the files that changed, and the
+        # generated files, which this build may have written, need checking.
+        changes = get_change_set(conf)
+        if changes is not None:
+            graph = dict((fn, dependents) for fn, dependents in graph.items()
+                         if fn in changes.source_files or is_generated(fn, conf))
+
+        # load, if possible, a mappping of all source files with hashes (and
+        # stat signatures) from the last build.
+        dep_cache = load_dependency_cache(conf.system.dependency_cache)
+
+        if dep_cache is None:
             dep_map = None
+            signatures = None
+            if os.path.exists(conf.system.dependency_cache):
+                m = 'no stored dependency information, will rebuild more things than necessary.'
+                logger.warning(m)
         else:
-            with open(conf.system.dependency_cache, 'r') as f:
-                try:
-                    dep_cache = json.load(f)
-                    dep_map = dep_cache['files']
-                except ValueError:
-                    dep_map = None
-                    m = 'no stored dependency information, will rebuild more things than necessary.'
-                    logger.warning(m)
+            dep_map = dep_cache['files']
+            signatures = dep_cache['signatures']
 
     with Timer('dependency updates'):
-        _refresh_deps(graph, dep_map, conf)
+        _refresh_deps(graph, dep_map, conf, signatures)
 
 # In previous versions, giza loaded the dep_map in the main thread, and then
 # passed the checks and update to a worker pool, but the pool took ~40 seconds
@@ -175,11 +281,40 @@ def normalize_dep_path(fn, conf, branch):
     return fn
 
 
-def check_hashed_dependency(fn, dep_map, conf):
+def is_generated(fn, conf):
+    """
+    :returns: ``True`` if ``fn`` is a generated file, which only exists in the
+       proxy-source directory in ``build/<branch>``.
+    """
+
+    return (os.path.isfile(normalize_dep_path(fn, conf, branch=True)) and
+            not os.path.isfile(normalize_dep_path(fn, conf, branch=False)))
+
+
+def check_generated_dependency(fn, dep_map, signatures=None):
+    """
+    :return: ``True`` when the generated file ``fn``, a fully qualified path in
+        the proxy-source directory, changed since the generation of the
+        ``dep_map``. Returns ``False`` if ``dep_map`` is ``None`` (i.e. if this
+        is the first build), because Sphinx reads all files in the first build.
+    """
+
+    if dep_map is None:
+        return False
+    elif signatures is not None and signatures.get(fn) == stat_signature(fn):
+        return False
+    else:
+        return dep_map.get(fn) != md5_file(fn)
+
+
+def check_hashed_dependency(fn, dep_map, conf, signatures=None):
     """
     :return: ``True`` when any of the files that include ``fn`` have changed since
         the generation of the the ``dep_map``. Always returns ``True`` if
         ``dep_map`` is ``None`` (i.e. if this is the first build.)
+
+    When ``signatures`` has a stat signature for ``fn`` that matches the file,
+    the file has not changed and does not need to be hashed.
     """
     # logger.info('checking dependency for: ' + fan)
 
@@ -190,7 +325,9 @@ def check_hashed_dependency(fn, dep_map, conf):
     elif not os.path.exists(fn):
         return True
     elif fn in dep_map:
-        if dep_map[fn] != md5_file(fn):
+        if signatures is not None and signatures.get(fn) == stat_signature(fn):
+            return False
+        elif dep_map[fn] != md5_file(fn):
             return True
         else:
             return False
@@ -27,6 +27,7 @@ from giza.libgiza.task import Task
 from giza.config.content import new_content_type
 from giza.content.examples.inheritance import ExampleDataCache
 from giza.content.examples.views import full_example
+from giza.content.output import content_output_tasks
 
 logger = logging.getLogger('giza.content.examples')
 
@@ -39,26 +40,17 @@ def register_examples(conf):
     conf.system.content.add(name='examples', definition=content_dfn)
 
 
-def write_full_example(collection, examples, fn):
-    content = full_example(collection, examples)
-    content.write(fn)
-
-
 def example_tasks(conf):
     d = ExampleDataCache(conf.system.content.examples.sources, conf)
     d.create_output_dir()
 
-    tasks = []
+    outputs = []
     for fn, exmpf in d.file_iter():
         out_fn = os.path.join(conf.system.content.examples.output_dir,
                               conf.system.content.examples.get_basename(fn)) + '.rst'
+        outputs.append((full_example, (exmpf.collection, exmpf.examples), out_fn, fn))
 
-        t = Task(job=write_full_example,
-                 args=(exmpf.collection, exmpf.examples, out_fn),
-                 description='generate an example for ' + fn,
-                 target=out_fn,
-                 dependency=fn)
-        tasks.append(t)
+    tasks = content_output_tasks(outputs, conf, 'example')
 
     logger.debug('added tasks for {0} example generation tasks'.format(len(tasks)))
     return tasks
@@ -16,6 +16,7 @@ import logging
 
 from giza.tools.transformation import append_to_file, prepend_to_file
 from giza.content.extract.inheritance import ExtractDataCache
+from giza.content.output import content_output_tasks
 from giza.content.extract.views import render_extracts, get_include_statement
 from giza.config.content import new_content_type
 from giza.libgiza.task import Task
@@ -31,32 +32,25 @@ def register_extracts(conf):
     conf.system.content.add(name='extracts', definition=content_dfn)
 
 
-def write_extract_file(extract, fn):
-    content = render_extracts(extract)
-    content.write(fn)
-    logger.debug('wrote extract file: ' + fn)
-
-
 def extract_tasks(conf):
     extracts = ExtractDataCache(conf.system.content.extracts.sources, conf)
     extracts.create_output_dir()
 
     tasks = []
+    outputs = []
     for dep_fn, extract in extracts.content_iter():
-        t = Task(job=write_extract_file,
-                 args=(extract, extract.target),
-                 description="generating extract file: " + extract.target,
-                 target=extract.target,
-                 dependency=dep_fn)
-        tasks.append(t)
+        outputs.append((render_extracts, (extract,), extract.target, dep_fn))
 
         include_statement = get_include_statement(extract.target_project_path)
 
         for verb, adjc, files in [(prepend_to_file, 'prepend', extract.prepend),
                                   (append_to_file, 'append', extract.append)]:
-            # have to run appends and prepends always, because the rsync that
-            # populates build/<branch>/source should and does overwrite these
-            # files on every source generation step. None in the dep list does this.
+            # have to run appends and prepends always, because the sync that
+            # populates build/<branch>/source overwrites these files on every
+            # source generation step. None in the dep list does this. In
+            # incremental builds, unchanged files aren't overwritten, and
+            # keep the include from the last build, which the append and
+            # prepend functions don't add again.
             for fn in files:
                 msg = "{} extract include for '{}' to '{}'".format(adjc, extract.target, fn)
                 t = Task(job=verb,
@@ -66,6 +60,8 @@ def extract_tasks(conf):
                          description=msg)
                 tasks.append(t)
 
+    tasks.extend(content_output_tasks(outputs, conf, 'extract'))
+
     logger.debug('added tasks for {0} extract generation tasks'.format(len(tasks)))
 
     return tasks
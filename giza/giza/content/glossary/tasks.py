@@ -19,6 +19,7 @@ from giza.libgiza.task import Task
 
 from giza.content.glossary.inheritance import GlossaryDataCache
 from giza.content.glossary.views import render_glossary
+from giza.content.output import content_output_tasks
 from giza.config.content import new_content_type
 
 logger = logging.getLogger('giza.content.extract.tasks')
@@ -32,23 +33,14 @@ def register_glossary(conf):
     conf.system.content.add(name='glossary', definition=content_dfn)
 
 
-def write_glossary(terms, fn):
-    content = render_glossary(terms)
-    content.write(fn)
-    logger.debug('wrote glossary file: ' + fn)
-
-
 def glossary_tasks(conf):
     terms = GlossaryDataCache(conf.system.content.glossary.sources, conf)
     terms.create_output_dir()
 
-    tasks = []
-    for fn, glossary_file in terms.file_iter():
-        tasks.append(Task(job=write_glossary,
-                          args=(glossary_file, glossary_file.target(fn)),
-                          description='generate glossary for: ' + fn,
-                          target=glossary_file.target(fn),
-                          dependency=fn))
+    outputs = [(render_glossary, (glossary_file,), glossary_file.target(fn), fn)
+               for fn, glossary_file in terms.file_iter()]
+
+    tasks = content_output_tasks(outputs, conf, 'glossary')
 
     logger.debug('add {0} glossary tasks'.format(len(tasks)))
     return tasks
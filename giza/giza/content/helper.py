@@ -93,3 +93,34 @@ def get_all_languages():
         all_languages.extend(lexers[1])
 
     return all_languages
+
+
+class ContentTasks(list):
+    """
+    A list of the tasks that generate one kind of content, as returned by
+    :func:`~giza.content.helper.load_content_tasks()`. Distinguishes the
+    results of content loaders from the results of other tasks that run in the
+    same :class:`~giza.libgiza.app.BuildApp()`.
+    """
+
+    pass
+
+
+def load_content_tasks(func, conf):
+    """
+    Calls a content task generator, (i.e. ``func``).
+
+    :returns: A :class:`~giza.content.helper.ContentTasks()` list of the tasks
+       that ``func`` returns.
+    """
+
+    return ContentTasks(func(conf))
+
+
+def content_task_groups(results):
+    """
+    :returns: The :class:`~giza.content.helper.ContentTasks()` lists in
+       ``results``, ignoring the results of all other tasks.
+    """
+
+    return [result for result in results if isinstance(result, ContentTasks)]
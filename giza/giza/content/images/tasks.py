@@ -21,6 +21,7 @@ import giza.libgiza.task
 
 import giza.content.images.views
 import giza.tools.files
+from giza.changes import get_change_set
 from giza.config.sphinx_config import resolve_builder_path
 
 logger = logging.getLogger('giza.content.images')
@@ -94,7 +95,17 @@ def image_tasks(conf, sconf):
 
     giza.tools.files.safe_create_directory(os.path.join(conf.paths.projectroot,
                                                         conf.paths.branch_images))
+
+    # in incremental builds, only regenerate the images that changed, unless
+    # the image definitions themselves changed.
+    changes = get_change_set(conf)
+    if changes is not None and changes.is_affected(deps, conf):
+        changes = None
+
     for image in conf.system.files.data.images:
+        if (changes is not None and os.path.isfile(image.rst_file) and
+                not changes.is_affected(image.source_core, conf)):
+            continue
 
         if not os.path.isfile(image.source_core):
             logger.error('"{0}" does not exist'.format(image.source_core))
@@ -121,6 +132,9 @@ def image_tasks(conf, sconf):
                                        target=output.output,
                                        dependency=image.source_core,
                                        description=description)
+            # the svg file is the only input, so a touched but unchanged svg
+            # file doesn't need a new rendering.
+            t.cacheable = True
             tasks.append(t)
 
             if output.type == 'target':
@@ -17,6 +17,7 @@ import logging
 
 from giza.tools.files import verbose_remove
 from giza.content.options.inheritance import OptionDataCache
+from giza.content.output import content_output_tasks
 from giza.content.options.views import render_options
 from giza.config.content import new_content_type
 from giza.libgiza.task import Task
@@ -32,17 +33,11 @@ def register_options(conf):
     conf.system.content.add(name='options', definition=content_dfn)
 
 
-def write_options(option, fn, conf):
-    content = render_options(option, conf)
-    content.write(fn)
-    logger.debug('wrote options file: ' + fn)
-
-
 def option_tasks(conf):
     o = OptionDataCache(conf.system.content.options.sources, conf)
     o.create_output_dir()
 
-    tasks = []
+    outputs = []
     for dep_fn, option in o.content_iter():
         program = option.program.replace(' ', '-')
 
@@ -55,12 +50,9 @@ def option_tasks(conf):
                                  ''.join((option.directive, '-', program,
                                           '-', option_name + '.rst')))
 
-        t = Task(job=write_options,
-                 args=(option, output_fn, conf),
-                 description='generating option file "{0}" from "{1}"'.format(output_fn, dep_fn),
-                 target=output_fn,
-                 dependency=[dep_fn])
-        tasks.append(t)
+        outputs.append((render_options, (option, conf), output_fn, dep_fn))
+
+    tasks = content_output_tasks(outputs, conf, 'option')
 
     logger.debug('added tasks for {0} option generation tasks'.format(len(tasks)))
     return tasks
@@ -0,0 +1,151 @@
+# Copyright 2014 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Writes the rendered output of the content generators (e.g. extracts, steps,
+options, and tocs).
+
+Rather than one task per output file, :func:`content_output_tasks()` groups
+the files of a content type into a small number of batch tasks. Each batch
+renders its files and, using
+:func:`~giza.tools.files.write_if_changed()`, only writes the files whose
+content changed, so that regenerating content does not update the ``mtime``
+of unchanged files, which would cause Sphinx to read those pages again.
+Because unchanged files keep their ``mtime``, each batch task's target is a
+stamp file, which the batch touches after it runs. In incremental builds
+(``--since``), only files that are missing or whose dependencies changed are
+rendered.
+"""
+
+import logging
+import os.path
+
+from giza.changes import get_change_set
+from giza.libgiza.task import Task
+from giza.tools.files import write_if_changed, safe_create_directory
+
+logger = logging.getLogger('giza.content.output')
+
+# the smallest number of files worth a separate batch task.
+min_batch_size = 32
+
+
+def render_rst(content):
+    "Returns the text of a :class:`rstcloth.rstcloth.RstCloth` object, as its ``write()`` would."
+
+    return '\n'.join(content.data) + '\n'
+
+
+def write_content_batch(batch, name, stamp=None):
+    """
+    Renders and writes a batch of content output files.
+
+    :param list batch: A list of ``(render, args, fn)`` tuples, where
+       ``render(*args)`` returns the :class:`~rstcloth.rstcloth.RstCloth`
+       object to write to ``fn``.
+
+    :param string stamp: A file to touch once all files are written.
+
+    :returns: The list of files that changed.
+    """
+
+    changed = []
+    for render, args, fn in batch:
+        if write_if_changed(fn, render_rst(render(*args))):
+            changed.append(fn)
+            logger.debug('wrote {0} file: {1}'.format(name, fn))
+
+    if len(changed) > 0:
+        logger.info('{0}: wrote {1} changed files of {2}'.format(name, len(changed), len(batch)))
+
+    if stamp is not None:
+        safe_create_directory(os.path.dirname(stamp))
+        with open(stamp, 'w'):
+            pass
+
+    return changed
+
+
+def get_stamp_fn(conf, name, idx, num_batches):
+    """
+    :returns: The stamp file of a batch. Stamp files sit in a directory next to
+       the ``build/<branch>/source`` directory, so that they aren't part of the
+       source.
+    """
+
+    return os.path.join(conf.paths.projectroot, conf.paths.branch_source + '.batches',
+                        '{0}-{1}-of-{2}'.format(name, idx, num_batches))
+
+
+def content_output_tasks(outputs, conf, name):
+    """
+    :param list outputs: A list of ``(render, args, fn, dependency)`` tuples,
+       one for each output file of a content type, where ``dependency`` is a
+       file name or a list of file names.
+
+    :param string name: The name of the content type, for messages.
+
+    :returns: A list of tasks that write the ``outputs`` in batches.
+    """
+
+    if len(outputs) == 0:
+        return []
+
+    outputs = sorted(outputs, key=lambda output: output[2])
+
+    # a fixed number of batches, from all outputs, so that batches are stable
+    # between builds.
+    num_batches = max(1, min(len(outputs) // min_batch_size, conf.runstate.pool_size * 2))
+
+    changes = get_change_set(conf)
+
+    tasks = []
+    for idx in range(num_batches):
+        batch = outputs[idx::num_batches]
+        stamp = get_stamp_fn(conf, name, idx, num_batches)
+
+        if any(not os.path.isfile(output[2]) for output in batch):
+            # the batch must run, if only to write the missing files.
+            if os.path.isfile(stamp):
+                os.remove(stamp)
+
+        if changes is not None:
+            batch = [output for output in batch
+                     if not os.path.isfile(output[2]) or changes.is_affected(output[3], conf)]
+
+            if len(batch) == 0:
+                continue
+
+        dependencies = []
+        seen = set()
+        for _, _, _, dependency in batch:
+            if not isinstance(dependency, list):
+                dependency = [dependency]
+
+            for fn in dependency:
+                if fn not in seen:
+                    seen.add(fn)
+                    dependencies.append(fn)
+
+        target = [fn for _, _, fn, _ in batch]
+
+        tasks.append(Task(job=write_content_batch,
+                          args=([(render, args, fn) for render, args, fn, _ in batch],
+                                name, stamp),
+                          target=stamp,
+                          dependency=dependencies,
+                          description='writing {0} {1} files in {2}'.format(
+                              len(batch), name, os.path.dirname(target[0]))))
+
+    return tasks
@@ -17,103 +17,130 @@ Post-process all output produced by JSON to add a "text" field to these
 documents that omits the XML data injected into this format by default so that
 search tools can use this data to index content. Also generates a file with a
 list of paths in the output.
+
+Documents are processed in batches, one task per batch rather than per
+document, and written directly to the public staging directory. Each batch
+records the signature and digest of the documents it processed, so that
+documents whose content did not change since the last build are not
+processed again. The records of all batches are loaded once, before the
+batches run, and each record carries the generation (i.e. build) that wrote
+it, so that the newest record of each document wins.
 """
 
+import glob
 import json
 import logging
 import os
 import re
-import subprocess
 
 import giza.libgiza.task
 
+from giza.libgiza.cache import stat_signature, digest_file
 from giza.tools.files import expand_tree, copy_if_needed, safe_create_directory
-from giza.tools.transformation import munge_content
+from giza.tools.sync import sync_tree
+from giza.tools.transformation import munge_content, CombinedSubstitution
 
 logger = logging.getLogger('giza.content.post.json_output')
 
-# Process Sphinx Json Output
-
+# the smallest number of documents worth a separate batch task.
+min_batch_size = 64
+
+# ``<[^>]*>`` removes all tags, including ``<a class="headerlink"...>``, so
+# these substitutions apply in a single pass.
+json_substitutions = CombinedSubstitution([
+    (re.compile(r'<[^>]*>'), ''),
+    (re.compile(r'&#8220;'), '"'),
+    (re.compile(r'&#8221;'), '"'),
+    (re.compile(r'&#8216;'), "'"),
+    (re.compile(r'&#8217;'), "'"),
+    (re.compile(r'&#\d{4};'), ''),
+    (re.compile(r'&nbsp;'), ''),
+    (re.compile(r'&gt;'), '>'),
+    (re.compile(r'&lt;'), '<')
+])
 
-def json_output(conf):
-    list_file = os.path.join(conf.paths.branch_output, 'json-file-list')
-    public_list_file = os.path.join(conf.paths.projectroot,
-                                    conf.paths.public_site_output,
-                                    'json', '.file_list')
-
-    cmd = ('rsync --recursive --times --delete '
-           '--exclude="*pickle" --exclude=".buildinfo" --exclude="*fjson" '
-           '{src} {dst}')
+# Process Sphinx Json Output
 
-    json_dst = os.path.join(conf.paths.projectroot, conf.paths.public_site_output, 'json')
-    safe_create_directory(json_dst)
 
+def get_json_builder(conf):
     builder = 'json'
     if 'edition' in conf.project and conf.project.edition != conf.project.name:
         builder += '-' + conf.project.edition
 
-    cmd_str = cmd.format(src=os.path.join(conf.paths.projectroot,
-                                          conf.paths.branch_output, builder) + '/',
-                         dst=json_dst)
+    return builder
 
-    try:
-        subprocess.check_call(cmd_str.split())
-        copy_if_needed(list_file, public_list_file)
-        logger.info('deployed json files to local staging.')
-    except subprocess.CalledProcessError:
-        logger.error('error migrating json artifacts to local staging')
 
+def get_json_staging_dir(conf):
+    return os.path.join(conf.paths.projectroot, conf.paths.public_site_output, 'json')
 
-def json_output_tasks(conf):
-    regexes = [
-        (re.compile(r'<a class=\"headerlink\"'), '<a'),
-        (re.compile(r'<[^>]*>'), ''),
-        (re.compile(r'&#8220;'), '"'),
-        (re.compile(r'&#8221;'), '"'),
-        (re.compile(r'&#8216;'), "'"),
-        (re.compile(r'&#8217;'), "'"),
-        (re.compile(r'&#\d{4};'), ''),
-        (re.compile(r'&nbsp;'), ''),
-        (re.compile(r'&gt;'), '>'),
-        (re.compile(r'&lt;'), '<')
-    ]
-
-    outputs = []
 
-    tasks = []
+def json_output(pages, conf):
+    """
+    Migrates all of the JSON builder's output to the public staging directory,
+    except for the processed documents, which the batch tasks write directly.
+    """
+
+    list_file = os.path.join(conf.paths.branch_output, 'json-file-list')
+    json_dst = get_json_staging_dir(conf)
+    public_list_file = os.path.join(json_dst, '.file_list')
+
+    protected = set(output for _, output in pages)
+    protected.add('.file_list')
+
+    sync_tree(os.path.join(conf.paths.projectroot, conf.paths.branch_output,
+                           get_json_builder(conf)),
+              json_dst,
+              exclusions=['*pickle', '.buildinfo', '*fjson'],
+              protected=protected)
+
+    copy_if_needed(list_file, public_list_file)
+    logger.info('deployed json files to local staging.')
+
+
+def json_output_tasks(conf):
+    pages = []
+    builder_dir = os.path.join(conf.paths.branch_output, get_json_builder(conf))
 
     for fn in expand_tree('source', 'txt'):
-        # path = build/<branch>/json/<filename>
+        # input = build/<branch>/json/<filename>.fjson
+        # output = <public>/json/<filename>.json
+        name = os.path.splitext(fn.split(os.path.sep, 1)[1])[0]
 
-        if 'edition' in conf.project and conf.project.edition != conf.project.name:
-            path = os.path.join(conf.paths.branch_output,
-                                'json-' + conf.project.edition,
-                                os.path.splitext(fn.split(os.path.sep, 1)[1])[0])
+        pages.append((os.path.join(builder_dir, name + '.fjson'), name + '.json'))
 
-        else:
-            path = os.path.join(conf.paths.branch_output,
-                                'json', os.path.splitext(fn.split(os.path.sep, 1)[1])[0])
+    json_dst = get_json_staging_dir(conf)
+    cache_dir = os.path.join(conf.paths.projectroot, conf.paths.branch_output,
+                             get_json_builder(conf) + '-cache')
+
+    # a fixed number of batches, so that batches are stable between builds.
+    num_batches = max(1, min(len(pages) // min_batch_size, conf.runstate.pool_size * 2))
 
-        fjson = path + '.fjson'
-        jsonf = path + '.json'
+    previous, generation = load_json_cache(cache_dir, '/'.join(get_site_url(conf)))
+    remove_json_cache(cache_dir, num_batches)
 
-        task = giza.libgiza.task.Task(job=process_json_file,
-                                      args=(fjson, jsonf, regexes, conf),
-                                      target=jsonf,
-                                      dependency=fjson,
-                                      description="processing json file {}".format(json))
+    tasks = []
+    for idx in range(num_batches):
+        batch = [(input_fn, os.path.join(json_dst, output))
+                 for input_fn, output in pages[idx::num_batches]]
+        records = dict((input_fn, previous[input_fn])
+                       for input_fn, _ in batch if input_fn in previous)
+
+        task = giza.libgiza.task.Task(job=process_json_batch,
+                                      args=(batch, records, cache_dir, idx, generation, conf),
+                                      target=True,
+                                      dependency=None,
+                                      description="processing json batch {0}".format(idx))
         tasks.append(task)
-        outputs.append(jsonf)
 
     list_file = os.path.join(conf.paths.branch_output, 'json-file-list')
     tasks.append(giza.libgiza.task.Task(job=generate_list_file,
-                                        args=(outputs, list_file, conf),
+                                        args=(pages, list_file, conf),
                                         target=list_file,
                                         dependency=None,
                                         description="generating list of json files"))
 
     transfer = giza.libgiza.task.Task(job=json_output,
-                                      args=[conf],
+                                      args=[pages, conf],
                                       target=True,
                                       dependency=None,
                                       description='transfer json output to public directory')
@@ -121,6 +148,122 @@ def json_output_tasks(conf):
     return tasks, transfer
 
 
+def json_cache_fragments(cache_dir):
+    """
+    :returns: A list of ``(idx, fn)`` pairs for the record file of each batch
+       in ``cache_dir``, ordered by batch number.
+    """
+
+    fragments = []
+
+    for fn in glob.glob(os.path.join(cache_dir, 'batch-*.json')):
+        idx = os.path.basename(fn)[6:-5]
+        if idx.isdigit():
+            fragments.append((int(idx), fn))
+
+    fragments.sort()
+    return fragments
+
+
+def load_json_cache(cache_dir, url):
+    """
+    :returns: A tuple of a dictionary that maps input files to their signature
+       and digest when they were last processed, merged from every batch's
+       record, and the generation number for the current build.
+    """
+
+    fragments = []
+
+    for idx, fn in json_cache_fragments(cache_dir):
+        with open(fn, 'r') as f:
+            try:
+                data = json.load(f)
+            except ValueError:
+                continue
+
+        if data.get('url') == url:
+            fragments.append((data.get('generation', 0), idx, data['files']))
+
+    # when the number of batches changes, or a build fails part way through,
+    # a document may have records from more than one build: the newest one
+    # reflects the document's current output.
+    fragments.sort(key=lambda fragment: fragment[:2])
+
+    records = {}
+    for _, _, files in fragments:
+        records.update(files)
+
+    if len(fragments) == 0:
+        generation = 1
+    else:
+        generation = fragments[-1][0] + 1
+
+    return records, generation
+
+
+def remove_json_cache(cache_dir, num_batches):
+    "Removes the records of batches numbered ``num_batches`` and higher."
+
+    for idx, fn in json_cache_fragments(cache_dir):
+        if idx >= num_batches:
+            os.remove(fn)
+
+
+def dump_json_cache(cache_dir, idx, url, generation, records):
+    safe_create_directory(cache_dir)
+    fn = os.path.join(cache_dir, 'batch-{0}.json'.format(idx))
+
+    with open(fn + '.tmp', 'w') as f:
+        json.dump({'url': url, 'generation': generation, 'files': records}, f)
+    os.rename(fn + '.tmp', fn)
+
+
+def process_json_batch(batch, previous, cache_dir, idx, generation, conf):
+    """
+    Processes a list of ``(input_fn, output_fn)`` pairs, skipping inputs that
+    are identical to the last time they were processed, according to the
+    ``previous`` records from :func:`~giza.content.post.json_output.load_json_cache()`.
+
+    :returns: The number of documents processed.
+    """
+
+    url = '/'.join(get_site_url(conf))
+    records = {}
+    count = 0
+
+    for input_fn, output_fn in batch:
+        if os.path.isfile(input_fn) is False:
+            continue
+
+        signature = stat_signature(input_fn)
+        record = previous.get(input_fn)
+
+        if os.path.isfile(output_fn) and record is not None:
+            if record[0] == signature:
+                records[input_fn] = record
+                continue
+
+            digest = digest_file(input_fn)
+            if record[1] == digest:
+                records[input_fn] = [signature, digest]
+                continue
+        else:
+            digest = digest_file(input_fn)
+
+        process_json_file(input_fn, output_fn, json_substitutions, conf)
+        records[input_fn] = [signature, digest]
+        count += 1
+
+    dump_json_cache(cache_dir, idx, url, generation, records)
+    logger.debug('processed {0} of {1} json files in batch {2}'.format(count, len(batch), idx))
+
+    return count
+
+
+def to_ascii(text):
+    return text.encode('ascii', 'ignore').decode('ascii')
+
+
 def process_json_file(input_fn, output_fn, regexes, conf=None):
     if os.path.isfile(input_fn) is False:
         return False
@@ -131,13 +274,13 @@ def process_json_file(input_fn, output_fn, regexes, conf=None):
     doc = json.loads(document)
 
     if 'body' in doc:
-        text = doc['body'].encode('ascii', 'ignore')
+        text = to_ascii(doc['body'])
         text = munge_content(text, regexes)
 
         doc['text'] = ' '.join(text.split('\n')).strip()
 
     if 'title' in doc:
-        title = doc['title'].encode('ascii', 'ignore')
+        title = to_ascii(doc['title'])
         title = munge_content(title, regexes)
 
         doc['title'] = title
@@ -146,13 +289,17 @@ def process_json_file(input_fn, output_fn, regexes, conf=None):
     url.extend(input_fn.rsplit('.', 1)[0].split(os.path.sep)[3:])
     doc['url'] = '/'.join(url) + '/'
 
+    dirname = os.path.dirname(output_fn)
+    if not os.path.isdir(dirname):
+        safe_create_directory(dirname)
+
     with open(output_fn, 'w') as f:
         f.write(json.dumps(doc))
 
     return True
 
 
-def generate_list_file(outputs, path, conf):
+def generate_list_file(pages, path, conf):
     dirname = os.path.dirname(path)
     safe_create_directory(dirname)
 
@@ -161,9 +308,9 @@ def generate_list_file(outputs, path, conf):
     url = '/'.join(url)
 
     with open(path, 'w') as f:
-        for fn in outputs:
-            if os.path.isfile(fn) is True:
-                line = '/'.join([url, fn.split('/', 3)[3:][0]])
+        for input_fn, output in pages:
+            if os.path.isfile(input_fn) is True:
+                line = '/'.join([url, output])
                 f.write(line)
                 f.write('\n')
 
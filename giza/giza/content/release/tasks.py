@@ -15,6 +15,7 @@
 import logging
 import shutil
 
+from giza.content.output import content_output_tasks
 from giza.content.release.inheritance import ReleaseDataCache
 from giza.content.release.views import render_releases
 from giza.config.content import new_content_type
@@ -31,24 +32,14 @@ def register_releases(conf):
     conf.system.content.add(name='releases', definition=content_dfn)
 
 
-def write_release_file(release, fn, conf):
-    content = render_releases(release, conf)
-    content.write(fn)
-    logger.debug('wrote release content: ' + fn)
-
-
 def release_tasks(conf):
     rel = ReleaseDataCache(conf.system.content.releases.sources, conf)
     rel.create_output_dir()
 
-    tasks = []
-    for dep_fn, release in rel.content_iter():
-        t = Task(job=write_release_file,
-                 args=(release, release.target, conf),
-                 description='generating release spec file: ' + release.target,
-                 target=release.target,
-                 dependency=dep_fn)
-        tasks.append(t)
+    outputs = [(render_releases, (release, conf), release.target, dep_fn)
+               for dep_fn, release in rel.content_iter()]
+
+    tasks = content_output_tasks(outputs, conf, 'release')
 
     logger.debug('added tasks for {0} release generation tasks'.format(len(tasks)))
     return tasks
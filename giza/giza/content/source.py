@@ -27,19 +27,24 @@ make it possible to:
 - have different versions of the source tree for different editions of the
   content (i.e. by redacting files or modifying the source,)
 
-At the center of this operation is an ``rsync`` operation that uses check-summing
-rather than timestampping to compare source and destination files.
+At the center of this operation is :func:`~giza.tools.sync.sync_tree()`, which
+compares source and destination files by content rather than by timestamp, and
+persists a manifest of file signatures and digests next to each proxy-source
+directory so that unchanged files are not re-read on every build. In
+incremental builds (``--since``), only the files that changed in git are
+synchronized, with :func:`~giza.tools.sync.sync_paths()`.
 """
 
 import os.path
 import logging
-import shutil
 import shlex
 import subprocess
 
 import giza.libgiza.task
 
+from giza.changes import get_change_set
 from giza.tools.files import InvalidFile, safe_create_directory
+from giza.tools.sync import sync_tree, sync_paths
 
 logger = logging.getLogger('giza.content.source')
 
@@ -73,46 +78,33 @@ def transfer_source(conf, sconf):
     exclusions.extend([o for o in conf.system.content.output_directories(prefix_len)
                        if o != "includes/changelogs"])
 
-    # we don't want rsync to delete directories that hold generated content in
-    # the target so we can have more incremental builds.
-    exclusions = "--exclude=" + ' --exclude='.join(exclusions)
-
-    cmd = 'rsync --links --checksum --recursive {2} --delete {0}/ {1}'
-    cmd = cmd.format(source_dir, target, exclusions)
-
-    try:
-        subprocess.check_call(shlex.split(cmd))
-    except subprocess.CalledProcessError as e:
-        logger.error('source transfer rsync had error: ' + str(e.returncode))
-        logger.info(cmd)
-
-    # remove files from the source tree specified in the sphinx config for this
-    # build.
-    source_exclusion(conf, sconf)
+    manifest = target.rstrip(os.path.sep) + '.sync.json'
+    changes = get_change_set(conf)
+
+    # excluded directories hold generated content in the target, and are not
+    # deleted, so we can have more incremental builds. Files excluded in the
+    # sphinx config for this build are never copied.
+    if changes is not None and os.path.isfile(manifest):
+        # the target holds a complete copy of the source from an earlier build.
+        stats = sync_paths(source_dir, target, changes.source_files,
+                           exclusions=exclusions,
+                           redactions=sconf.excluded)
+    else:
+        stats = sync_tree(source_dir, target,
+                          exclusions=exclusions,
+                          redactions=sconf.excluded,
+                          manifest=manifest)
+
+    if len(sconf.excluded) > 0:
+        logger.info('redacted {0} files'.format(len(sconf.excluded)))
+
+    logger.debug('source transfer copied {0} and removed {1} files'.format(stats['copied'],
+                                                                           stats['removed']))
     os.utime(target, None)
 
     logger.info('prepared and migrated source for sphinx build in {0}'.format(target))
 
 
-def source_exclusion(conf, sconf):
-    ct = 0
-    if len(sconf.excluded) == 0:
-        return
-
-    for fn in sconf.excluded:
-        fqfn = os.path.join(conf.paths.projectroot, conf.paths.branch_source, fn[1:])
-        if os.path.isdir(fqfn):
-            shutil.rmtree(fqfn)
-            ct += 1
-        elif os.path.isfile(fqfn):
-            os.remove(fqfn)
-            ct += 1
-            logger.debug('redacted {0}'.format(fqfn))
-        else:
-            logger.warning('cannot redact non-existing file: ' + fqfn)
-
-    logger.info('redacted {0} files'.format(ct))
-
 # Transfer Images
 
 # transfer all ``.eps`` images to the latex build directory because to generate
@@ -17,11 +17,19 @@ Responsible for converting the Sphinx configuration stored by projects and used
 by giza, into a ``sphinx-build`` invocation. See
 :func:`giza.content.sphinx.run_sphinx` for the core of this operation.
 
+In "shared environment" mode (i.e. ``giza sphinx --shared_env``), giza runs
+Sphinx in the main process rather than as a subprocess (see
+:func:`giza.content.sphinx.run_sphinx_in_process()` and
+:func:`giza.content.sphinx.in_process_builder_app()`), and builders that use
+the same source tree start from a copy of the environment and doctrees of the
+first builder, so that the source is only parsed once.
+
 :mod:`giza.content.sphinx` also contains:
 
 - the error message processing, which normalizes references to paths,
   deduplicates log messages given multiple builds or multi-process Sphinx
-  operation, and removes non-actionable messages. See
+  operation, and removes non-actionable messages, as ``sphinx-build`` produces
+  them. See :class:`giza.content.sphinx.SphinxOutputFilter()`,
   :func:`giza.content.sphinx.output_sphinx_stream()`,
   :func:`giza.content.sphinx.is_msg_worth()` and
   :func:`giza.content.sphinx.path_normalization()`.
@@ -32,6 +40,7 @@ by giza, into a ``sphinx-build`` invocation. See
 
 import collections
 import logging
+import multiprocessing
 import os.path
 import pkg_resources
 import re
@@ -39,8 +48,13 @@ import numbers
 import subprocess
 import shlex
 
+import sphinx.application
+import sphinx.util.console
+
+from giza.libgiza.pool import SerialPool
 from giza.libgiza.task import Task
 from giza.tools.files import safe_create_directory, expand_tree
+from giza.tools.sync import sync_tree
 from giza.tools.timing import Timer
 
 logger = logging.getLogger('giza.content.sphinx')
@@ -52,7 +66,7 @@ def is_parallel_sphinx(version):
     return version >= '1.2'
 
 
-def get_tags(target, sconf):
+def get_tag_list(target, sconf):
     if 'tags' in sconf:
         ret = set(sconf.tags)
     else:
@@ -69,9 +83,83 @@ def get_tags(target, sconf):
     if 'edition' in sconf:
         ret.add(sconf.edition)
 
+    return [i for i in ret if i is not None]
+
+
+def get_tags(target, sconf):
     return ' '.join([' '.join(['-t', i])
-                     for i in ret
-                     if i is not None])
+                     for i in get_tag_list(target, sconf)])
+
+
+def get_sphinx_workers(sconf, conf):
+    """
+    :returns: The number of parallel processes that Sphinx should use to read
+       and write the build for ``sconf``, or ``0`` for a serial build.
+    """
+
+    n_workers = min(conf.runstate.pool_size, 4)
+
+    if not is_parallel_sphinx(pkg_resources.get_distribution("sphinx").version):
+        return 0
+
+    if 'serial_sphinx' in conf.runstate:
+        m = 'running with serial sphinx processes ({0}.{1}.{2}.{3})'
+        logger.debug(m.format(sconf.builder, conf.project.name,
+                              conf.project.edition, conf.git.branches.current))
+        if conf.runstate.serial_sphinx == "publish":
+            if ((len(conf.runstate.builder) >= 1 or 'publish' in conf.runstate.builder) or
+                    len(conf.runstate.languages_to_build) >= 1 or
+                    len(conf.runstate.editions_to_build) >= 1):
+                return 0
+            else:
+                return n_workers
+        elif conf.runstate.serial_sphinx is False:
+            logger.debug('running with parallelized sphinx processes')
+            return n_workers
+        elif (isinstance(conf.runstate.serial_sphinx, numbers.Number) and
+              conf.runstate.serial_sphinx > 1):
+            logger.debug('running with parallelized sphinx processes')
+            return n_workers
+        else:
+            return 0
+    elif len(conf.runstate.builder) >= conf.runstate.pool_size:
+        logger.debug('running with serial sphinx processes')
+        return 0
+    else:
+        logger.debug('running with parallelized sphinx processes')
+        return n_workers
+
+
+def get_in_process_workers(sconf, conf):
+    """
+    :returns: The number of parallel processes for an in-process Sphinx build
+       of ``sconf``, or ``None`` if the build must run in a ``sphinx-build``
+       subprocess instead: parallel Sphinx builds start processes, which
+       daemonic processes (i.e. pool workers) cannot do.
+    """
+
+    n_workers = get_sphinx_workers(sconf, conf)
+
+    if n_workers > 1 and multiprocessing.current_process().daemon is True:
+        return None
+    else:
+        return n_workers
+
+
+def in_process_builder_app(app):
+    """
+    :returns: A sub-app of ``app`` for in-process Sphinx builds. The sub-app
+       runs its tasks one at a time in the main process, because Sphinx is not
+       thread safe, and parallel Sphinx builds start worker processes, which
+       pool workers cannot do. Each build uses
+       :func:`~giza.content.sphinx.get_sphinx_workers()` processes.
+    """
+
+    builder_app = app.add('app')
+    builder_app.scheduler = 'graph'
+    builder_app.pool = SerialPool()
+
+    return builder_app
 
 
 def get_sphinx_args(sconf, conf):
@@ -81,35 +169,10 @@ def get_sphinx_args(sconf, conf):
     o.append('-q')
 
     o.append('-b {0}'.format(sconf.builder))
-    n_workers = str(min(conf.runstate.pool_size, 4))
-
-    if is_parallel_sphinx(pkg_resources.get_distribution("sphinx").version):
-        if 'serial_sphinx' in conf.runstate:
-            m = 'running with serial sphinx processes ({0}.{1}.{2}.{3})'
-            logger.debug(m.format(sconf.builder, conf.project.name,
-                                 conf.project.edition, conf.git.branches.current))
-            if conf.runstate.serial_sphinx == "publish":
-                if ((len(conf.runstate.builder) >= 1 or 'publish' in conf.runstate.builder) or
-                        len(conf.runstate.languages_to_build) >= 1 or
-                        len(conf.runstate.editions_to_build) >= 1):
-                    pass
-                else:
-                    o.append(' '.join(['-j', n_workers]))
-            elif conf.runstate.serial_sphinx is False:
-                logger.debug('running with parallelized sphinx processes')
-                o.append(' '.join(['-j', n_workers]))
-            elif (isinstance(conf.runstate.serial_sphinx, numbers.Number) and
-                  conf.runstate.serial_sphinx > 1):
-                logger.debug('running with parallelized sphinx processes')
-                o.append(' '.join(['-j', n_workers]))
-            else:
-                pass
-        elif len(conf.runstate.builder) >= conf.runstate.pool_size:
-            logger.debug('running with serial sphinx processes')
-            pass
-        else:
-            logger.debug('running with parallelized sphinx processes')
-            o.append(' '.join(['-j', n_workers]))
+
+    n_workers = get_sphinx_workers(sconf, conf)
+    if n_workers > 0:
+        o.append(' '.join(['-j', str(n_workers)]))
 
     o.append(' '.join(['-c', conf.paths.projectroot]))
 
@@ -118,51 +181,125 @@ def get_sphinx_args(sconf, conf):
 
     return ' '.join(o)
 
-# Output Management
 
+def get_doctree_dir(sconf, conf):
+    # per-builder doctrees
+    return os.path.join(conf.paths.projectroot, conf.paths.branch_output,
+                        '-'.join(('doctrees', sconf.build_output)))
+
+# Output Management
 
-def output_sphinx_stream(out, conf):
-    full_path = os.path.join(conf.paths.projectroot, conf.paths.branch_output)
 
-    regx = r'(.*):[0-9]+: WARNING: duplicate object description of ".*", other instance in (.*)'
-    regx = re.compile(regx)
+class SphinxOutputFilter(object):
+    """
+    Processes ``sphinx-build`` output one line at a time: removes
+    non-actionable messages, normalizes paths, and de-duplicates messages, so
+    that the output of a build never needs to be held in memory in full.
+
+    Instances are also file-like, so Sphinx can write its warnings directly
+    to a filter. If ``builder`` is specified, errors are logged as soon as
+    they're written, rather than when all builds complete.
+    """
+
+    duplicate_regex = re.compile(r'(.*):[0-9]+: WARNING: duplicate object description '
+                                 r'of ".*", other instance in (.*)')
+
+    def __init__(self, conf, builder=None):
+        self.conf = conf
+        self.builder = builder
+        self.buffer = ''
+        self.full_path = os.path.join(conf.paths.projectroot, conf.paths.branch_output)
+        self.messages = collections.OrderedDict()
+        self.last = None
+        self.count = 0
+        self.warnings = 0
+        self.errors = 0
+
+    def process(self, l):
+        """
+        :returns: The normalized form of the line, ``l``, if this is the first
+           time the message has appeared in the output, and ``None`` otherwise.
+        """
+
+        self.count += 1
+        l = l.rstrip('\n')
 
-    printable = []
-    for idx, l in enumerate(out):
         if is_msg_worthy(l) is False:
-            printable.append(None)
-            continue
+            return None
 
-        f1 = regx.match(l)
+        f1 = self.duplicate_regex.match(l)
         if f1 is not None:
             g = f1.groups()
 
             if g[1].endswith(g[0]):
-                printable.append(None)
-                continue
+                return None
 
-        l = path_normalization(l, full_path, conf)
+        l = path_normalization(l, self.full_path, self.conf)
 
         if l.startswith('InputError: [Errno 2] No such file or directory'):
             try:
-                l = path_normalization(l.split(' ')[-1].strip()[1:-2], full_path, conf)
-                printable[idx - 1] += ' ' + l
-                l = None
+                fn = path_normalization(l.split(' ')[-1].strip()[1:-2], self.full_path, self.conf)
             except IndexError:
                 logger.error("error processing log: {0}".format(l))
-                continue
+                return None
+
+            if self.last is None:
+                return None
+
+            # the missing file belongs to the previous message.
+            del self.messages[self.last]
+            l = ' '.join((self.last, fn))
         elif l.startswith('source/includes/generated/overview.rst'):
-            continue
+            return None
         elif l.startswith('source/meta/includes.txt'):
-            continue
+            return None
+        elif l in self.messages:
+            return None
+
+        self.messages[l] = None
+        self.last = l
+
+        if 'WARNING: ' in l:
+            self.warnings += 1
+        elif 'ERROR: ' in l or 'SEVERE: ' in l:
+            self.errors += 1
+
+        return l
+
+    def extend(self, lines):
+        for l in lines:
+            self.process(l)
+
+    def report(self, l):
+        if l is None or self.builder is None:
+            return
+        elif 'ERROR: ' in l or 'SEVERE: ' in l:
+            logger.error('{0}: {1}'.format(self.builder, l), extra={'lean': True})
+
+    def write(self, text):
+        lines = (self.buffer + text).split('\n')
+        self.buffer = lines.pop()
 
-        printable.append(l)
+        for l in lines:
+            self.report(self.process(l))
 
-    printable = stable_deduplicate(printable)
+    def flush(self):
+        if self.buffer != '':
+            self.report(self.process(self.buffer))
+            self.buffer = ''
+
+    @property
+    def lines(self):
+        return list(self.messages.keys())
+
+
+def output_sphinx_stream(out, conf):
+    output = SphinxOutputFilter(conf)
+    output.extend(out)
 
     m = 'sphinx builder has {0} lines of output, processed from {1}'
-    logger.info(m.format(len(printable), len(out)))
-    print_build_messages(printable)
+    logger.info(m.format(len(output.messages), output.count))
+    print_build_messages(output.lines)
 
 
 def stable_deduplicate(lines):
@@ -230,7 +367,7 @@ def is_msg_worthy(l):
 # Builder Operation
 
 
-def run_sphinx(builder, sconf, conf):
+def prepare_sphinx_build(builder, sconf):
     if safe_create_directory(sconf.fq_build_output):
         m = 'created directory "{1}" for sphinx builder {0}'
         logger.debug(m.format(builder, sconf.fq_build_output))
@@ -244,41 +381,122 @@ def run_sphinx(builder, sconf, conf):
             logger.error('sphinx-intl encountered error: ' + str(e.returncode))
             logger.info(cmd_str)
 
-    cmd = 'sphinx-build {0} -d {1}/doctrees-{2} {3} {4}'  # per-builder-doctree
+
+def complete_sphinx_build(builder, sconf, conf, return_code, output):
+    try:
+        os.utime(sconf.fq_build_output, None)
+    except:
+        pass
+
+    m = 'completed {0} sphinx build for {1}.{2}.{3} ({4}, {5} warnings, {6} errors)'
+
+    logger.info(m.format(builder, conf.project.name, conf.project.edition,
+                         conf.git.branches.current, return_code,
+                         output.warnings, output.errors))
+
+    return return_code, output.lines
+
+
+def run_sphinx(builder, sconf, conf):
+    prepare_sphinx_build(builder, sconf)
+
+    cmd = 'sphinx-build {0} -d {1} {2} {3}'
 
     sphinx_cmd = cmd.format(get_sphinx_args(sconf, conf),
-                            os.path.join(conf.paths.projectroot, conf.paths.branch_output),
-                            sconf.build_output,
+                            get_doctree_dir(sconf, conf),
                             os.path.join(conf.paths.projectroot, conf.paths.branch_source),
                             sconf.fq_build_output)
 
     logger.info('Starting sphinx build: ' + sphinx_cmd)
     m = "running sphinx build for: {0}, {1}, {2}"
 
+    output = SphinxOutputFilter(conf, builder)
+
     with Timer(m.format(builder, sconf.language, sconf.edition)):
-        try:
-            output = subprocess.check_output(shlex.split(sphinx_cmd), stderr=subprocess.STDOUT)
-            return_code = 0
-        except subprocess.CalledProcessError as e:
-            output = e.output
-            return_code = e.returncode
+        sphinx_process = subprocess.Popen(shlex.split(sphinx_cmd),
+                                          stdout=subprocess.PIPE,
+                                          stderr=subprocess.STDOUT,
+                                          universal_newlines=True)
+
+        # report errors as they happen, rather than when all builds complete;
+        # the full, de-duplicated output is still reported after the build.
+        for line in iter(sphinx_process.stdout.readline, ''):
+            output.write(line)
+
+        output.flush()
+        sphinx_process.stdout.close()
+        return_code = sphinx_process.wait()
+
+        if return_code != 0:
             logger.info(sphinx_cmd)
-    try:
-        os.utime(sconf.fq_build_output, None)
-    except:
-        pass
 
-    m = 'completed {0} sphinx build for {1}.{2}.{3} ({4})'
+    return complete_sphinx_build(builder, sconf, conf, return_code, output)
 
-    logger.info(m.format(builder, conf.project.name, conf.project.edition,
-                         conf.git.branches.current, return_code))
 
-    return return_code, output
+def run_sphinx_in_process(builder, sconf, conf, env_source=None):
+    """
+    Runs a Sphinx build in the current process, rather than in a
+    ``sphinx-build`` subprocess.
+
+    :param string env_source: The doctree directory of another build of the
+       same source tree. When specified, the build starts with a copy of that
+       build's parsed environment and doctrees, so that Sphinx only re-reads
+       files that are out of date for this build.
+    """
+
+    doctree_dir = get_doctree_dir(sconf, conf)
+    if env_source is not None and os.path.isdir(env_source):
+        stats = sync_tree(env_source, doctree_dir, manifest=doctree_dir + '.sync.json')
+        logger.debug('copied {0} environment files from {1} for the {2} build'.format(
+            stats['copied'], env_source, builder))
+
+    n_workers = get_in_process_workers(sconf, conf)
+    if n_workers is None:
+        m = ('cannot run a parallel {0} build in a pool worker process, '
+             'running sphinx-build in a subprocess')
+        logger.warning(m.format(builder))
+        return run_sphinx(builder, sconf, conf)
+
+    prepare_sphinx_build(builder, sconf)
+
+    if 'language' in sconf and sconf.language is not None:
+        overrides = {'language': sconf.language}
+    else:
+        overrides = {}
+
+    output = SphinxOutputFilter(conf, builder)
+    m = "running in process sphinx build for: {0}, {1}, {2}"
+
+    with Timer(m.format(builder, sconf.language, sconf.edition)):
+        sphinx.util.console.nocolor()
+
+        try:
+            sphinx_app = sphinx.application.Sphinx(
+                srcdir=os.path.join(conf.paths.projectroot, conf.paths.branch_source),
+                confdir=conf.paths.projectroot,
+                outdir=sconf.fq_build_output,
+                doctreedir=doctree_dir,
+                buildername=builder,
+                confoverrides=overrides,
+                status=None,
+                warning=output,
+                tags=get_tag_list(builder, sconf),
+                parallel=n_workers)
+            sphinx_app.build()
+            return_code = sphinx_app.statuscode
+        except Exception as e:
+            # sphinx-build reports exceptions and exits with 1.
+            output.write('ERROR: sphinx build raised {0}: {1}\n'.format(type(e).__name__, e))
+            return_code = 1
+
+        output.flush()
+
+    return complete_sphinx_build(builder, sconf, conf, return_code, output)
 
 # Application Logic
 
 
-def sphinx_tasks(sconf, conf):
+def sphinx_tasks(sconf, conf, env_source=None):
     # Projects that use the append functionality in extracts or similar content
     # generators will rebuild this task every time.
 
@@ -286,8 +504,15 @@ def sphinx_tasks(sconf, conf):
     deps.extend(conf.system.files.get_configs('sphinx_local'))
     deps.extend(expand_tree(os.path.join(conf.paths.projectroot, conf.paths.branch_source), 'txt'))
 
-    return Task(job=run_sphinx,
-                args=(sconf.builder, sconf, conf),
+    if conf.runstate.shared_env is True:
+        job = run_sphinx_in_process
+        args = (sconf.builder, sconf, conf, env_source)
+    else:
+        job = run_sphinx
+        args = (sconf.builder, sconf, conf)
+
+    return Task(job=job,
+                args=args,
                 target=os.path.join(conf.paths.projectroot,
                                     conf.paths.branch_output,
                                     sconf.builder),
@@ -14,9 +14,9 @@
 
 import logging
 import sys
-import jinja2
 
 from giza.inheritance import InheritableContentBase
+from giza.libgiza.inheritance import get_template
 from giza.content.helper import get_all_languages, level_characters
 
 logger = logging.getLogger('giza.content.steps.models')
@@ -189,7 +189,7 @@ class ActionContent(HeadingMixin, ActionMixin, InheritableContentBase):
 
             for attempt in range(10):
                 if "{{" in code_block:
-                    template = jinja2.Template(code_block)
+                    template = get_template(code_block)
                     code_block = template.render(**self.replacement)
                     if "{{" not in code_block:
                         self.code = code_block
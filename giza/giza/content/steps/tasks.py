@@ -17,6 +17,7 @@ import shutil
 
 from giza.libgiza.task import Task
 
+from giza.content.output import content_output_tasks
 from giza.content.steps.inheritance import StepDataCache
 from giza.content.steps.views import render_steps
 from giza.config.content import new_content_type
@@ -32,24 +33,14 @@ def register_steps(conf):
     conf.system.content.add(name='steps', definition=content_dfn)
 
 
-def write_steps(steps, fn, conf):
-    content = render_steps(steps, conf)
-    content.write(fn)
-    logger.debug('wrote steps to: ' + fn)
-
-
 def step_tasks(conf):
     s = StepDataCache(conf.system.content.steps.sources, conf)
     s.create_output_dir()
 
-    tasks = []
-    for fn, stepf in s.file_iter():
-        t = Task(job=write_steps,
-                 args=(stepf, stepf.target(fn), conf),
-                 description='generate a stepfile for ' + fn,
-                 target=stepf.target(fn),
-                 dependency=fn)
-        tasks.append(t)
+    outputs = [(render_steps, (stepf, conf), stepf.target(fn), fn)
+               for fn, stepf in s.file_iter()]
+
+    tasks = content_output_tasks(outputs, conf, 'steps')
 
     logger.debug('added tasks for {0} step generation tasks'.format(len(tasks)))
     return tasks
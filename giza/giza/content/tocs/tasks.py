@@ -15,8 +15,7 @@
 import logging
 import os.path
 
-from giza.libgiza.task import Task
-
+from giza.content.output import content_output_tasks
 from giza.content.tocs.inheritance import TocDataCache
 from giza.content.tocs.views import render_toctree, render_dfn_list, render_toc_table
 from giza.config.content import new_content_type
@@ -33,29 +32,11 @@ def register_toc(conf):
     conf.system.content.add(name='toc', definition=definition)
 
 
-def write_toc_tree_output(fn, toc_items, is_ref):
-    content = render_toctree(toc_items, is_ref)
-    content.write(fn)
-    logger.debug('wrote toctree to: ' + fn)
-
-
-def write_dfn_list_output(fn, toc_items):
-    content = render_dfn_list(toc_items)
-    content.write(fn)
-    logger.debug('wrote toc dfnlist to: ' + fn)
-
-
-def write_toc_table(fn, toc_items):
-    content = render_toc_table(toc_items)
-    content.write(fn)
-    logger.debug('wrote toc table to: ' + fn)
-
-
 def toc_tasks(conf):
     tocs = TocDataCache(conf.system.content.toc.sources, conf)
     tocs.create_output_dir()
 
-    tasks = []
+    outputs = []
     for dep_fn, toc_data in tocs.file_iter():
         deps = [dep_fn]
         if 'ref-toc-' in dep_fn:
@@ -75,41 +56,21 @@ def toc_tasks(conf):
         if toc_data.is_spec() is False:
             out_fn = os.path.join(conf.system.content.toc.output_dir, fn_basename)
 
-            t = Task(job=write_toc_tree_output,
-                     args=(out_fn, toc_items, is_ref),
-                     target=out_fn,
-                     dependency=dep_fn,
-                     description='writing toctree to "{0}"'.format(out_fn))
-            tasks.append(t)
+            outputs.append((render_toctree, (toc_items, is_ref), out_fn, dep_fn))
         else:
             deps.extend(toc_data.spec_deps())
 
         if 'ref-toc' in dep_fn:
             out_fn = os.path.join(conf.system.content.toc.output_dir, 'table-' + fn_basename)
-
-            reft = Task(job=write_toc_table,
-                        args=(out_fn, toc_items),
-                        target=out_fn,
-                        dependency=deps,
-                        description='write ref toc table to "{0}"'.format(out_fn))
-            tasks.append(reft)
+            outputs.append((render_toc_table, (toc_items,), out_fn, deps))
         elif 'ref-spec' in dep_fn:
             out_fn = os.path.join(conf.system.content.toc.output_dir, 'table-spec-' + fn_basename)
-
-            refspec = Task(job=write_toc_table,
-                           args=(out_fn, toc_items),
-                           target=out_fn,
-                           dependency=deps,
-                           description='write ref spec table to "{0}"'.format(out_fn))
-            tasks.append(refspec)
+            outputs.append((render_toc_table, (toc_items,), out_fn, deps))
         else:
             out_fn = os.path.join(conf.system.content.toc.output_dir, 'dfn-list-' + fn_basename)
-            dt = Task(job=write_dfn_list_output,
-                      args=(out_fn, toc_items),
-                      target=out_fn,
-                      dependency=deps,
-                      description='write definition list toc to "{0}"'.format(out_fn))
-            tasks.append(dt)
+            outputs.append((render_dfn_list, (toc_items,), out_fn, deps))
+
+    tasks = content_output_tasks(outputs, conf, 'toc')
 
     logger.debug('added tasks for {0} toc generation tasks'.format(len(tasks)))
 
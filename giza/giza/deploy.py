@@ -19,15 +19,41 @@ Given a deploy target, we need to compile the rsync commands to:
 - rsync all static files. (unless non-master and .htaccess)
 - create the rsync command.
 
+Each host receives the content directory, and then all static files in a
+single transfer that reads the list of files from standard input. Hosts
+deploy concurrently, and transfers that fail with transient errors (e.g. a
+closed connection) are retried.
+
+Targets with the ``delta`` option compare a manifest of the local output
+(see :mod:`giza.tools.manifest`) with the manifest that the previous deploy
+stored on the host, and only transfer changed and deleted files. Hosts that
+are absolute paths are local directories, which receive files without
+rsync.
 """
 
 import logging
+import multiprocessing.dummy
 import os.path
+import re
+import shutil
 import subprocess
-import shlex
+import tempfile
+import time
+
+from giza.tools.files import safe_create_directory
+from giza.tools.manifest import manifest_name, write_manifest, subset_manifest, diff_manifests
+from giza.tools.sync import copy_file, sync_link, load_manifest, dump_manifest
 
 logger = logging.getLogger('giza.deploy')
 
+# rsync exit codes that indicate a (possibly) transient error: socket and
+# protocol errors, partial transfers, and timeouts. ssh exits with 255 when
+# it fails to connect.
+transient_codes = (10, 12, 23, 30, 35, 255)
+
+rsync_stats = {'files': re.compile(r'Number of (?:regular )?files transferred: ([\d,]+)'),
+               'bytes': re.compile(r'Total transferred file size: ([\d,]+)')}
+
 
 class Deploy(object):
 
@@ -42,6 +68,9 @@ class Deploy(object):
         self.hosts = None
         self.static_files = []
         self.branched = False
+        self.delta = False
+        self.parallel = None
+        self.retries = 2
 
     def load(self, pspec):
         if 'target' in pspec:
@@ -61,17 +90,34 @@ class Deploy(object):
         if 'branched' in pspec['options']:
             self.branched = True
 
+        if 'delta' in pspec['options']:
+            self.delta = True
+
         self.env = pspec['env']
 
         self.deploy_env = getattr(self.conf.deploy, self.env)
 
         self.hosts = self.deploy_env.hosts
 
+        if 'parallel' in self.deploy_env:
+            self.parallel = self.deploy_env.parallel
+
+        if 'retries' in self.deploy_env:
+            self.retries = self.deploy_env.retries
+
         if 'static' in pspec['paths']:
             self.static_files.extend(pspec['paths']['static'])
 
     def _base_cmd(self):
-        base_cmd = ['rsync', '-cqltz']
+        base_cmd = ['rsync', '-cltz', '--stats']
+
+        if 'args' in self.deploy_env:
+            base_cmd.extend(self.deploy_env.args)
+
+        return base_cmd
+
+    def _content_cmd(self):
+        base_cmd = self._base_cmd()
 
         if self.delete is True:
             base_cmd.append('--delete')
@@ -79,48 +125,377 @@ class Deploy(object):
         if self.recursive is True:
             base_cmd.append('--recursive')
 
+        return base_cmd
+
+    @property
+    def deploy_static_files(self):
+        if self.conf.git.branches.current == 'master':
+            return self.static_files
+        else:
+            logger.debug('skipping .htaccess files from non-master branch')
+            return [fn for fn in self.static_files if fn != '.htaccess']
+
+    def host_transfers(self, host):
+        """
+        :returns: A list of ``(cmd, files)`` tuples, that describe the
+           transfers to ``host``. ``files`` is ``None``, or a list of files
+           that rsync reads from standard input.
+        """
+
+        if self.branched is True:
+            source = os.path.join(self.conf.paths.output, self.local_path,
+                                  self.conf.git.branches.current)
+        else:
+            source = os.path.join(self.conf.paths.output, self.local_path) + '/'
+
+        destination = rsync_destination(host, self.remote_path)
+        transfers = [(self._content_cmd() + [source, destination], None)]
+
+        static_files = self.deploy_static_files
+        if len(static_files) > 0:
+            cmd = self._base_cmd() + ['--files-from=-',
+                                      os.path.join(self.conf.paths.output, self.local_path) + '/',
+                                      destination]
+            transfers.append((cmd, static_files))
+
+        return transfers
+
+    def deploy_commands(self):
+        for host in self.hosts:
+            for cmd, _ in self.host_transfers(host):
+                yield cmd
+
+    @property
+    def delta_paths(self):
+        """
+        :returns: A tuple of the local and remote directories that delta
+           deploys compare.
+        """
+
+        source = os.path.join(self.conf.paths.output, self.local_path)
+
+        if self.branched is True:
+            branch = self.conf.git.branches.current
+            return os.path.join(source, branch), '/'.join((self.remote_path.rstrip('/'), branch))
+        else:
+            return source, self.remote_path
+
+    def manifest(self):
+        """
+        :returns: The manifest of the files that delta deploys transfer,
+           updating the manifest written by the build as needed.
+        """
+
+        manifest = write_manifest(os.path.join(self.conf.paths.output, self.local_path))
+
+        if self.branched is True:
+            return subset_manifest(manifest, self.conf.git.branches.current)
+        else:
+            return manifest
+
+    def host_jobs(self):
+        """
+        :returns: A list of ``(host, job, args)`` tuples, one for each host,
+           to run either :func:`~giza.deploy.deploy_host()` or
+           :func:`~giza.deploy.delta_deploy_host()`.
+        """
+
+        if self.delta is False:
+            return [(host, deploy_host, [host, self.host_transfers(host), self.retries])
+                    for host in self.hosts]
+
+        source, path = self.delta_paths
+        manifest = self.manifest()
+
+        static = None
+        if self.branched is True and len(self.deploy_static_files) > 0:
+            static = (os.path.join(self.conf.paths.output, self.local_path), self.remote_path,
+                      self.deploy_static_files)
+
+        base_cmd = ['rsync', '-ltz', '--stats']
         if 'args' in self.deploy_env:
             base_cmd.extend(self.deploy_env.args)
 
-        return base_cmd
+        return [(host, delta_deploy_host,
+                 [host, source, path, manifest, base_cmd, static, self.retries])
+                for host in self.hosts]
 
-    def deploy_commands(self):
-        base = self._base_cmd()
+    def run(self):
+        """
+        Deploys to all hosts, deploying to at most ``parallel`` hosts (by
+        default, all hosts) at once.
 
-        for host in self.hosts:
-            if self.branched is True:
-                yield base + [os.path.join(self.conf.paths.output,
-                                           self.local_path,
-                                           self.conf.git.branches.current),
-                              host + ':' + self.remote_path]
+        :returns: A list of the results of the deploy to each host.
+        """
+
+        parallel = min(self.parallel or len(self.hosts), len(self.hosts))
+        jobs = self.host_jobs()
+
+        if parallel <= 1:
+            results = [job(*args) for _, job, args in jobs]
+        else:
+            pool = multiprocessing.dummy.Pool(parallel)
+            try:
+                results = pool.map(lambda job: job[1](*job[2]), jobs)
+            finally:
+                pool.close()
+                pool.join()
+
+        failed = [r['host'] for r in results if r['code'] != 0]
+        if len(failed) > 0:
+            logger.error('deploy of {0} failed for: {1}'.format(self.name, ', '.join(failed)))
+
+        return results
+
+
+def parse_rsync_stats(output):
+    """
+    :returns: A dictionary of the number of ``files`` and ``bytes`` that
+       rsync transferred, from the ``--stats`` ``output``.
+    """
+
+    stats = {}
+    for name, regex in rsync_stats.items():
+        match = regex.search(output)
+        stats[name] = 0 if match is None else int(match.group(1).replace(',', ''))
+
+    return stats
+
+
+def run_rsync(cmd, files=None):
+    """
+    Runs ``cmd``, writing the list of ``files`` (if any) to its standard
+    input.
+
+    :returns: A tuple of the exit code and the output of ``cmd``.
+    """
+
+    logger.info(' '.join(cmd))
+
+    p = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                         stderr=subprocess.STDOUT, universal_newlines=True)
+
+    output, _ = p.communicate('\n'.join(files or []))
+
+    return p.returncode, output
+
+
+def is_local_host(host):
+    "Returns ``True`` if ``host`` is a local directory, rather than a remote host."
+
+    return os.path.isabs(host)
+
+
+def local_target(host, path):
+    return os.path.join(host, path.lstrip('/'))
+
+
+def rsync_destination(host, path):
+    if is_local_host(host):
+        return local_target(host, path)
+    else:
+        return host + ':' + path
+
+
+def run_with_retries(host, cmd, files=None, retries=2, retry_delay=5):
+    """
+    Runs the rsync ``cmd``, retrying up to ``retries`` times if it fails with
+    a transient error.
+
+    :returns: A tuple of the exit code and the output of ``cmd``.
+    """
+
+    attempt = 0
+    while True:
+        code, output = run_rsync(cmd, files)
+
+        if code in transient_codes and attempt < retries:
+            attempt += 1
+            m = 'rsync to {0} returned code {1}, retrying ({2} of {3})'
+            logger.warning(m.format(host, code, attempt, retries))
+            time.sleep(retry_delay * attempt)
+        else:
+            break
+
+    if code != 0:
+        if code == 23:
+            logger.error('permissions error on remote end, possibly timestamp related.')
+        elif code == 12:
+            logger.error('connection closed by remote host. rsync operation failed.')
+
+        m = '"rsync" to {0} returned code {1}: {2}'
+        logger.error(m.format(host, code, output.strip()))
+
+    return code, output
+
+
+def report_deploy(result):
+    m = 'deployed {0} files ({1} bytes) to {2} in {3:.1f} seconds ({4:.1f} KB/s)'
+    logger.info(m.format(result['files'], result['bytes'], result['host'], result['seconds'],
+                         result['bytes'] / 1024.0 / max(result['seconds'], 0.001)))
+
+
+def deploy_host(host, transfers, retries=2, retry_delay=5):
+    """
+    Runs each of the ``transfers`` to ``host`` in order, retrying each
+    transfer that fails with a transient error up to ``retries`` times.
+    Stops at the first transfer that fails.
+
+    :returns: A dictionary with the ``host``, exit ``code``, and the number of
+       ``files``, ``bytes`` and ``seconds`` of the deploy.
+    """
+
+    result = {'host': host, 'code': 0, 'files': 0, 'bytes': 0, 'seconds': 0.0}
+    start = time.time()
+
+    for cmd, files in transfers:
+        code, output = run_with_retries(host, cmd, files, retries, retry_delay)
+
+        if code == 0:
+            stats = parse_rsync_stats(output)
+            result['files'] += stats['files']
+            result['bytes'] += stats['bytes']
+        else:
+            result['code'] = code
+            break
+
+    result['seconds'] = time.time() - start
+    report_deploy(result)
+
+    return result
+
+
+# Delta Deploys
+
+
+def read_target_manifest(host, path, base_cmd):
+    """
+    :returns: The manifest stored in the ``path`` directory on ``host`` by the
+       previous deploy, or an empty manifest if there is none.
+    """
+
+    if is_local_host(host):
+        return load_manifest(os.path.join(local_target(host, path), manifest_name))
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        fn = os.path.join(tmp_dir, manifest_name)
+        code, _ = run_rsync(base_cmd + ['/'.join((host + ':' + path.rstrip('/'), manifest_name)),
+                                        fn])
+
+        if code != 0:
+            logger.warning('no manifest on {0}:{1}, deploying all files'.format(host, path))
+            return {}
+        else:
+            return load_manifest(fn)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def push_files(host, source, path, changed, deleted, base_cmd, retries=2, retry_delay=5):
+    """
+    Copies the ``changed`` files from the ``source`` directory to ``path`` on
+    ``host``, and removes the ``deleted`` files.
+
+    :returns: A tuple of the exit code and the number of bytes transferred.
+    """
+
+    if is_local_host(host):
+        target = local_target(host, path)
+        transferred = 0
+
+        for rel in changed:
+            source_fn = os.path.join(source, rel)
+            target_fn = os.path.join(target, rel)
+
+            safe_create_directory(os.path.dirname(target_fn))
+
+            if os.path.islink(source_fn):
+                sync_link(source_fn, target_fn)
             else:
-                yield base + [os.path.join(self.conf.paths.output, self.local_path) + '/',
-                              host + ':' + self.remote_path]
+                copy_file(source_fn, target_fn)
+                transferred += os.path.getsize(source_fn)
 
-            for fn in self.static_files:
-                if self.conf.git.branches.current != 'master' and fn == '.htaccess':
-                    logger.debug('skipping .htaccess files from non-master branch')
-                    continue
-                else:
-                    yield base + [os.path.join(self.conf.paths.output, self.local_path, fn),
-                                  host + ':' + self.remote_path]
+        for rel in deleted:
+            target_fn = os.path.join(target, rel)
+            if os.path.lexists(target_fn):
+                os.remove(target_fn)
+
+        return 0, transferred
+
+    # rsync deletes the files in the list that don't exist in the source.
+    cmd = base_cmd + ['--ignore-times', '--delete-missing-args', '--files-from=-',
+                      source.rstrip('/') + '/', host + ':' + path]
+
+    code, output = run_with_retries(host, cmd, changed + deleted, retries, retry_delay)
+
+    return code, parse_rsync_stats(output)['bytes'] if code == 0 else 0
 
-    def run(self):
-        list(map(deploy_target, self.deploy_commands()))
 
+def write_target_manifest(host, path, manifest, base_cmd, retries=2, retry_delay=5):
+    "Stores the files of the ``manifest`` in the ``path`` directory on ``host``."
 
-def deploy_target(cmd):
-    with open(os.devnull, 'w') as f:
-        logger.info(cmd)
-        r = subprocess.call(shlex.split(cmd), stderr=f, stdout=f)
+    manifest = {'files': manifest['files']}
 
-    if r == 0:
+    if is_local_host(host):
+        dump_manifest(os.path.join(local_target(host, path), manifest_name), manifest)
         return 0
-    elif r == 23:
-        logger.warning('permissions error on remote end, possibly timestamp related.')
-    elif r == 12:
-        logger.warning('connection closed by remote host. rsync operation failed.')
-    else:
-        logger.error('"rsync" returned code {1}'.format(cmd, r))
 
-    return r
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        dump_manifest(os.path.join(tmp_dir, manifest_name), manifest)
+        cmd = base_cmd + [os.path.join(tmp_dir, manifest_name),
+                          '/'.join((host + ':' + path.rstrip('/'), manifest_name))]
+        return run_with_retries(host, cmd, None, retries, retry_delay)[0]
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def delta_deploy_host(host, source, path, manifest, base_cmd, static=None, retries=2,
+                      retry_delay=5):
+    """
+    Deploys the files in the ``source`` directory, described by
+    ``manifest``, to ``path`` on ``host``, transferring only the files that
+    changed since the previous deploy, and deleting the files that no longer
+    exist. Then transfers the ``static`` files, if specified as a tuple of
+    ``(source, path, files)``, and stores the manifest on the host.
+
+    :returns: A dictionary with the ``host``, exit ``code``, and the number of
+       ``files``, ``bytes`` and ``seconds`` of the deploy.
+    """
+
+    result = {'host': host, 'code': 0, 'files': 0, 'bytes': 0, 'seconds': 0.0}
+    start = time.time()
+
+    changed, deleted = diff_manifests(read_target_manifest(host, path, base_cmd), manifest)
+
+    m = '{0} files changed and {1} deleted since the last deploy to {2}'
+    logger.info(m.format(len(changed), len(deleted), host))
+
+    transfers = []
+    if len(changed) + len(deleted) > 0:
+        transfers.append((source, path, changed, deleted))
+    if static is not None:
+        transfers.append((static[0], static[1], list(static[2]), []))
+
+    for transfer_source, transfer_path, files, removed in transfers:
+        code, transferred = push_files(host, transfer_source, transfer_path, files, removed,
+                                       base_cmd, retries, retry_delay)
+
+        if code != 0:
+            result['code'] = code
+            break
+
+        result['files'] += len(files)
+        result['bytes'] += transferred
+
+    # only record the new manifest once all files are in place, so that an
+    # interrupted deploy transfers the files again.
+    if result['code'] == 0:
+        result['code'] = write_target_manifest(host, path, manifest, base_cmd, retries,
+                                               retry_delay)
+
+    result['seconds'] = time.time() - start
+    report_deploy(result)
+
+    return result
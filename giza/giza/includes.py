@@ -12,59 +12,285 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+"""
+:mod:`~giza.includes` resolves the implicit relationship between source files
+created by the ``.. include::`` directive, and between generated content YAML
+files and the files they inherit from.
+
+The :class:`~giza.includes.IncludeIndex` records the includes in each source
+file, with each file's stat signature, and persists between builds, so that
+only files that changed since the last scan are read again.
+"""
+
+import json
+import logging
+import multiprocessing.dummy
 import os
 import re
-import itertools
-import operator
-import subprocess
-import shlex
-
-import yaml
+import threading
 
+from giza.changes import get_change_set
+from giza.libgiza.cache import stat_signature, load_yaml_documents
 from giza.tools.files import expand_tree
 
+logger = logging.getLogger('giza.includes')
 
-def include_files(conf, files=None):
-    if files is not None:
-        return files
-    else:
-        source_dir = os.path.join(conf.paths.projectroot, conf.paths.source)
-        cmd = shlex.split('grep -R ".. include:: /" {0}'.format(source_dir))
+include_regex = re.compile(r'.*\.\. include:: (.*)')
+
+
+def scan_includes(path):
+    """
+    :returns: A list of the absolute (i.e. ``/``-prefixed) paths included in
+       the file at ``path``. Binary files never contain includes.
+    """
+
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    if b'include:: /' not in data or b'\0' in data:
+        return []
+
+    includes = []
+    for line in data.decode('utf-8', 'replace').split('\n'):
+        if 'include:: /' not in line:
+            continue
+
+        m = include_regex.match(line)
+        if m is not None:
+            includes.append(m.group(1))
+
+    return includes
+
+
+class IncludeIndex(object):
+    """
+    An index of the ``.. include::`` directives in all files in ``source_dir``,
+    persisted as JSON in ``fn``. Call :meth:`refresh()` to rescan all files
+    whose stat signature changed since the last scan.
 
-        with open(os.devnull, 'w') as null:
+    Tasks in a thread pool share one index, so all methods hold a lock, and
+    :meth:`graph()` returns a mapping that later refreshes don't modify.
+    """
+
+    parallel_threshold = 64
+
+    def __init__(self, source_dir, fn=None):
+        self.source_dir = source_dir
+        self.fn = fn
+        self.files = {}
+        self.generated = {}
+        self._changed = False
+        self._graph = None
+        self._lock = threading.RLock()
+
+        self.load()
+
+    def load(self):
+        with self._lock:
+            self._load()
+
+    def _load(self):
+        if self.fn is None or not os.path.isfile(self.fn):
+            return
+
+        with open(self.fn, 'r') as f:
+            try:
+                data = json.load(f)
+                if data['source'] == self.source_dir:
+                    self.files = data['files']
+                    self.generated = data['generated']
+            except (ValueError, KeyError):
+                logger.warning('include index {0} is not valid, rebuilding'.format(self.fn))
+
+    def dump(self):
+        with self._lock:
+            self._dump()
+
+    def _dump(self):
+        if self.fn is None or self._changed is False:
+            return
+
+        dirname = os.path.dirname(self.fn)
+        if dirname != '' and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+
+        tmp_fn = self.fn + '.tmp'
+        with open(tmp_fn, 'w') as f:
+            json.dump({'source': self.source_dir,
+                       'files': self.files,
+                       'generated': self.generated}, f)
+        os.rename(tmp_fn, self.fn)
+
+        self._changed = False
+
+    def refresh(self, paths=None):
+        """
+        Rescans the files in the source directory that changed since the last
+        scan. If ``paths`` is a list of ``/``-prefixed paths relative to the
+        source directory, only checks those files, rather than walking the
+        whole directory.
+        """
+
+        with self._lock:
+            self._refresh(paths)
+
+    def _refresh(self, paths):
+        prefix_len = len(self.source_dir)
+        seen = set()
+        changed = []
+
+        if paths is None:
+            paths = [os.path.join(root, name)
+                     for root, _, files in os.walk(self.source_dir)
+                     for name in files]
+            removed = None
+        else:
+            paths = [self.source_dir + fn for fn in paths]
+            removed = [path[prefix_len:] for path in paths if not os.path.isfile(path)]
+
+        for path in paths:
+            fn = path[prefix_len:]
+
+            try:
+                signature = stat_signature(path)
+            except OSError:
+                continue
+
+            seen.add(fn)
+            if fn not in self.files or self.files[fn][0] != signature:
+                changed.append((fn, path, signature))
+
+        if removed is None:
+            removed = [fn for fn in self.files if fn not in seen]
+        else:
+            removed = [fn for fn in removed if fn in self.files]
+
+        for fn in removed:
+            del self.files[fn]
+
+        if len(changed) > self.parallel_threshold:
+            # threads rather than processes: reading files dominates, and this
+            # often runs within a task in a worker process.
+            pool = multiprocessing.dummy.Pool()
             try:
-                grep = subprocess.check_output(args=cmd, stderr=null)
-            except subprocess.CalledProcessError as e:
-                grep = e.output
+                includes = pool.map(scan_includes, [path for _, path, _ in changed])
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            includes = [scan_includes(path) for _, path, _ in changed]
+
+        for (fn, _, signature), file_includes in zip(changed, includes):
+            self.files[fn] = [signature, file_includes]
+
+        if len(changed) > 0 or len(removed) > 0:
+            self._changed = True
+            self._graph = None
+
+        logger.debug('scanned {0} changed files for includes'.format(len(changed)))
+
+    def includes(self, fn):
+        "Forward lookup: returns the files that ``fn`` includes."
+
+        with self._lock:
+            if fn in self.files:
+                return list(self.files[fn][1])
+            else:
+                return []
+
+    def included_by(self, fn):
+        "Reverse lookup: returns the files that include ``fn``."
+
+        return list(self.graph().get(fn, []))
+
+    def graph(self):
+        """
+        :returns: A mapping of included files to a sorted list of the files
+           that include them. Ignores editor backup and ``overview.rst`` files.
+        """
+
+        with self._lock:
+            if self._graph is None:
+                graph = {}
+                for fn, (_, file_includes) in self.files.items():
+                    for inc in file_includes:
+                        if inc not in graph:
+                            graph[inc] = set()
+
+                        if not fn.endswith('~') and not fn.endswith('overview.rst'):
+                            graph[inc].add(fn)
+
+                self._graph = dict((inc, sorted(srcs)) for inc, srcs in graph.items())
+
+            return self._graph
+
+    def generated_dependencies(self, fn):
+        """
+        :returns: The files that the content YAML file at ``fn`` inherits from,
+           re-parsing the file only when it changed.
+        """
+
+        signature = stat_signature(fn)
+
+        with self._lock:
+            if fn not in self.generated or self.generated[fn][0] != signature:
+                deps = []
+                for doc in load_yaml_documents(fn):
+                    if 'source' in doc:
+                        deps.append(doc['source']['file'])
+
+                self.generated[fn] = [signature, deps]
+                self._changed = True
+
+            return list(self.generated[fn][1])
+
+
+_include_indexes = {}
+_include_indexes_lock = threading.Lock()
 
-        rx = re.compile(source_dir + r'(.*):.*\.\. include:: (.*)')
 
-        s = [m.groups()
-             for m in [rx.match(d)
-                       for d in grep.split('\n')]
-             if m is not None
-             ]
+def get_include_index(conf):
+    """
+    :returns: An up to date :class:`~giza.includes.IncludeIndex` for the
+       project's source directory, shared by all calls in this process.
+    """
 
-        def tuple_sort(k):
-            return k[1]
-        s.sort(key=tuple_sort)
+    source_dir = os.path.join(conf.paths.projectroot, conf.paths.source)
+    index_fn = conf.system.include_index
 
-        files = dict()
+    with _include_indexes_lock:
+        if (source_dir, index_fn) not in _include_indexes:
+            _include_indexes[(source_dir, index_fn)] = IncludeIndex(source_dir, index_fn)
 
-        for i in itertools.groupby(s, operator.itemgetter(1)):
-            files[i[0]] = set()
-            for src in i[1]:
-                if not src[0].endswith('~') and not src[0].endswith('overview.rst'):
-                    files[i[0]].add(src[0])
-            files[i[0]] = list(files[i[0]])
-            files[i[0]].sort()
+        index = _include_indexes[(source_dir, index_fn)]
 
-        for k, v in generated_includes(conf).items():
+    # in incremental builds, only the files that changed need scanning, once
+    # there is a complete index from an earlier build.
+    changes = get_change_set(conf)
+    if changes is not None and len(index.files) > 0:
+        index.refresh(changes.source_files)
+    else:
+        index.refresh()
+
+    return index
+
+
+def include_files(conf, files=None):
+    if files is not None:
+        return files
+    else:
+        index = get_include_index(conf)
+
+        files = dict((inc, list(srcs)) for inc, srcs in index.graph().items())
+
+        for k, v in generated_includes(conf, index).items():
             if k in files:
                 files[k].extend(v)
             else:
                 files[k] = v
 
+        index.dump()
+
         return files
 
 
@@ -105,7 +331,10 @@ def includes_masked(mask, conf, inc_files=None):
     return results
 
 
-def generated_includes(conf):
+def generated_includes(conf, index=None):
+    if index is None:
+        index = get_include_index(conf)
+
     step_files = []
     mapping = {}
 
@@ -127,14 +356,7 @@ def generated_includes(conf):
     path_prefix = conf.paths.includes[len(conf.paths.source):]
 
     for step_def in step_files:
-        deps = []
-
-        with open(step_def, 'r') as f:
-            data = yaml.safe_load_all(f)
-
-            for step in data:
-                if 'source' in step:
-                    deps.append(step['source']['file'])
+        deps = index.generated_dependencies(step_def)
 
         if len(deps) != 0:
             deps = [os.path.join(path_prefix, i) for i in deps]
@@ -15,6 +15,7 @@
 import copy
 import os
 
+import giza.libgiza.cache
 import giza.libgiza.inheritance
 import giza.libgiza.config
 
@@ -70,6 +71,14 @@ class DataContentBase(giza.libgiza.inheritance.DataContentBase):
 class DataCache(giza.libgiza.inheritance.DataCache):
     content_class = DataContentBase
 
+    def load_documents(self, fn):
+        return giza.libgiza.cache.get_document_cache(self.conf.system.yaml_cache).documents(fn)
+
+    @property
+    def search_paths(self):
+        return [os.path.join(self.conf.paths.projectroot, self.conf.paths.branch_includes),
+                os.path.join(self.conf.paths.projectroot, self.conf.paths.branch_source)]
+
     def create_output_dir(self):
         dirname = self.conf.system.content.get(self.content_type).output_dir
         if (self.content_type is not None and
@@ -23,6 +23,7 @@ import logging
 import random
 import numbers
 
+import giza.libgiza.cache
 import giza.libgiza.pool
 
 from giza.libgiza.task import Task, MapTask
@@ -68,6 +69,8 @@ class BuildApp(object):
         self.results = []
         self.worker_pool = None
         self._randomize = False
+        self._cache = None
+        self._scheduler = 'queue'
 
         self.pool_mapping = {
             'thread': giza.libgiza.pool.ThreadPool,
@@ -88,12 +91,15 @@ class BuildApp(object):
         self.dependency = None
 
     @classmethod
-    def new(cls, pool_type='process', pool_size=None, force=False):
+    def new(cls, pool_type='process', pool_size=None, force=False, cache=None):
         app = cls()
         app.force = force
         app.default_pool = pool_type
         app.pool_size = pool_size
 
+        if cache is not None:
+            app.cache = giza.libgiza.cache.TaskCache(cache)
+
         return app
 
     @property
@@ -157,6 +163,17 @@ class BuildApp(object):
         else:
             logger.warning('{0} is an invalid pool size'.format(str(value)))
 
+    @property
+    def cache(self):
+        return self._cache
+
+    @cache.setter
+    def cache(self, value):
+        if value is None or isinstance(value, giza.libgiza.cache.TaskCache):
+            self._cache = value
+        else:
+            raise TypeError(type(value))
+
     @property
     def conf(self):
         return self._conf
@@ -177,6 +194,25 @@ class BuildApp(object):
         else:
             self._randomize = bool(value)
 
+    @property
+    def scheduler(self):
+        """
+        Either ``queue`` (the default), which runs groups of tasks and embedded
+        apps in the order they were added, or ``graph``, which runs all tasks,
+        including the tasks of embedded apps, as a dependency graph (see
+        :class:`~giza.libgiza.graph.TaskGraph()`), so each task runs as soon as
+        the tasks it depends on complete.
+        """
+
+        return self._scheduler
+
+    @scheduler.setter
+    def scheduler(self, value):
+        if value in ('queue', 'graph'):
+            self._scheduler = value
+        else:
+            logger.error('{0} is not a valid scheduler'.format(value))
+
     @property
     def default_pool(self):
         if self._default_pool is None:
@@ -297,6 +333,8 @@ class BuildApp(object):
         app.root_app = False
         app.default_pool = self.default_pool
         app.pool = self.pool
+        app.cache = self.cache
+        app.scheduler = self.scheduler
 
         if self.conf is not None:
             app.conf = self.conf
@@ -349,6 +387,7 @@ class BuildApp(object):
             t = Task()
             t.conf = self.conf
             t.force = self.force
+            t.cache = self.cache
             self.queue.append(t)
             return t
         elif task in (MapTask, 'map'):
@@ -366,6 +405,8 @@ class BuildApp(object):
                 task.force = self.force
                 if task.conf is None:
                     task.conf = self.conf
+                if task.cache is None:
+                    task.cache = self.cache
 
                 self.queue.append(task)
                 return task
@@ -374,6 +415,8 @@ class BuildApp(object):
                 task.defualt_pool = self.default_pool
                 task.force = self.force
                 task.pool = self.pool
+                if task.cache is None:
+                    task.cache = self.cache
                 self.queue.append(task)
                 return task
             else:
@@ -412,6 +455,8 @@ class BuildApp(object):
 
         if len(self.queue) == 0:
             pass  # we could warn here, and while it's not ideal, its mostly harmless.
+        elif self.scheduler == 'graph':
+            self.results.extend(self.pool.graph_runner(self.queue))
         elif self.queue_has_apps is True:
             self._run_mixed_queue()
         else:
@@ -420,6 +465,9 @@ class BuildApp(object):
 
             self.results.extend(self.pool.runner(self.queue))
 
+        if self.root_app is True and self.cache is not None:
+            self.cache.dump()
+
         self.queue = []
         return self.results
 
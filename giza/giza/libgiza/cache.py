@@ -0,0 +1,496 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+:mod:`cache` holds the :class:`~giza.libgiza.cache.TaskCache()` class, a
+persistent, content-addressed record of successfully completed
+:class:`~giza.libgiza.task.Task()` operations.
+
+``mtime`` based dependency checking (:func:`~giza.libgiza.task.check_dependency()`)
+triggers a rebuild whenever a file's timestamp changes, which happens after
+``git checkout`` and ``rsync``. The :class:`~giza.libgiza.cache.TaskCache()`
+records, for each task that opts in with
+:attr:`~giza.libgiza.task.Task.cacheable`, a fingerprint of its arguments and a
+digest of each of its dependency files, so that tasks whose inputs are
+byte-identical to the last successful run do not run again. Tasks that giza
+forces to rebuild by touching their dependencies must not opt in.
+
+:mod:`cache` also holds the :class:`~giza.libgiza.cache.DocumentCache()`
+class, a persistent cache of parsed YAML documents.
+"""
+
+import hashlib
+import json
+import logging
+import multiprocessing
+import numbers
+import os
+import pickle
+import sys
+
+import yaml
+
+from giza.libgiza.config import ConfigurationBase
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+logger = logging.getLogger('giza.libgiza.cache')
+
+if sys.version_info >= (3, 0):
+    basestring = str
+
+
+def stat_signature(fn):
+    """
+    :returns: A list of ``[size, mtime_ns, inode]`` for ``fn``, which is cheap
+       to compute and changes whenever a file is modified or replaced.
+    """
+
+    st = os.stat(fn)
+
+    if hasattr(st, 'st_mtime_ns'):
+        mtime = st.st_mtime_ns
+    else:
+        mtime = int(st.st_mtime * 1000000000)
+
+    return [st.st_size, mtime, st.st_ino]
+
+
+def digest_file(fn):
+    md5 = hashlib.md5()
+
+    with open(fn, 'rb') as f:
+        for chunk in iter(lambda: f.read(128 * md5.block_size), b''):
+            md5.update(chunk)
+
+    return md5.hexdigest()
+
+
+def fingerprint(value):
+    """
+    :returns: A stable string representation of a task's arguments. Strings,
+       numbers, functions, configuration objects and containers of those values
+       are represented by their content.
+
+    :raises: :exc:`TypeError` for all other objects, whose content can't be
+       represented stably between processes.
+    """
+
+    if value is None or isinstance(value, (bool, numbers.Number, basestring)):
+        return repr(value)
+    elif isinstance(value, dict):
+        return '{' + ','.join(sorted(fingerprint(k) + ':' + fingerprint(v)
+                                     for k, v in value.items())) + '}'
+    elif isinstance(value, (list, tuple)):
+        return '[' + ','.join(fingerprint(v) for v in value) + ']'
+    elif isinstance(value, ConfigurationBase):
+        return '<{0}.{1}{2}>'.format(type(value).__module__, type(value).__name__,
+                                     fingerprint(value.state))
+    elif callable(value) and hasattr(value, '__name__'):
+        return '.'.join([getattr(value, '__module__', None) or '', value.__name__])
+    else:
+        raise TypeError('cannot fingerprint {0} object'.format(type(value)))
+
+
+def as_list(value):
+    if value is None:
+        return []
+    elif isinstance(value, (list, tuple)):
+        return list(value)
+    else:
+        return [value]
+
+
+class TaskCache(object):
+    """
+    A mapping of task identities to the argument fingerprint and dependency
+    digests recorded the last time that task completed successfully, stored as
+    JSON in ``fn`` between builds.
+
+    Digests are memoized by stat signature, so a file is only read when its
+    size, ``mtime`` or inode changed since it was last hashed.
+
+    The cache is only consulted and updated in the main process: when tasks
+    are pickled for process pools, the cache's entries are not.
+    """
+
+    def __init__(self, fn=None):
+        self.fn = fn
+        self.tasks = {}
+        self.files = {}
+        self._pending = {}
+        self._loaded = False
+        self._changed = False
+
+    def __getstate__(self):
+        return {'fn': self.fn, 'tasks': {}, 'files': {}, '_pending': {},
+                '_loaded': True, '_changed': False}
+
+    def load(self):
+        self._loaded = True
+
+        if self.fn is None or not os.path.isfile(self.fn):
+            return
+
+        with open(self.fn, 'r') as f:
+            try:
+                data = json.load(f)
+                self.tasks = data['tasks']
+                self.files = data['files']
+            except (ValueError, KeyError):
+                logger.warning('task cache {0} is not valid, ignoring'.format(self.fn))
+                self.tasks = {}
+                self.files = {}
+
+        logger.debug('loaded {0} task records from {1}'.format(len(self.tasks), self.fn))
+
+    def dump(self):
+        if self.fn is None or self._changed is False:
+            return
+
+        dirname = os.path.dirname(self.fn)
+        if dirname != '' and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+
+        tmp_fn = self.fn + '.tmp'
+        with open(tmp_fn, 'w') as f:
+            json.dump({'tasks': self.tasks, 'files': self.files}, f)
+        os.rename(tmp_fn, self.fn)
+
+        self._changed = False
+        logger.debug('wrote {0} task records to {1}'.format(len(self.tasks), self.fn))
+
+    def digest(self, fn):
+        """
+        :returns: The md5 digest of ``fn``, or ``None`` if ``fn`` is not a file.
+        """
+
+        if fn is None or not os.path.isfile(fn):
+            return None
+
+        signature = stat_signature(fn)
+        if fn in self.files and self.files[fn][0] == signature:
+            return self.files[fn][1]
+
+        value = digest_file(fn)
+        self.files[fn] = [signature, value]
+        self._changed = True
+
+        return value
+
+    @staticmethod
+    def key(task):
+        return '|'.join([fingerprint(task.job)] + sorted(as_list(task.target)))
+
+    @staticmethod
+    def args_fingerprint(task):
+        """
+        :returns: The fingerprint of the ``task``'s arguments, or ``None`` if
+           they can't be fingerprinted, in which case the task isn't cached.
+        """
+
+        try:
+            return fingerprint(task.args)
+        except TypeError as e:
+            logger.debug('not caching {0}: {1}'.format(task.description, e))
+            return None
+
+    def inputs(self, task):
+        dependencies = as_list(task.dependency)
+
+        if len(dependencies) == 0:
+            return None
+
+        digests = {}
+        for dep in dependencies:
+            value = self.digest(dep)
+            if value is None:
+                # directories, missing files, etc. can't be content addressed.
+                return None
+            digests[dep] = value
+
+        return digests
+
+    def is_current(self, task):
+        """
+        :returns: ``True`` if all of the ``task``'s targets exist and its
+           arguments and dependency contents are identical to the last recorded
+           successful run.
+        """
+
+        if self._loaded is False:
+            self.load()
+
+        targets = as_list(task.target)
+        if len(targets) == 0:
+            return False
+
+        for target in targets:
+            if not isinstance(target, basestring):
+                return False
+
+        key = self.key(task)
+        inputs = self.inputs(task)
+        if inputs is None:
+            return False
+
+        args = self.args_fingerprint(task)
+        if args is None:
+            return False
+
+        # hold on to the digests of the inputs as they were *before* the task
+        # runs, so that update() records what the task actually consumed.
+        self._pending[key] = inputs
+
+        record = self.tasks.get(key)
+        if record is None:
+            return False
+
+        for target in targets:
+            if not os.path.exists(target):
+                return False
+
+        if record['args'] != args:
+            return False
+
+        return inputs == record['inputs']
+
+    def update(self, task):
+        "Records the current state of the ``task``'s inputs following a successful run."
+
+        if self._loaded is False:
+            self.load()
+
+        for target in as_list(task.target):
+            if not isinstance(target, basestring):
+                return
+
+        key = self.key(task)
+        if key in self._pending:
+            inputs = self._pending.pop(key)
+        else:
+            inputs = self.inputs(task)
+
+        args = self.args_fingerprint(task)
+        if inputs is None or args is None:
+            return
+
+        self.tasks[key] = {'args': args,
+                           'inputs': inputs}
+        self._changed = True
+
+
+def load_yaml_documents(fn):
+    """
+    :returns: A list of all documents in the YAML file ``fn``, parsed with
+       libyaml's ``CSafeLoader`` when available.
+    """
+
+    with open(fn, 'rb') as f:
+        return list(yaml.load_all(f, Loader=SafeLoader))
+
+
+def parse_yaml_file(fn):
+    """
+    :returns: A tuple of the ``fn``, its digest, and its pickled documents.
+       Used to parse files in worker processes.
+    """
+
+    with open(fn, 'rb') as f:
+        content = f.read()
+
+    documents = list(yaml.load_all(content, Loader=SafeLoader))
+
+    return fn, hashlib.md5(content).hexdigest(), pickle.dumps(documents, pickle.HIGHEST_PROTOCOL)
+
+
+class DocumentCache(object):
+    """
+    A persistent cache of parsed YAML documents, stored with :mod:`pickle` in
+    ``fn`` between builds.
+
+    Files map to digests by stat signature, and digests map to documents, so
+    that copies of a file (e.g. in the per-edition source directories) share
+    one entry. Documents are stored pickled, and every call to
+    :meth:`~giza.libgiza.cache.DocumentCache.documents()` returns new
+    objects, so callers may modify the documents they receive.
+    """
+
+    # below this number of files, parsing in worker processes isn't worth it.
+    parallel_threshold = 32
+
+    def __init__(self, fn=None):
+        self.fn = fn
+        self.files = {}
+        self.digests = {}
+        self._signature = None
+        self._loaded = False
+        self._changed = False
+
+    def load(self):
+        """
+        Reads the cache from ``fn``. Entries already in this object take
+        precedence over the entries in the file.
+        """
+
+        self._loaded = True
+
+        if self.fn is None or not os.path.isfile(self.fn):
+            return
+
+        # read the signature first, so that a concurrent write causes the
+        # next refresh() to load the file again.
+        signature = stat_signature(self.fn)
+        with open(self.fn, 'rb') as f:
+            try:
+                data = pickle.load(f)
+                files = data['files']
+                digests = data['digests']
+            except Exception:
+                logger.warning('document cache {0} is not valid, ignoring'.format(self.fn))
+                files = {}
+                digests = {}
+
+        files.update(self.files)
+        digests.update(self.digests)
+        self.files = files
+        self.digests = digests
+        self._signature = signature
+
+        logger.debug('loaded {0} documents from {1}'.format(len(self.digests), self.fn))
+
+    def refresh(self):
+        """
+        Loads the cache again if another process wrote ``fn`` since this object
+        read or wrote it, e.g. when the main process parses files after forking
+        the worker processes of a pool.
+        """
+
+        if self._loaded is False:
+            self.load()
+        elif self.fn is not None and os.path.isfile(self.fn):
+            if stat_signature(self.fn) != self._signature:
+                self.load()
+
+    def dump(self):
+        if self.fn is None or self._changed is False:
+            return
+
+        # drop documents for files that no longer reference them.
+        current = set(digest for _, digest in self.files.values())
+        for digest in list(self.digests.keys()):
+            if digest not in current:
+                del self.digests[digest]
+
+        dirname = os.path.dirname(self.fn)
+        if dirname != '' and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+
+        # builds of different branches share the cache file, and may write it
+        # at the same time.
+        tmp_fn = '{0}.{1}.tmp'.format(self.fn, os.getpid())
+        with open(tmp_fn, 'wb') as f:
+            pickle.dump({'files': self.files, 'digests': self.digests}, f,
+                        pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_fn, self.fn)
+        self._signature = stat_signature(self.fn)
+
+        self._changed = False
+        logger.debug('wrote {0} documents to {1}'.format(len(self.digests), self.fn))
+
+    def lookup(self, fn):
+        """
+        :returns: The digest of ``fn`` if its documents are in the cache, and
+           ``None`` otherwise. Only reads ``fn`` if its signature changed.
+        """
+
+        self.refresh()
+
+        signature = stat_signature(fn)
+        record = self.files.get(fn)
+
+        if record is not None and record[0] == signature and record[1] in self.digests:
+            return record[1]
+
+        digest = digest_file(fn)
+        if digest in self.digests:
+            self.files[fn] = [signature, digest]
+            self._changed = True
+            return digest
+        else:
+            return None
+
+    def add(self, fn, digest, blob):
+        self.files[fn] = [stat_signature(fn), digest]
+        self.digests[digest] = blob
+        self._changed = True
+
+    def documents(self, fn):
+        """
+        :returns: A list of the documents in the YAML file ``fn``.
+        """
+
+        digest = self.lookup(fn)
+
+        if digest is None:
+            fn, digest, blob = parse_yaml_file(fn)
+            self.add(fn, digest, blob)
+        else:
+            blob = self.digests[digest]
+
+        return pickle.loads(blob)
+
+    def preload(self, fns, pool_size=None):
+        """
+        Parses all files in ``fns`` that aren't in the cache, using a pool of
+        worker processes for large numbers of files, and then writes the
+        cache to disk.
+        """
+
+        missing = [fn for fn in fns if self.lookup(fn) is None]
+
+        if (len(missing) < self.parallel_threshold or
+                multiprocessing.current_process().daemon is True):
+            results = [parse_yaml_file(fn) for fn in missing]
+        else:
+            import giza.libgiza.pool
+
+            pool_size = pool_size or multiprocessing.cpu_count()
+            pool = giza.libgiza.pool.get_process_pool(pool_size)
+            results = pool.map(parse_yaml_file, missing,
+                               chunksize=max(1, len(missing) // (pool_size * 4)))
+
+        for fn, digest, blob in results:
+            self.add(fn, digest, blob)
+
+        logger.debug('parsed {0} of {1} yaml files'.format(len(missing), len(fns)))
+        self.dump()
+
+
+_document_caches = {}
+
+
+def get_document_cache(fn):
+    """
+    :returns: The :class:`~giza.libgiza.cache.DocumentCache()` stored in
+       ``fn``, shared by all calls in this process.
+    """
+
+    if fn not in _document_caches:
+        _document_caches[fn] = DocumentCache(fn)
+
+    return _document_caches[fn]
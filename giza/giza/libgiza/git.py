@@ -267,6 +267,19 @@ class GitRepo(object):
     def sha(self, ref='HEAD'):
         return self.cmd('rev-parse', '--verify', ref)
 
+    def changed_files(self, ref):
+        """
+        :returns: A list of the paths, relative to the top level of the
+           repository, of the files that differ between ``ref`` and the working
+           tree, including deleted and untracked files.
+        """
+
+        files = self.cmd('diff', '--name-only', '--no-renames', ref, '--').split('\n')
+        files.extend(self.cmd('ls-files', '--others', '--exclude-standard',
+                              '--full-name').split('\n'))
+
+        return [fn for fn in files if fn != '']
+
     def commit_messages(self, num=1):
         args = ['log', '--oneline', '--max-count=' + str(num)]
         log = self.cmd(*args)
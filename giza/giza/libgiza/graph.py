@@ -13,6 +13,15 @@
 # limitations under the License.
 
 import copy
+import heapq
+import logging
+import os.path
+import sys
+
+logger = logging.getLogger('giza.libgiza.graph')
+
+if sys.version_info >= (3, 0):
+    basestring = str
 
 
 def get_dependency_graph(app):
@@ -44,3 +53,127 @@ def get_dependency_graph(app):
             graph[task.target].append(task.dependency)
 
     return graph
+
+
+class DependencyCycleError(Exception):
+    pass
+
+
+def flatten_tasks(queue):
+    """
+    :returns: A flat list of all :class:`~giza.libgiza.task.Task()` objects in
+       ``queue``, including the tasks in the queues of embedded
+       :class:`~giza.libgiza.app.BuildApp()` objects.
+    """
+
+    tasks = []
+
+    for task in queue:
+        if hasattr(task, 'queue'):
+            tasks.extend(flatten_tasks(task.queue))
+        elif isinstance(task, (list, tuple)):
+            tasks.extend(flatten_tasks(task))
+        elif task is not None:
+            tasks.append(task)
+
+    return tasks
+
+
+def _as_paths(value):
+    if isinstance(value, (list, tuple)):
+        return [v for v in value if isinstance(v, basestring)]
+    elif isinstance(value, basestring):
+        return [value]
+    else:
+        return []
+
+
+class TaskGraph(object):
+    """
+    A dependency graph of :class:`~giza.libgiza.task.Task()` objects.
+
+    A task depends on another task if one of its ``dependency`` files is, or is
+    within, one of the other task's ``target`` paths, or if the other task is
+    in its :attr:`~giza.libgiza.task.Task.requires` list. Tasks that do not
+    depend on each other may run concurrently.
+    """
+
+    def __init__(self, queue):
+        self.tasks = flatten_tasks(queue)
+        self.edges = dict((idx, set()) for idx in range(len(self.tasks)))
+        self.dependents = dict((idx, set()) for idx in range(len(self.tasks)))
+
+        self._build()
+
+    def _build(self):
+        producers = {}
+        index = {}
+
+        for idx, task in enumerate(self.tasks):
+            index[id(task)] = idx
+            for target in _as_paths(task.target):
+                producers.setdefault(os.path.normpath(target), []).append(idx)
+
+        for idx, task in enumerate(self.tasks):
+            for dep in _as_paths(task.dependency):
+                path = os.path.normpath(dep)
+
+                while True:
+                    for producer in producers.get(path, []):
+                        self.add_edge(producer, idx)
+
+                    parent = os.path.dirname(path)
+                    if parent in ('', path):
+                        break
+                    path = parent
+
+            for required in flatten_tasks(getattr(task, 'requires', [])):
+                if id(required) in index:
+                    self.add_edge(index[id(required)], idx)
+                else:
+                    logger.debug('{0} requires a task not in this graph'.format(task.description))
+
+    def add_edge(self, dependency, dependent):
+        if dependency == dependent:
+            return
+
+        self.edges[dependent].add(dependency)
+        self.dependents[dependency].add(dependent)
+
+    def roots(self):
+        return [idx for idx in range(len(self.tasks)) if len(self.edges[idx]) == 0]
+
+    def order(self):
+        """
+        :returns: A list of task indexes in a topological order, which is
+           otherwise the same as the order that the tasks were added.
+
+        :raises: :exc:`~giza.libgiza.graph.DependencyCycleError` if the
+           dependencies between tasks form a cycle.
+        """
+
+        remaining = dict((idx, len(deps)) for idx, deps in self.edges.items())
+        ready = self.roots()
+        heapq.heapify(ready)
+
+        ordered = []
+        while len(ready) > 0:
+            idx = heapq.heappop(ready)
+            ordered.append(idx)
+
+            for dependent in self.dependents[idx]:
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    heapq.heappush(ready, dependent)
+
+        if len(ordered) != len(self.tasks):
+            cycle = [self.tasks[idx].description
+                     for idx, count in remaining.items() if count > 0]
+            m = 'tasks have cyclic dependencies: {0}'.format(cycle)
+            logger.error(m)
+            raise DependencyCycleError(m)
+
+        return ordered
+
+    def ordered_tasks(self):
+        return [self.tasks[idx] for idx in self.order()]
@@ -23,12 +23,13 @@ units.
 import copy
 import collections
 import logging
+import numbers
 import os.path
 import sys
 
 import jinja2
-import yaml
 
+from giza.libgiza.cache import load_yaml_documents
 from giza.libgiza.config import RecursiveConfigurationBase, ConfigurationBase
 
 logger = logging.getLogger('giza.libgiza.inheritance')
@@ -37,6 +38,54 @@ if sys.version_info >= (3, 0):
     basestring = str
 
 
+# compiled templates, keyed by template source. Units that inherit from the
+# same parent, or share boilerplate, render the same templates many times.
+_template_cache = {}
+template_cache_size = 4096
+
+
+def get_template(source):
+    """
+    :returns: A compiled :class:`jinja2.Template` for the string ``source``,
+       from a cache shared by all content in the process.
+    """
+
+    try:
+        return _template_cache[source]
+    except KeyError:
+        if len(_template_cache) >= template_cache_size:
+            _template_cache.clear()
+
+        template = jinja2.Template(source)
+        _template_cache[source] = template
+
+        return template
+
+
+def inherit_value(value):
+    """
+    :returns: A copy of ``value`` for an inheriting unit of content. Strings
+       and numbers are immutable, and are shared rather than copied, as are
+       configuration objects' ``conf`` references; only the containers that
+       hold them, which rendering may modify, are copied.
+    """
+
+    if value is None or isinstance(value, (basestring, numbers.Number)):
+        return value
+    elif isinstance(value, list):
+        return [inherit_value(item) for item in value]
+    elif isinstance(value, dict):
+        return dict((key, inherit_value(item)) for key, item in value.items())
+    elif isinstance(value, ConfigurationBase):
+        content = value.__class__.__new__(value.__class__)
+        content.__dict__.update(value.__dict__)
+        content.__dict__['_state'] = inherit_value(value.state)
+
+        return content
+    else:
+        return copy.deepcopy(value)
+
+
 class InheritableContentError(Exception):
     """
     Exception used by inheritance code to indicate a problem resolving
@@ -46,6 +95,105 @@ class InheritableContentError(Exception):
     pass
 
 
+class UnitIndex(object):
+    """
+    An index of the files of inheritable content below a list of directories,
+    so that references to files that are not already loaded resolve with
+    dictionary lookups rather than by crawling the tree.
+
+    The directories are walked once, the first time the index is used. A file
+    is indexed by every trailing sequence of its path components (e.g.
+    ``steps-install.yaml`` and ``includes/steps-install.yaml``), and the first
+    file found for each name, in the order of ``paths``, takes precedence.
+    The index does not read the files: each content type keys its units
+    differently, so the data cache validates refs once it loads the file.
+    """
+
+    extensions = ('.yaml', '.yml')
+
+    def __init__(self, paths):
+        self.paths = [os.path.abspath(path) for path in paths]
+        self.files = {}
+        self._built = False
+
+    def build(self):
+        self._built = True
+        seen = set()
+
+        for path in self.paths:
+            for root, dirs, filenames in os.walk(path):
+                if root in seen:
+                    dirs[:] = []
+                    continue
+                seen.add(root)
+
+                for name in filenames:
+                    if not name.endswith(self.extensions):
+                        continue
+
+                    fn = os.path.join(root, name)
+                    parts = os.path.relpath(fn, path).split(os.path.sep)
+                    for idx in range(len(parts)):
+                        self.files.setdefault('/'.join(parts[idx:]), fn)
+
+        logger.debug('indexed {0} names in {1}'.format(len(self.files), self.paths))
+
+    def find(self, name):
+        """
+        :returns: The absolute path of the file ``name``, or ``None`` if there
+           is no such file.
+        """
+
+        if os.path.isabs(name):
+            return name if os.path.isfile(name) else None
+
+        if self._built is False:
+            self.build()
+
+        key = os.path.normpath(name).replace(os.path.sep, '/')
+        if key in self.files:
+            return self.files[key]
+
+        # files created after the index was built can only be found directly.
+        for path in self.paths:
+            fn = os.path.join(path, name)
+            if os.path.isfile(fn):
+                self.files[key] = fn
+                return fn
+
+        return None
+
+
+_unit_indexes = {}
+
+
+def get_unit_index(paths):
+    """
+    :returns: The :class:`~giza.libgiza.inheritance.UnitIndex()` for
+       ``paths``, shared by all data caches (and content types) in the process
+       that search the same directories.
+    """
+
+    key = tuple(os.path.abspath(path) for path in paths)
+
+    if key not in _unit_indexes:
+        _unit_indexes[key] = UnitIndex(key)
+
+    return _unit_indexes[key]
+
+
+def get_search_paths(conf):
+    "Returns the directories searched for files that content inherits from."
+
+    paths = [os.getcwd()]
+    try:
+        paths.append(conf.paths.includes)
+    except Exception:
+        pass
+
+    return paths
+
+
 class InheritanceReference(RecursiveConfigurationBase):
     """
     Represents a single reference to another unit of content. The
@@ -72,31 +220,15 @@ class InheritanceReference(RecursiveConfigurationBase):
     def is_resolved(self):
         return self.resolved
 
-    def set_up_search_path(self, name):
-        fns = [os.path.join(os.getcwd(), name)]
-        try:
-            fns.append(os.path.join(self.conf.paths.includes, name))
-        except:
-            pass
-
-        fns.extend([os.path.join(d[0], name) for d in os.walk(os.getcwd())])
-
-        return fns
-
     @property
     def file(self):
         return self.state['file']
 
     @file.setter
     def file(self, value):
-        fns = self.set_up_search_path(value)
-
-        for fn in fns:
-            if os.path.isfile(fn):
-                self.state['file'] = value
-                break
-
-        if 'file' not in self.state:
+        if os.path.isfile(value) or get_unit_index(get_search_paths(self.conf)).find(value):
+            self.state['file'] = value
+        else:
             raise TypeError('file named {0} does not exist'.format(value))
 
 
@@ -205,17 +337,20 @@ class InheritableContentBase(RecursiveConfigurationBase):
 
         if self._is_resolveable(data):
             try:
-                base = copy.deepcopy(data.fetch(self.source.file, self.source.ref))
+                base = data.fetch(self.source.file, self.source.ref)
                 base.resolve(data)
 
                 needs_replacement = self.replacement != base.replacement
 
                 if needs_replacement:
-                    replacement = copy.deepcopy(base.replacement)
+                    replacement = inherit_value(base.replacement)
                     replacement.update(self.replacement)
 
-                base.state.update(self.state)
-                self.state.update(base.state)
+                # rather than copying the entire base, only copy the fields
+                # that this unit doesn't override.
+                for key, value in base.state.items():
+                    if key not in self.state:
+                        self.state[key] = inherit_value(value)
 
                 if needs_replacement:
                     self.replacement = replacement
@@ -245,15 +380,21 @@ class InheritableContentBase(RecursiveConfigurationBase):
                     # with existing examples, we join them up, do the formatting
                     # and then split it back up.
                     if isinstance(self.state[key], list):
+                        needs_join = False
                         for it in self.state[key]:
                             if not isinstance(it, basestring):
                                 should_resplit = False
                                 break
+                            elif '{{' in it or '\n' in it:
+                                needs_join = True
 
                         # do the splitting, but if any of the elements weren't
                         # strings then we can't render the string, so it makes
                         # sense to go on to the next key in the dict.
-                        if should_resplit is None:
+                        if should_resplit is None and needs_join is False:
+                            # without any templates there's nothing to render.
+                            continue
+                        elif should_resplit is None:
                             should_resplit = True
                             self.state[key] = '\n'.join(self.state[key])
                         elif should_resplit is False:
@@ -265,7 +406,7 @@ class InheritableContentBase(RecursiveConfigurationBase):
                         if '{{' not in self.state[key]:
                             break
 
-                        template = jinja2.Template(self.state[key])
+                        template = get_template(self.state[key])
                         self.state[key] = template.render(**self.replacement)
                         if '{{' not in self.state[key]:
                             break
@@ -332,8 +473,7 @@ class DataContentBase(RecursiveConfigurationBase):
 
     def ingest(self, src):
         if not isinstance(src, list) and os.path.isfile(src):
-            with open(src, 'r') as f:
-                src = [doc for doc in yaml.safe_load_all(f)]
+            src = self.data.load_documents(src)
 
         for doc in src:
             if doc is None:
@@ -424,13 +564,6 @@ class DataContentBase(RecursiveConfigurationBase):
         then we sort in this order. Otherwise, we return in the order that they
         were specified in the file.
         """
-        def sorter(ref_a, ref_b):
-            # would be cmp() in python 2, but this is py3 compatible
-            a_num = self.fetch(ref_a).number
-            b_num = self.fetch(ref_b).number
-
-            return (a_num > b_num) - (a_num < b_num)
-
         if self._reordered is False:
             for content in self.content.values():
                 if 'number' not in content:
@@ -438,7 +571,9 @@ class DataContentBase(RecursiveConfigurationBase):
                     break
 
         if self._reordered is False:
-            self._ordering.sort(cmp=sorter)
+            # fetch each unit once, rather than twice per comparison.
+            positions = dict((ref, self.fetch(ref).number) for ref in self._ordering)
+            self._ordering.sort(key=positions.get)
             self._reordered = True
 
         for ref in self._ordering:
@@ -465,16 +600,15 @@ class DataCache(RecursiveConfigurationBase):
     def __contains__(self, key):
         return key in self.cache
 
-    def set_up_search_path(self, name):
-        fns = [os.path.join(os.getcwd(), name)]
-        try:
-            fns.append(os.path.join(self.conf.paths.includes, name))
-        except:
-            pass
+    @property
+    def search_paths(self):
+        "The directories searched for inherited files that are not in the cache."
 
-        fns.extend([os.path.join(d[0], name) for d in os.walk(os.getcwd())])
+        return get_search_paths(self.conf)
 
-        return fns
+    @property
+    def index(self):
+        return get_unit_index(self.search_paths)
 
     @property
     def cache(self):
@@ -497,10 +631,14 @@ class DataCache(RecursiveConfigurationBase):
         for fn in files:
             self.add_file(fn)
 
+    def load_documents(self, fn):
+        "Returns a list of the YAML documents in ``fn``. Subclasses may cache documents."
+
+        return load_yaml_documents(fn)
+
     def add_file(self, fn):
         if fn not in self.cache or self.cache[fn] == []:
-            with open(fn, 'r') as f:
-                data = [doc for doc in yaml.safe_load_all(f)]
+            data = self.load_documents(fn)
 
             self.cache[fn] = self.content_class(data, self, self.conf)
         else:
@@ -517,19 +655,17 @@ class DataCache(RecursiveConfigurationBase):
                 self.add_file(fn)
                 return self.cache[fn].fetch(ref)
             else:
-                logger.warning("file ({0}) doesn't exist, crawling directory".format(fn))
-                fns = self.set_up_search_path(fn)
+                filen = self.index.find(fn)
 
-                for filen in fns:
-                    if os.path.isfile(filen):
-                        self.add_file(filen)
-                        break
-
-                if filen in self.cache:
-                    return self.cache[filen].fetch(ref)
-                else:
+                if filen is None:
                     raise InheritableContentError('cannot resolve: {0} {1}'.format(fn, ref))
 
+                if filen not in self.cache or self.cache[filen] == []:
+                    self.add_file(filen)
+
+                # the content class validates the ref, using its own keys.
+                return self.cache[filen].fetch(ref)
+
     def file_iter(self):
         for fn in self.cache:
             yield fn, self.cache[fn]
@@ -17,16 +17,40 @@
 :class:`~giza.app`. The base class :class:`~giza.pool.WorkerPool` provides core
 functionality, while additional sub-classes use different parallelism
 mechanisms.
+
+All :class:`~giza.pool.ProcessPool` objects of the same size share one
+long-lived ``multiprocessing`` pool, which closes when the program exits, so
+that successive apps and build phases don't fork new workers. Configuration
+objects in task arguments are written to disk once per batch of tasks, and
+tasks carry a small :class:`~giza.pool.ConfigurationReference` which each
+worker loads once and caches.
 """
 
+import atexit
+import copy
+import hashlib
+import itertools
 import logging
 import multiprocessing
 import multiprocessing.dummy
 import numbers
+import os
+import pickle
+import shutil
 import sys
+import tempfile
+import time
 
+from giza.libgiza.config import ConfigurationBase
+from giza.libgiza.graph import TaskGraph
+from giza.libgiza.profile import TaskTiming, get_profiler, run_timed
 from giza.libgiza.task import MapTask, Task
 
+if sys.version_info >= (3, 0):
+    import queue
+else:
+    import Queue as queue
+
 logger = logging.getLogger('giza.pool')
 
 
@@ -38,10 +62,16 @@ class PoolResultsError(Exception):
     pass
 
 
+def cache_result(job):
+    if hasattr(job, 'cache_result'):
+        job.cache_result()
+
+
 def run_task(task):
     "helper to call run method on task so entire operation can be pickled for process pool support"
 
     try:
+        resolve_references(task)
         result = task.run()
     except KeyboardInterrupt:
         logger.error('task received interrupt.')
@@ -49,7 +79,103 @@ def run_task(task):
     return result
 
 
+def run_profiled_task(task):
+    "Runs ``task`` like :func:`run_task()`, and returns its result with its timing."
+
+    return run_timed(run_task, task)
+
+
+# Shared Process Pools and Configuration References
+
+_process_pools = {}
+_reference_dir = []
+_worker_configurations = {}
+
+
+def get_process_pool(pool_size):
+    "Returns the shared ``multiprocessing`` pool with ``pool_size`` workers."
+
+    if pool_size not in _process_pools:
+        _process_pools[pool_size] = multiprocessing.Pool(pool_size)
+        logger.debug('started shared process pool with {0} workers'.format(pool_size))
+
+    return _process_pools[pool_size]
+
+
+def close_process_pools():
+    for pool in _process_pools.values():
+        pool.close()
+        pool.join()
+
+    _process_pools.clear()
+
+    while len(_reference_dir) > 0:
+        shutil.rmtree(_reference_dir.pop(), ignore_errors=True)
+
+
+atexit.register(close_process_pools)
+
+
+def get_reference_dir():
+    if len(_reference_dir) == 0:
+        _reference_dir.append(tempfile.mkdtemp(prefix='giza-conf-'))
+
+    return _reference_dir[0]
+
+
+class ConfigurationReference(object):
+    """
+    Stands in for a configuration object in the arguments of a task sent to a
+    worker process. The configuration object is pickled to a file once, and
+    each worker process loads and caches it the first time that it runs a task
+    that references it.
+    """
+
+    cache_size = 32
+
+    def __init__(self, conf):
+        data = pickle.dumps(conf, pickle.HIGHEST_PROTOCOL)
+
+        self.token = hashlib.md5(data).hexdigest()
+        self.fn = os.path.join(get_reference_dir(), self.token + '.pickle')
+
+        if not os.path.exists(self.fn):
+            with open(self.fn, 'wb') as f:
+                f.write(data)
+
+    def resolve(self):
+        if self.token not in _worker_configurations:
+            if len(_worker_configurations) >= self.cache_size:
+                _worker_configurations.clear()
+
+            with open(self.fn, 'rb') as f:
+                _worker_configurations[self.token] = pickle.load(f)
+
+        return _worker_configurations[self.token]
+
+
+def resolve_references(task):
+    "Replaces :class:`ConfigurationReference` arguments with configuration objects."
+
+    if not isinstance(task, Task):
+        return
+    elif task.args_type == 'kwargs':
+        task.args = dict((key, value.resolve())
+                         if isinstance(value, ConfigurationReference) else (key, value)
+                         for key, value in task.args.items())
+    elif task.args_type == 'args':
+        task.args = [value.resolve() if isinstance(value, ConfigurationReference) else value
+                     for value in task.args]
+
+
 class WorkerPool(object):
+    completion_timeout = 1
+
+    def __init__(self, pool_size=None):
+        self.pool_size = pool_size
+        self.completed = queue.Queue()
+        self.task_counter = itertools.count()
+
     @property
     def pool_size(self):
         try:
@@ -88,11 +214,18 @@ class WorkerPool(object):
             if job.needs_rebuild is True:
                 self.add_task(job, results)
             else:
-                logger.debug("{0} does not need a rebuild".format(job.target))
+                self.skip_task(job)
 
         return results
 
-    def do_finalizers(self, job, results):
+    def skip_task(self, job):
+        logger.debug("{0} does not need a rebuild".format(job.target))
+
+        profiler = get_profiler()
+        if profiler is not None:
+            profiler.skip(job)
+
+    def do_finalizers(self, job, results, parent=None):
         final = None
 
         if len(job.finalizers) == 0:
@@ -106,12 +239,18 @@ class WorkerPool(object):
                         final = task[1]
                 else:
                     if task.needs_rebuild is True:
-                        self.add_task(task, results)
+                        self.add_task(task, results, parent)
+                    else:
+                        self.skip_task(task)
 
-        self.add_task(final, results)
+        self.add_task(final, results, parent)
 
-    def add_task(self, job, results):
-        idx = len(results) + 1
+    def add_task(self, job, results, parent=None):
+        """
+        Submits ``job`` to the pool, and appends a ``(job, idx, result)`` tuple
+        to ``results``. ``parent`` is the key of the task that ``job``
+        finalizes, if any, for profiling.
+        """
 
         if job is None:
             return
@@ -119,76 +258,227 @@ class WorkerPool(object):
             m = 'cannot use finalizers that have queues. skipping tasks ({0})'
             logger.warning(m.format(len(job.queue)))
 
+        idx = next(self.task_counter)
+        callbacks = self.completion_callbacks(idx)
+
+        profiler = get_profiler()
+
         if isinstance(job, MapTask):
-            results.append((job, idx, self.p.map_async(job.job, job.iter)))
+            results.append((job, idx, self.p.map_async(job.job, job.iter, **callbacks)))
+        elif profiler is None:
+            results.append((job, idx, self.p.apply_async(run_task,
+                                                         args=[self.prepare_task(job)],
+                                                         **callbacks)))
         else:
-            results.append((job, idx, self.p.apply_async(run_task, args=[job])))
+            profiler.submitted(self.profile_key(idx), job, parent)
+            results.append((job, idx, self.p.apply_async(run_profiled_task,
+                                                         args=[self.prepare_task(job)],
+                                                         **callbacks)))
+
+    def profile_key(self, idx):
+        return (id(self), idx)
+
+    def collect(self, idx, result):
+        "Returns the result of a task, recording its timing if it ran with a profiler."
+
+        if isinstance(result, TaskTiming):
+            profiler = get_profiler()
+            if profiler is not None:
+                profiler.completed(self.profile_key(idx), result)
+
+            return result.result
+        else:
+            return result
+
+    def prepare_task(self, job):
+        "Returns the object to send to the pool to run ``job``."
+
+        return job
+
+    def completion_callbacks(self, idx):
+        """
+        :returns: Keyword arguments for ``apply_async`` and ``map_async`` that
+           put ``idx`` on the :attr:`completed` queue when the task finishes.
+        """
+
+        def notify(result):
+            self.completed.put(idx)
+
+        callbacks = {'callback': notify}
+
+        if sys.version_info >= (3, 0):
+            callbacks['error_callback'] = notify
+
+        return callbacks
+
+    def wait_for_completion(self, pending):
+        """
+        Blocks until one of the tasks in ``pending``, a mapping of ids to
+        ``(job, result)`` pairs, completes, and returns its id.
+        """
+
+        while True:
+            try:
+                idx = self.completed.get(timeout=self.completion_timeout)
+            except queue.Empty:
+                # pools without error callbacks (i.e. on Python 2) don't
+                # report failed tasks on the queue, so check for those here.
+                for idx, (job, ret) in pending.items():
+                    if ret.ready():
+                        return idx
+                continue
+
+            if idx in pending:
+                return idx
 
     def get_results(self, results):
-        has_errors = False
+        """
+        Collects the results of the tasks in ``results``, as returned by
+        :meth:`async_runner()`. Tasks signal completion on the
+        :attr:`completed` queue, so the finalizers of a task start as soon as
+        it completes without polling.
+
+        :returns: The results of all tasks and finalizers, in the order that
+           they were submitted to the pool.
+        """
 
         retval = []
         errors = []
 
-        has_finalizers = False
-        for job, _, __ in results:
-            if len(job.finalizers) >= 1:
-                has_finalizers = True
-                break
-
-        # the while loop is required so that finalizer tasks begin running as
-        # soon as their parent completes, but is otherwise functionally
-        # equivalent . However, the while loop spins the main thread, which is
-        # *much* slower with thread/gevent pools
-        if has_finalizers is True:
-            while True:
-                for job, idx, ret in results:
-                    if ret.ready():
-                        try:
-                            task_result = ret.get()
-                        except Exception as e:
-                            if job.ignore_errors is True:
-                                m = 'caught error "{0}", waiting for other tasks to finish'
-                                logger.error(m.format(e))
-                                has_errors = True
-                                errors.append((job, e))
-                            else:
-                                m = "caught error {0} with task {1}. exiting now."
-                                logger.error(m.format(e, job.description))
-                                raise SystemExit(1)
-
-                        retval.append((idx, task_result))
-                        self.do_finalizers(job, results)
-                        results.remove((job, idx, ret))
-
-                if len(results) == 0:
-                    break
-
-            retval.sort(key=lambda x: x[0])
-        else:
-            for job, idx, ret in results:
-                try:
-                    retval.append((idx, ret.get()))
-                except Exception as e:
-                    if job.ignore_errors is True:
-                        m = 'caught error "{0}" in {1}, waiting for other tasks to finish'
-                        logger.error(m.format(e, job.description))
-                        has_errors = True
-                        errors.append((job, e))
+        pending = dict((idx, (job, ret)) for job, idx, ret in results)
+
+        while len(pending) > 0:
+            idx = self.wait_for_completion(pending)
+            job, ret = pending.pop(idx)
+
+            try:
+                retval.append((idx, self.collect(idx, ret.get())))
+            except Exception as e:
+                if job.ignore_errors is True:
+                    m = 'caught error "{0}" in {1}, waiting for other tasks to finish'
+                    logger.error(m.format(e, job.description))
+                    errors.append((job, e))
+                else:
+                    m = "caught error {0} with task {1}. exiting now."
+                    logger.error(m.format(e, job.description))
+                    raise SystemExit(1)
+            else:
+                cache_result(job)
+
+                finalizers = []
+                self.do_finalizers(job, finalizers, self.profile_key(idx))
+                for job, idx, ret in finalizers:
+                    pending[idx] = (job, ret)
+
+        if len(errors) > 0:
+            logger.error(PoolResultsError([err for _, err in errors]))
+            raise SystemExit(1)
+
+        retval.sort(key=lambda x: x[0])
+        return [r[1] for r in retval]
+
+    def graph_runner(self, jobs):
+        """
+        Runs the tasks in ``jobs`` (and embedded apps) as a dependency graph:
+        every task is dispatched to the pool as soon as all of the tasks it
+        depends on, and their finalizers, complete.
+
+        :returns: The results of all tasks and finalizers, in the order that
+           the tasks were added.
+        """
+
+        graph = TaskGraph(jobs)
+        graph.order()
+
+        waiting = dict((idx, len(deps)) for idx, deps in graph.edges.items())
+        outstanding = dict((idx, 0) for idx in waiting)
+        failed = set()
+        pending = {}
+        nodes = {}
+        retval = []
+        errors = []
+
+        def submit(node, job, parent=None):
+            submitted = []
+            self.add_task(job, submitted, parent)
+
+            for job, idx, ret in submitted:
+                outstanding[node] += 1
+                pending[idx] = (job, ret)
+                nodes[idx] = node
+
+        def finished(node):
+            ready = []
+            for dependent in sorted(graph.dependents[node]):
+                if node in failed:
+                    failed.add(dependent)
+
+                waiting[dependent] -= 1
+                if waiting[dependent] == 0:
+                    ready.append(dependent)
+
+            return ready
+
+        def release(nodes):
+            # a loop rather than recursion, because long chains of tasks that
+            # don't need to rebuild are common.
+            nodes = list(nodes)
+            while len(nodes) > 0:
+                node = nodes.pop(0)
+                job = graph.tasks[node]
+
+                if node in failed:
+                    m = 'not running {0} after failed dependency'
+                    logger.warning(m.format(job.description))
+                elif job.needs_rebuild is True:
+                    submit(node, job)
+                    continue
+                else:
+                    self.skip_task(job)
+
+                nodes.extend(finished(node))
+
+        release(graph.roots())
+
+        while len(pending) > 0:
+            idx = self.wait_for_completion(pending)
+            job, ret = pending.pop(idx)
+            node = nodes.pop(idx)
+            outstanding[node] -= 1
+
+            try:
+                retval.append(((node, idx), self.collect(idx, ret.get())))
+            except Exception as e:
+                if job.ignore_errors is True:
+                    m = 'caught error "{0}" in {1}, waiting for other tasks to finish'
+                    logger.error(m.format(e, job.description))
+                    errors.append((job, e))
+                    failed.add(node)
+                else:
+                    m = "caught error {0} with task {1}. exiting now."
+                    logger.error(m.format(e, job.description))
+                    raise SystemExit(1)
+            else:
+                cache_result(job)
+
+                for task in job.finalizers:
+                    if isinstance(task, tuple):
+                        task = task[1]
+
+                    if task.needs_rebuild is True:
+                        submit(node, task, self.profile_key(idx))
                     else:
-                        m = "caught error {0} with task {1}. exiting now."
-                        logger.error(m.format(e, job.description))
-                        raise SystemExit(1)
+                        self.skip_task(task)
 
-        if has_errors is True:
-            error_list = []
-            for job, err in errors:
-                error_list.append(err)
+            if outstanding[node] == 0:
+                release(finished(node))
 
-            logger.error(PoolResultsError(error_list))
+        if len(errors) > 0:
+            logger.error(PoolResultsError([err for _, err in errors]))
             raise SystemExit(1)
-        else:
-            return [r[1] for r in retval]
+
+        retval.sort(key=lambda x: x[0])
+        return [r[1] for r in retval]
 
 
 class SerialPool(object):
@@ -204,9 +494,13 @@ class SerialPool(object):
         return results
 
     def runner(self, jobs):
+        profiler = get_profiler()
+
         results = []
         for job in jobs:
             if job.needs_rebuild is False:
+                if profiler is not None:
+                    profiler.skip(job)
                 continue
 
             if job.description is not None:
@@ -215,7 +509,11 @@ class SerialPool(object):
                 msg = str(job.job)
 
             logger.debug('running: ' + msg)
+            start = time.time()
             results.append(job.run())
+            if profiler is not None:
+                profiler.record(job, start, time.time())
+            cache_result(job)
 
             if isinstance(job, Task) and len(job.finalizers) >= 1:
                 logger.debug('finalizing: ' + msg)
@@ -223,26 +521,70 @@ class SerialPool(object):
 
         return results
 
+    def graph_runner(self, jobs):
+        return self.runner(TaskGraph(jobs).ordered_tasks())
+
     async_runner = runner
 
 
 class ThreadPool(WorkerPool):
     def __init__(self, pool_size=None):
-        self.pool_size = pool_size
+        super(ThreadPool, self).__init__(pool_size)
         self.p = multiprocessing.dummy.Pool(self.pool_size)
         logger.debug('new thread pool object')
 
 
 class ProcessPool(WorkerPool):
     def __init__(self, pool_size=None):
-        self.pool_size = pool_size
-        self.p = multiprocessing.Pool(self.pool_size)
+        super(ProcessPool, self).__init__(pool_size)
+        self.p = get_process_pool(self.pool_size)
+        self.references = {}
         logger.debug('new process pool object')
 
+    def close(self):
+        # the underlying pool is shared, and closes when the program exits.
+        self.references = {}
+
+    def async_runner(self, jobs):
+        # configuration objects may change between batches of tasks.
+        self.references = {}
+        return super(ProcessPool, self).async_runner(jobs)
+
+    def graph_runner(self, jobs):
+        self.references = {}
+        return super(ProcessPool, self).graph_runner(jobs)
+
+    def reference(self, value):
+        if not isinstance(value, ConfigurationBase):
+            return value
+        elif id(value) not in self.references:
+            self.references[id(value)] = (value, ConfigurationReference(value))
+
+        return self.references[id(value)][1]
+
+    def prepare_task(self, job):
+        """
+        Returns a copy of ``job`` where configuration objects in the arguments
+        are replaced with references, so that large configuration objects are
+        not pickled for every task.
+        """
+
+        if not isinstance(job, Task) or job.args is None:
+            return job
+
+        shipped = copy.copy(job)
+
+        if job.args_type == 'kwargs':
+            shipped.args = dict((key, self.reference(value)) for key, value in job.args.items())
+        else:
+            shipped.args = [self.reference(value) for value in job.args]
+
+        return shipped
+
 
 class EventPool(WorkerPool):
     def __init__(self, pool_size=None):
-        self.pool_size = pool_size
+        super(EventPool, self).__init__(pool_size)
 
         if sys.version_info >= (3, 0):
             logger.error('gevent is not supported on this platform, using threads')
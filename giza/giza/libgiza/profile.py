@@ -0,0 +1,291 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+:mod:`profile` records a timeline of a build: when each task was submitted to
+a pool, when and on which worker it ran, why tasks did not need to run, how
+long finalizers waited after the task that they finalize, and the duration of
+named phases of the build.
+
+Profiling is off by default. Call
+:func:`~giza.libgiza.profile.enable_profiling()` to start recording, after
+which the pools in :mod:`giza.libgiza.pool` report to the profiler returned by
+:func:`~giza.libgiza.profile.get_profiler()`. The
+:meth:`~giza.libgiza.profile.Profiler.dump()` method writes the timeline in the
+Chrome trace event format, which ``chrome://tracing`` and Perfetto display,
+and :meth:`~giza.libgiza.profile.Profiler.summary()` returns a table of the
+slowest tasks and phases.
+"""
+
+import atexit
+import collections
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger('giza.libgiza.profile')
+
+
+def worker_name():
+    "Returns a name for the current worker process and thread."
+
+    return '{0}:{1}'.format(os.getpid(), threading.current_thread().name)
+
+
+class TaskTiming(object):
+    """
+    Wraps the result of a task that ran in a worker with the time that it
+    started and finished and the name of the worker, so that the main process
+    can record them.
+    """
+
+    def __init__(self, result, start, end, worker):
+        self.result = result
+        self.start = start
+        self.end = end
+        self.worker = worker
+
+
+def run_timed(function, task):
+    "Calls ``function(task)`` and returns its result as a :class:`TaskTiming`."
+
+    start = time.time()
+    result = function(task)
+
+    return TaskTiming(result, start, time.time(), worker_name())
+
+
+def describe(job):
+    description = getattr(job, 'description', None)
+
+    if description is None:
+        description = str(getattr(job, 'job', job))
+
+    return description
+
+
+class Profiler(object):
+    """
+    Collects the timing of tasks and phases for one build. ``key`` arguments
+    identify a submitted task, and are unique within the build.
+    """
+
+    def __init__(self, fn=None):
+        self.fn = fn
+        self.start = time.time()
+        self.tasks = []
+        self.phases = []
+        self.skipped = collections.Counter()
+        self._submitted = {}
+        self._lock = threading.Lock()
+
+    def submitted(self, key, job, parent=None):
+        """
+        Records the submission of ``job`` to a pool. ``parent`` is the key of
+        the task that ``job`` finalizes, if any.
+        """
+
+        with self._lock:
+            if parent is not None and parent in self._submitted:
+                parent_end = self._submitted[parent][3]
+            else:
+                parent_end = None
+
+            self._submitted[key] = [describe(job), time.time(), parent_end, None]
+
+    def completed(self, key, timing):
+        "Records the :class:`TaskTiming` of the task submitted as ``key``."
+
+        with self._lock:
+            if key not in self._submitted:
+                return
+
+            record = self._submitted[key]
+            record[3] = timing.end
+            description, submitted, parent_end, _ = record
+
+            if parent_end is None:
+                finalizer_wait = None
+            else:
+                finalizer_wait = max(0.0, timing.start - parent_end)
+
+            self.tasks.append({'description': description,
+                               'worker': timing.worker,
+                               'start': timing.start,
+                               'end': timing.end,
+                               'queue_wait': max(0.0, timing.start - submitted),
+                               'finalizer_wait': finalizer_wait})
+
+    def record(self, job, start, end, worker=None):
+        "Records a task that ran in the main process."
+
+        with self._lock:
+            self.tasks.append({'description': describe(job),
+                               'worker': worker or worker_name(),
+                               'start': start,
+                               'end': end,
+                               'queue_wait': 0.0,
+                               'finalizer_wait': None})
+
+    def skip(self, job):
+        "Records a task that did not need to run."
+
+        with self._lock:
+            self.skipped[getattr(job, 'skip_reason', None) or 'not needed'] += 1
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        "A context manager that records the duration of the phase ``name``."
+
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add_phase(name, start, time.time())
+
+    def add_phase(self, name, start, end):
+        with self._lock:
+            self.phases.append({'name': name, 'start': start, 'end': end})
+
+    def trace(self):
+        "Returns the recorded timeline as a Chrome trace event document."
+
+        def usec(seconds):
+            return int((seconds - self.start) * 1000000)
+
+        pid = os.getpid()
+        workers = {}
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0,
+                   'args': {'name': 'giza'}},
+                  {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': 0,
+                   'args': {'name': 'phases'}}]
+
+        for phase in self.phases:
+            events.append({'name': phase['name'], 'cat': 'phase', 'ph': 'X',
+                           'pid': pid, 'tid': 0,
+                           'ts': usec(phase['start']),
+                           'dur': usec(phase['end']) - usec(phase['start'])})
+
+        for task in self.tasks:
+            if task['worker'] not in workers:
+                workers[task['worker']] = len(workers) + 1
+                events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid,
+                               'tid': workers[task['worker']],
+                               'args': {'name': task['worker']}})
+
+            args = {'queue_wait': round(task['queue_wait'], 6)}
+            if task['finalizer_wait'] is not None:
+                args['finalizer_wait'] = round(task['finalizer_wait'], 6)
+
+            events.append({'name': task['description'], 'cat': 'task', 'ph': 'X',
+                           'pid': pid, 'tid': workers[task['worker']],
+                           'ts': usec(task['start']),
+                           'dur': usec(task['end']) - usec(task['start']),
+                           'args': args})
+
+        return {'traceEvents': events,
+                'displayTimeUnit': 'ms',
+                'otherData': {'skipped': dict(self.skipped)}}
+
+    def dump(self, fn=None):
+        "Writes the Chrome trace event document to ``fn``."
+
+        fn = fn or self.fn
+        if fn is None:
+            return
+
+        dirname = os.path.dirname(fn)
+        if dirname != '' and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+
+        with open(fn, 'w') as f:
+            json.dump(self.trace(), f)
+
+        logger.info('wrote build profile with {0} tasks to {1}'.format(len(self.tasks), fn))
+
+    def summary(self, num=10):
+        "Returns a list of lines that summarize the slowest tasks and phases."
+
+        lines = []
+
+        def table(title, rows):
+            lines.append(title)
+            for duration, extra, name in rows:
+                lines.append('  {0:>9.3f}s  {1:>9}  {2}'.format(duration, extra, name))
+
+        phases = sorted(((p['end'] - p['start'], '', p['name']) for p in self.phases),
+                        reverse=True)
+        table('slowest phases:', phases[:num])
+
+        tasks = sorted(((t['end'] - t['start'], '{0:.3f}s'.format(t['queue_wait']),
+                         t['description']) for t in self.tasks),
+                       key=lambda row: row[0], reverse=True)
+        table('slowest tasks (duration, queue wait):', tasks[:num])
+
+        waits = [t['finalizer_wait'] for t in self.tasks if t['finalizer_wait'] is not None]
+        total = sum(t['end'] - t['start'] for t in self.tasks)
+        lines.append('ran {0} tasks in {1:.3f}s of task time'.format(len(self.tasks), total))
+
+        if len(waits) > 0:
+            lines.append('finalizers waited {0:.3f}s on average, {1:.3f}s at most'.format(
+                sum(waits) / len(waits), max(waits)))
+
+        for reason, count in sorted(self.skipped.items()):
+            lines.append('skipped {0} tasks: {1}'.format(count, reason))
+
+        return lines
+
+    def report(self):
+        "Writes the trace, if there's a file name, and logs the summary."
+
+        self.dump()
+
+        for line in self.summary():
+            logger.info(line)
+
+
+_profilers = []
+
+
+def enable_profiling(fn=None):
+    """
+    Starts recording a profile of the build, and returns the
+    :class:`Profiler`. When the program exits, writes the trace to ``fn`` and
+    logs a summary.
+    """
+
+    if len(_profilers) == 0:
+        _profilers.append(Profiler(fn))
+        atexit.register(report_profile)
+
+    return _profilers[0]
+
+
+def get_profiler():
+    "Returns the active :class:`Profiler`, or ``None`` when profiling is off."
+
+    if len(_profilers) == 0:
+        return None
+    else:
+        return _profilers[0]
+
+
+def report_profile():
+    profiler = get_profiler()
+
+    if profiler is not None:
+        profiler.report()
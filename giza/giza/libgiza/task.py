@@ -69,11 +69,17 @@ class Task(object):
         self._force = None
         self._ignore_errors = None
         self._description = None
+        self._cache = None
+        self.cacheable = False
         if job is not None:
             self.job = job
         self._finalizers = []
+        self._requires = []
         self.args_type = None
 
+        # why the last call to needs_rebuild returned False, for profiling.
+        self.skip_reason = None
+
         self.target = target
         self.dependency = dependency
 
@@ -88,6 +94,16 @@ class Task(object):
         logger.debug('created task object calling {0}, for {1}'.format(job, description))
         self._task_id = None
 
+    def __getstate__(self):
+        # the configuration object, finalizers, and required tasks are only
+        # used to schedule this task in the main process, and don't need to be
+        # pickled for worker processes.
+        state = self.__dict__.copy()
+        state['_conf'] = None
+        state['_finalizers'] = []
+        state['_requires'] = []
+        return state
+
     @property
     def task_id(self):
         if self._task_id is None:
@@ -158,6 +174,17 @@ class Task(object):
         self.target = target
         self.dependency = dependency
 
+    @property
+    def cache(self):
+        return self._cache
+
+    @cache.setter
+    def cache(self, value):
+        if value is None or hasattr(value, 'is_current'):
+            self._cache = value
+        else:
+            raise TypeError(type(value))
+
     @property
     def conf(self):
         return self._conf
@@ -227,6 +254,29 @@ class Task(object):
         else:
             raise TypeError(type(value))
 
+    @property
+    def requires(self):
+        """
+        A list of tasks that must complete before this task can run when
+        scheduled with a dependency graph (see
+        :class:`~giza.libgiza.graph.TaskGraph()`), in addition to the tasks
+        that produce its ``dependency`` files.
+        """
+
+        return self._requires
+
+    @requires.setter
+    def requires(self, value):
+        if hasattr(value, 'run'):
+            self._requires.append(value)
+        elif isinstance(value, basestring):
+            raise TypeError(type(value))
+        elif isinstance(value, collections.Iterable):
+            for task in value:
+                self.requires = task
+        else:
+            raise TypeError(type(value))
+
     def add_finalizer(self, task):
         self.finalizers = task
 
@@ -239,6 +289,14 @@ class Task(object):
         returns ``True`` if there is no target or when running in *force* mode,
         otherwise checks the ``mtime`` of the files using
         :func:`giza.libgiza.task.check_dependency()`.
+
+        When the task is :attr:`~giza.libgiza.task.Task.cacheable` and has a
+        :class:`~giza.libgiza.cache.TaskCache()`, a task that the ``mtime``
+        check would rebuild is still skipped if its arguments and the content
+        of its dependencies are identical to the last successful run. Tasks
+        are not cacheable by default, because some tasks (e.g. Sphinx builds)
+        depend on files that are not in their dependency list, and giza
+        touches their dependencies to force a rebuild.
         """
 
         if self.target is None:
@@ -247,8 +305,21 @@ class Task(object):
             return True
         elif self.force is True:
             return True
+        elif check_dependency(self.target, self.dependency) is False:
+            self.skip_reason = 'target newer than dependencies'
+            return False
+        elif self.cacheable is True and self.cache is not None and self.cache.is_current(self):
+            logger.debug('content of dependencies for {0} unchanged, skipping'.format(self.target))
+            self.skip_reason = 'dependency content unchanged'
+            return False
         else:
-            return check_dependency(self.target, self.dependency)
+            return True
+
+    def cache_result(self):
+        "Records a successful run of the task in the task cache, if any."
+
+        if self.cacheable is True and self.cache is not None:
+            self.cache.update(self)
 
     def run(self):
         logger.debug('({0}) calling {1}'.format(self.task_id, self.job))
@@ -14,10 +14,11 @@
 
 import numbers
 import random
+import time
 from unittest import TestCase
 
 from giza.libgiza.app import BuildApp
-from giza.libgiza.pool import ThreadPool, ProcessPool, SerialPool
+from giza.libgiza.pool import ThreadPool, ProcessPool, SerialPool, ConfigurationReference
 from giza.libgiza.task import Task
 from giza.config.main import Configuration
 from giza.config.runtime import RuntimeStateConfig
@@ -796,3 +797,67 @@ class TestBuildAppAlternateConstructor(CommonAppSuite, TestCase):
 
     def test_pool_size(self):
         self.assertIsNone(self.app.pool_size)
+
+
+def get_force(conf):
+    return conf.force
+
+
+def delayed_value(delay, value):
+    time.sleep(delay)
+    return value
+
+
+class CommonWorkerPoolSuite(object):
+    def tearDown(self):
+        self.pool.close()
+
+    def test_results_in_submission_order(self):
+        tasks = [Task(job=delayed_value, args=[0.05 * (4 - i), i]) for i in range(5)]
+
+        self.assertEqual(self.pool.runner(tasks), [0, 1, 2, 3, 4])
+
+    def test_finalizer_starts_before_slow_task_completes(self):
+        slow = Task(job=delayed_value, args=[0.5, 'slow'])
+        fast = Task(job=delayed_value, args=[0, 'fast'])
+        fast.finalizers = Task(job=time.time)
+
+        start = time.time()
+        results = self.pool.runner([slow, fast])
+
+        self.assertEqual(results[:2], ['slow', 'fast'])
+        self.assertTrue(results[2] - start < 0.5)
+
+    def test_errors_exit(self):
+        tasks = [Task(job=delayed_value, args=[0, 1]),
+                 Task(job=delayed_value, args=[None, 2])]
+
+        with self.assertRaises(SystemExit):
+            self.pool.runner(tasks)
+
+
+class TestThreadWorkerPool(CommonWorkerPoolSuite, TestCase):
+    def setUp(self):
+        self.pool = ThreadPool(2)
+
+
+class TestProcessWorkerPool(CommonWorkerPoolSuite, TestCase):
+    def setUp(self):
+        self.pool = ProcessPool(2)
+
+    def test_pools_share_workers(self):
+        self.assertIs(self.pool.p, ProcessPool(2).p)
+
+    def test_configuration_arguments_sent_by_reference(self):
+        c = RuntimeStateConfig()
+        c.force = True
+
+        tasks = [Task(job=get_force, args=[c]) for _ in range(4)]
+        tasks.append(Task(job=get_force, args={'conf': c}))
+
+        self.assertEqual(self.pool.runner(tasks), [True] * 5)
+        self.assertEqual(len(self.pool.references), 1)
+
+        shipped = self.pool.prepare_task(tasks[0])
+        self.assertIsInstance(shipped.args[0], ConfigurationReference)
+        self.assertIs(tasks[0].args[0], c)
@@ -0,0 +1,248 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import pickle
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+from giza.libgiza.app import BuildApp
+from giza.libgiza.cache import TaskCache, DocumentCache, fingerprint
+from giza.libgiza.config import ConfigurationBase
+from giza.libgiza.task import Task
+
+
+def write_file(fn, content):
+    with open(fn, 'w') as f:
+        f.write(content)
+
+
+def copy_file(source, target, *args):
+    shutil.copyfile(source, target)
+
+
+class Settings(ConfigurationBase):
+    _option_registry = ['name']
+
+
+class TestTaskCache(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache_fn = os.path.join(self.dir, 'cache', 'task-cache.json')
+        self.source = os.path.join(self.dir, 'source.txt')
+        self.target = os.path.join(self.dir, 'target.txt')
+
+        write_file(self.source, 'content')
+
+        self.cache = TaskCache(self.cache_fn)
+        self.task = Task(job=copy_file,
+                         args=[self.source, self.target],
+                         target=self.target,
+                         dependency=self.source)
+        self.task.cacheable = True
+        self.task.cache = self.cache
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def bump_mtime(self, fn):
+        future = time.time() + 10
+        os.utime(fn, (future, future))
+
+    def run_task(self):
+        self.assertTrue(self.task.needs_rebuild)
+        self.task.run()
+        self.task.cache_result()
+
+    def test_first_run_needs_rebuild(self):
+        self.assertTrue(self.task.needs_rebuild)
+
+    def test_touched_dependency_skipped(self):
+        self.run_task()
+        self.bump_mtime(self.source)
+
+        self.assertFalse(self.task.needs_rebuild)
+
+    def test_changed_dependency_rebuilds(self):
+        self.run_task()
+        write_file(self.source, 'new content')
+        self.bump_mtime(self.source)
+
+        self.assertTrue(self.task.needs_rebuild)
+
+    def test_not_cacheable_rebuilds(self):
+        self.run_task()
+        self.bump_mtime(self.source)
+        self.task.cacheable = False
+
+        self.assertTrue(self.task.needs_rebuild)
+
+    def test_not_cacheable_not_recorded(self):
+        self.task.cacheable = False
+        self.task.run()
+        self.task.cache_result()
+
+        self.assertEqual(self.cache.tasks, {})
+
+    def test_changed_configuration_rebuilds(self):
+        self.task.args = [self.source, self.target, Settings({'name': 'one'})]
+        self.run_task()
+        self.bump_mtime(self.source)
+        self.assertFalse(self.task.needs_rebuild)
+
+        self.task.args = [self.source, self.target, Settings({'name': 'two'})]
+        self.assertTrue(self.task.needs_rebuild)
+
+    def test_unknown_arguments_not_cached(self):
+        self.task.args = [self.source, self.target, object()]
+        self.run_task()
+        self.bump_mtime(self.source)
+
+        self.assertTrue(self.task.needs_rebuild)
+        self.assertEqual(self.cache.tasks, {})
+
+    def test_changed_arguments_rebuilds(self):
+        self.run_task()
+        self.bump_mtime(self.source)
+        self.task.args = [self.source, self.target, 'extra']
+
+        self.assertTrue(self.task.needs_rebuild)
+
+    def test_missing_target_rebuilds(self):
+        self.run_task()
+        os.remove(self.target)
+
+        self.assertTrue(self.task.needs_rebuild)
+
+    def test_force_rebuilds(self):
+        self.run_task()
+        self.bump_mtime(self.source)
+        self.task.force = True
+
+        self.assertTrue(self.task.needs_rebuild)
+
+    def test_cache_persists(self):
+        self.run_task()
+        self.cache.dump()
+        self.assertTrue(os.path.isfile(self.cache_fn))
+        self.bump_mtime(self.source)
+
+        self.task.cache = TaskCache(self.cache_fn)
+        self.assertFalse(self.task.needs_rebuild)
+
+    def test_directory_dependency_not_cached(self):
+        self.task.dependency = self.dir
+        self.assertFalse(self.cache.is_current(self.task))
+        self.task.cache_result()
+        self.assertEqual(self.cache.tasks, {})
+
+    def test_pickled_cache_has_no_entries(self):
+        self.run_task()
+        self.assertNotEqual(self.cache.tasks, {})
+
+        cache = pickle.loads(pickle.dumps(self.cache))
+        self.assertEqual(cache.fn, self.cache_fn)
+        self.assertEqual(cache.tasks, {})
+
+    def test_app_propagates_and_dumps_cache(self):
+        app = BuildApp.new(pool_type='serial', cache=self.cache_fn)
+
+        self.task.cache = None
+        app.add(self.task)
+        self.assertIs(self.task.cache, app.cache)
+
+        app.run()
+        self.assertTrue(os.path.isfile(self.target))
+        self.assertTrue(os.path.isfile(self.cache_fn))
+
+
+class TestFingerprint(TestCase):
+    def test_stable_for_primitives(self):
+        self.assertEqual(fingerprint([1, 'a', {'b': None}]),
+                         fingerprint([1, 'a', {'b': None}]))
+
+    def test_configuration_uses_content(self):
+        self.assertEqual(fingerprint(Settings({'name': 'one'})),
+                         fingerprint(Settings({'name': 'one'})))
+        self.assertNotEqual(fingerprint(Settings({'name': 'one'})),
+                            fingerprint(Settings({'name': 'two'})))
+
+    def test_objects_raise(self):
+        self.assertRaises(TypeError, fingerprint, object())
+
+    def test_functions_use_name(self):
+        self.assertEqual(fingerprint(copy_file),
+                         'giza.libgiza.test.test_cache.copy_file')
+
+
+class TestDocumentCache(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache_fn = os.path.join(self.dir, 'yaml-cache.pickle')
+        self.fn = os.path.join(self.dir, 'steps.yaml')
+
+        write_file(self.fn, 'ref: one\ntitle: first\n---\nref: two\ntitle: second\n')
+        self.cache = DocumentCache(self.cache_fn)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_documents(self):
+        self.assertEqual(self.cache.documents(self.fn),
+                         [{'ref': 'one', 'title': 'first'}, {'ref': 'two', 'title': 'second'}])
+
+    def test_documents_are_copies(self):
+        self.cache.documents(self.fn)[0]['ref'] = 'changed'
+        self.assertEqual(self.cache.documents(self.fn)[0]['ref'], 'one')
+
+    def test_changed_file_reparsed(self):
+        self.cache.documents(self.fn)
+        write_file(self.fn, 'ref: three\n')
+
+        self.assertEqual(self.cache.documents(self.fn), [{'ref': 'three'}])
+
+    def test_copies_share_documents(self):
+        copy_fn = os.path.join(self.dir, 'copy.yaml')
+        copy_file(self.fn, copy_fn)
+
+        self.cache.documents(self.fn)
+        self.assertIsNotNone(self.cache.lookup(copy_fn))
+        self.assertEqual(len(self.cache.digests), 1)
+
+    def test_preload_persists(self):
+        self.cache.preload([self.fn])
+        self.assertTrue(os.path.isfile(self.cache_fn))
+
+        cache = DocumentCache(self.cache_fn)
+        self.assertIsNotNone(cache.lookup(self.fn))
+        self.assertEqual(cache.documents(self.fn)[1]['ref'], 'two')
+
+    def test_reloads_file_written_by_other_process(self):
+        # e.g. a pool worker forked before the main process parsed files.
+        self.assertIsNone(self.cache.lookup(self.fn))
+
+        DocumentCache(self.cache_fn).preload([self.fn])
+        self.assertIsNotNone(self.cache.lookup(self.fn))
+
+    def test_reload_keeps_own_entries(self):
+        other_fn = os.path.join(self.dir, 'other.yaml')
+        write_file(other_fn, 'ref: other\n')
+
+        self.cache.documents(other_fn)
+        DocumentCache(self.cache_fn).preload([self.fn])
+
+        self.assertIsNotNone(self.cache.lookup(self.fn))
+        self.assertIsNotNone(self.cache.lookup(other_fn))
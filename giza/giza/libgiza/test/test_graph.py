@@ -0,0 +1,177 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from giza.libgiza.app import BuildApp
+from giza.libgiza.graph import TaskGraph, DependencyCycleError
+from giza.libgiza.task import Task
+
+
+def append_line(fn, line):
+    with open(fn, 'a') as f:
+        f.write(line + '\n')
+
+    return line
+
+
+def read_lines(fn):
+    with open(fn, 'r') as f:
+        return [ln.rstrip() for ln in f.readlines()]
+
+
+class TestTaskGraph(TestCase):
+    def test_file_dependency_edge(self):
+        first = Task(job=sum, target='build/a', dependency=None)
+        second = Task(job=sum, target='build/b', dependency='build/a')
+
+        graph = TaskGraph([second, first])
+        self.assertEqual(graph.ordered_tasks(), [first, second])
+
+    def test_directory_target_edge(self):
+        first = Task(job=sum, target='build/source', dependency=None)
+        second = Task(job=sum, target='build/out', dependency=['build/source/index.txt'])
+
+        graph = TaskGraph([second, first])
+        self.assertEqual(graph.edges[0], set([1]))
+
+    def test_requires_edge(self):
+        first = Task(job=sum, target=True)
+        second = Task(job=sum, target=True)
+        first.requires = second
+
+        graph = TaskGraph([first, second])
+        self.assertEqual(graph.ordered_tasks(), [second, first])
+
+    def test_independent_tasks_keep_order(self):
+        tasks = [Task(job=sum, target=str(i)) for i in range(10)]
+
+        graph = TaskGraph(tasks)
+        self.assertEqual(graph.ordered_tasks(), tasks)
+        self.assertEqual(graph.roots(), list(range(10)))
+
+    def test_embedded_apps_flattened(self):
+        app = BuildApp()
+        sub_app = app.add('app')
+        t = sub_app.add('task')
+        app.add('task')
+
+        graph = TaskGraph(app.queue)
+        self.assertEqual(len(graph.tasks), 2)
+        self.assertIs(graph.tasks[0], t)
+
+    def test_cycle_raises(self):
+        first = Task(job=sum, target='a', dependency='b')
+        second = Task(job=sum, target='b', dependency='a')
+
+        with self.assertRaises(DependencyCycleError):
+            TaskGraph([first, second]).order()
+
+    def test_requires_rejects_strings(self):
+        with self.assertRaises(TypeError):
+            Task().requires = 'task'
+
+
+class CommonGraphRunnerSuite(object):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.log = os.path.join(self.dir, 'log')
+
+        self.app = BuildApp.new(pool_type=self.pool_type, pool_size=4)
+        self.app.scheduler = 'graph'
+
+    def tearDown(self):
+        self.app.close_pool()
+        shutil.rmtree(self.dir)
+
+    def test_dependencies_run_first(self):
+        tasks = []
+        for i in range(8):
+            t = self.app.add('task')
+            t.job = append_line
+            t.args = [self.log, str(i)]
+            t.target = True
+            if i > 0:
+                t.requires = tasks[i - 1]
+            tasks.append(t)
+
+        results = self.app.run()
+
+        self.assertEqual(results, [str(i) for i in range(8)])
+        self.assertEqual(read_lines(self.log), [str(i) for i in range(8)])
+
+    def test_finalizers_complete_before_dependents(self):
+        first = self.app.add('task')
+        first.job = append_line
+        first.args = [self.log, 'first']
+        first.target = True
+        first.finalizers = Task(job=append_line, args=[self.log, 'finalizer'])
+
+        second = self.app.add('task')
+        second.job = append_line
+        second.args = [self.log, 'second']
+        second.target = True
+        second.requires = first
+
+        self.app.run()
+
+        self.assertEqual(read_lines(self.log), ['first', 'finalizer', 'second'])
+
+    def test_failed_dependency_skips_dependents(self):
+        first = self.app.add('task')
+        first.job = append_line
+        first.args = [None, 'first']
+        first.target = True
+
+        second = self.app.add('task')
+        second.job = append_line
+        second.args = [self.log, 'second']
+        second.target = True
+        second.requires = first
+
+        with self.assertRaises(self.task_error):
+            self.app.run()
+
+        self.assertFalse(os.path.exists(self.log))
+
+    def test_embedded_apps(self):
+        sub_app = self.app.add('app')
+        t = sub_app.add('task')
+        t.job = sum
+        t.args = [[1, 2], 0]
+
+        t = self.app.add('task')
+        t.job = sum
+        t.args = [[3, 4], 0]
+
+        self.assertEqual(self.app.run(), [3, 7])
+
+
+class TestThreadGraphRunner(CommonGraphRunnerSuite, TestCase):
+    pool_type = 'thread'
+    task_error = SystemExit
+
+
+class TestProcessGraphRunner(CommonGraphRunnerSuite, TestCase):
+    pool_type = 'process'
+    task_error = SystemExit
+
+
+class TestSerialGraphRunner(CommonGraphRunnerSuite, TestCase):
+    # the serial pool doesn't catch errors in tasks.
+    pool_type = 'serial'
+    task_error = TypeError
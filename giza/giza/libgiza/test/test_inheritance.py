@@ -17,7 +17,8 @@ import os
 from unittest import TestCase
 
 from giza.libgiza.inheritance import (DataContentBase, DataCache,
-                                      InheritableContentError, InheritableContentBase)
+                                      InheritableContentError, InheritableContentBase,
+                                      UnitIndex, get_template, inherit_value)
 
 from giza.config.main import Configuration
 from giza.config.runtime import RuntimeStateConfig
@@ -134,6 +135,37 @@ class TestDataCache(TestCase):
                 self.assertNotIn(fn, self.data)
 
 
+class TestUnitIndex(TestCase):
+    def setUp(self):
+        self.path = get_test_file_path()
+        self.index = UnitIndex([os.path.dirname(self.path)])
+
+    def test_find_by_name(self):
+        self.assertEqual(self.index.find('example-add-two.yaml'),
+                         os.path.join(self.path, 'example-add-two.yaml'))
+        self.assertEqual(self.index.find('data-inheritance/example-add-two.yaml'),
+                         os.path.join(self.path, 'example-add-two.yaml'))
+
+    def test_find_missing(self):
+        self.assertIsNone(self.index.find('example-add-four.yaml'))
+
+    def test_index_built_once(self):
+        self.index.find('example-add-one.yaml')
+        self.index.paths = []
+
+        self.assertIsNotNone(self.index.find('example-add-three.yaml'))
+
+    def test_fetch_by_name(self):
+        class TestDataCache(DataCache):
+            search_paths = [self.path]
+
+        data = TestDataCache([], Configuration())
+
+        self.assertEqual(data.fetch('example-add-two.yaml', 'two-second').ref, 'two-second')
+        with self.assertRaises(InheritableContentError):
+            data.fetch('example-add-two.yaml', 'one-first')
+
+
 class TestDataContentBase(TestCase):
     def setUp(self):
         self.c = Configuration()
@@ -250,3 +282,42 @@ class TestBaseTemplateRendering(TestCase):
         self.data.render()
         self.assertFalse('{{' in self.data.pre)
         self.assertTrue('foo' in self.data.pre)
+
+    def test_template_cache(self):
+        self.assertIs(get_template('a {{state}} test'), get_template('a {{state}} test'))
+
+    def test_list_without_templates_not_rendered(self):
+        code = ['db.test.find()', 'db.test.count()']
+        self.data.content = code
+        self.data.render()
+        self.assertIs(self.data.content, code)
+
+    def test_list_replacement(self):
+        self.data.content = ['db.{{state}}.find()', 'db.test.count()']
+        self.data.render()
+        self.assertEqual(self.data.content, ['db.foo.find()', 'db.test.count()'])
+
+
+class TestInheritValue(TestCase):
+    def setUp(self):
+        self.c = Configuration()
+        self.c.runstate = RuntimeStateConfig()
+
+    def test_strings_shared_containers_copied(self):
+        value = {'content': ['line one', 'line two']}
+        copied = inherit_value(value)
+
+        self.assertEqual(copied, value)
+        self.assertIsNot(copied['content'], value['content'])
+        self.assertIs(copied['content'][0], value['content'][0])
+
+    def test_content_copied_conf_shared(self):
+        content = InheritableContentBase({'pre': 'pre text'}, self.c)
+        copied = inherit_value(content)
+
+        self.assertIsInstance(copied, InheritableContentBase)
+        self.assertIs(copied.conf, content.conf)
+        self.assertEqual(copied.pre, 'pre text')
+
+        copied.pre = 'changed'
+        self.assertEqual(content.pre, 'pre text')
@@ -0,0 +1,93 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import giza.libgiza.profile
+
+from giza.libgiza.app import BuildApp
+from giza.libgiza.profile import Profiler
+from giza.libgiza.task import Task
+
+
+def noop(value):
+    return value
+
+
+class TestProfiler(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.profiler = Profiler(os.path.join(self.dir, 'trace.json'))
+        giza.libgiza.profile._profilers.append(self.profiler)
+
+    def tearDown(self):
+        giza.libgiza.profile._profilers.remove(self.profiler)
+        shutil.rmtree(self.dir)
+
+    def run_app(self, pool_type):
+        app = BuildApp.new(pool_type=pool_type, pool_size=2)
+
+        for idx in range(4):
+            task = app.add('task')
+            task.job = noop
+            task.args = [idx]
+            task.description = 'task {0}'.format(idx)
+
+        task.finalizers = Task(job=noop, args=[5], description='finalizer')
+
+        with self.profiler.phase('run'):
+            results = app.run()
+
+        return results
+
+    def test_thread_pool(self):
+        self.assertEqual(self.run_app('thread'), [0, 1, 2, 3, 5])
+        self.assertEqual(len(self.profiler.tasks), 5)
+
+        finalizer = [t for t in self.profiler.tasks if t['description'].startswith('finalizer')][0]
+        self.assertIsNotNone(finalizer['finalizer_wait'])
+
+    def test_serial_pool(self):
+        self.run_app('serial')
+        self.assertEqual(len(self.profiler.tasks), 4)
+
+    def test_skip_reasons(self):
+        fn = os.path.join(self.dir, 'trace.json')
+        with open(fn, 'w') as f:
+            f.write('{}')
+
+        app = BuildApp.new(pool_type='thread', pool_size=2)
+        app.add(Task(job=noop, args=[1], target=fn, dependency=__file__))
+        app.run()
+
+        self.assertEqual(dict(self.profiler.skipped), {'target newer than dependencies': 1})
+
+    def test_trace_and_summary(self):
+        self.run_app('thread')
+        self.profiler.dump()
+
+        with open(self.profiler.fn, 'r') as f:
+            trace = json.load(f)
+
+        events = [e for e in trace['traceEvents'] if e['ph'] == 'X']
+        self.assertEqual(len(events), 6)
+        self.assertEqual(events[0]['name'], 'run')
+
+        summary = self.profiler.summary()
+        self.assertEqual(summary[0], 'slowest phases:')
+        self.assertIn('ran 5 tasks', '\n'.join(summary))
@@ -0,0 +1,65 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Runs the benchmarks in :mod:`giza.tools.benchmark` against synthetic
+projects, and compares the results with the results of a previous run.
+"""
+
+import logging
+
+import argh
+
+from giza.tools.benchmark import (benchmarks, scales, run_benchmarks, dump_results,
+                                  load_results, compare_results, render_results)
+
+logger = logging.getLogger('giza.operations.benchmark')
+
+
+@argh.arg('--scale', '-s', dest='_benchmark_scale', default='1k',
+          help='number of files: one of {0}, or an integer'.format(', '.join(sorted(scales))))
+@argh.arg('--benchmark', '-b', dest='_benchmark_names', nargs='*', default=None,
+          choices=list(benchmarks.keys()))
+@argh.arg('--repeat', '-r', dest='_benchmark_repeat', type=int, default=3)
+@argh.arg('--output', '-o', dest='_benchmark_output', default=None,
+          help='write results as JSON to this file')
+@argh.arg('--compare', '-c', dest='_benchmark_compare', default=None,
+          help='compare the results with the results stored in this file')
+@argh.arg('--threshold', dest='_benchmark_threshold', type=float, default=0.1,
+          help='slowdown (as a fraction) reported as a regression')
+@argh.expects_obj
+@argh.named('benchmark')
+def main(args):
+    if args._benchmark_scale in scales:
+        num_files = scales[args._benchmark_scale]
+    else:
+        num_files = int(args._benchmark_scale)
+
+    results = run_benchmarks(num_files, args._benchmark_names, args._benchmark_repeat)
+
+    comparison = None
+    if args._benchmark_compare is not None:
+        comparison = compare_results(load_results(args._benchmark_compare), results,
+                                     args._benchmark_threshold)
+
+    for line in render_results(results, comparison):
+        print(line)
+
+    if args._benchmark_output is not None:
+        dump_results(results, args._benchmark_output)
+        logger.info('wrote benchmark results to: ' + args._benchmark_output)
+
+    if comparison is not None and any(regressed for _, _, _, _, regressed in comparison):
+        logger.warning('benchmark results include regressions')
+        raise SystemExit(1)
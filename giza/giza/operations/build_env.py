@@ -15,9 +15,9 @@
 import datetime
 import logging
 import os
-import tarfile
 import tempfile
 import contextlib
+import re
 
 import argh
 import giza.libgiza.task
@@ -29,6 +29,7 @@ from sphinx.builders.html import get_stable_hash
 from giza.config.helper import fetch_config, get_builder_jobs
 from giza.config.sphinx_config import available_sphinx_builders
 from giza.operations.packaging import fetch_package
+from giza.tools.archive import create_archive, extract_archive
 from giza.tools.files import safe_create_directory, FileNotFoundError
 
 logger = logging.getLogger('giza.operations.build_env')
@@ -47,18 +48,30 @@ def cd(path):
     os.chdir(cur_dir)
 
 
-def is_git_dir(path):
-    git_dir = ''.join([os.path.sep, '.git', os.path.sep])
-    if git_dir in path:
-        return True
-    else:
-        return False
+def extract_package_at_root(path, conf):
+    extract_archive(path, conf.paths.projectroot, conf.runstate.pool_size)
 
 
-def extract_package_at_root(path, conf):
-    with cd(conf.paths.projectroot):
-        with tarfile.open(path, "r:gz") as t:
-            t.extractall()
+def previous_build_env_archive(conf):
+    """
+    :returns: The path of the most recent build environment archive for the
+       current branch, or ``None`` if there are no archives.
+    """
+
+    prefix = '-'.join(['cache', conf.project.name, conf.git.branches.current]) + '-'
+    pattern = re.compile(r'^(\d+)-[0-9a-f]+\.tar\.gz$')
+
+    archives = []
+    for fn in os.listdir(conf.paths.buildarchive):
+        if fn.startswith(prefix):
+            match = pattern.match(fn[len(prefix):])
+            if match is not None:
+                archives.append((int(match.group(1)), fn))
+
+    if len(archives) == 0:
+        return None
+    else:
+        return os.path.join(conf.paths.buildarchive, max(archives)[1])
 
 
 def get_existing_builders(conf):
@@ -111,13 +124,16 @@ def package_build_env(builders, editions, languages, conf):
             if not os.path.exists(fn):
                 raise FileNotFoundError(fn)
 
+        # archive only the changes since the previous archive for this branch.
+        base = previous_build_env_archive(conf)
+
         try:
-            with tarfile.open(archive_path, 'w:gz') as t:
-                for fn in files_to_archive:
-                    t.add(fn, exclude=is_git_dir)
+            create_archive(archive_path, [(fn, fn) for fn in files_to_archive],
+                           exclusions=['.git'], base=base, threads=conf.runstate.pool_size)
             logger.info("created build-cache archive: " + archive_path)
         except Exception as e:
-            os.remove(archive_path)
+            if os.path.exists(archive_path):
+                os.remove(archive_path)
             logger.critical("failed to create archive: " + archive_path)
             logger.error(e)
 
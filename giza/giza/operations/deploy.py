@@ -23,7 +23,7 @@ import onetimepass as otp
 
 from giza.config.helper import fetch_config, new_credentials_config
 from giza.libgiza.app import BuildApp
-from giza.deploy import Deploy, deploy_target
+from giza.deploy import Deploy, deploy_host
 from giza.operations.sphinx_cmds import sphinx_publication
 
 logger = logging.getLogger('giza.operations.deploy')
@@ -55,6 +55,7 @@ def main(args):
 @argh.arg('--language', '-l', nargs='*', dest='languages_to_build')
 @argh.arg('--builder', '-b', nargs='*', default='html')
 @argh.arg('--serial_sphinx', action='store_true')
+@argh.arg('--shared_env', action='store_true')
 @argh.named('push')
 @argh.expects_obj
 def publish_and_deploy(args):
@@ -99,13 +100,19 @@ def deploy_tasks(c, app):
 
         d.load(target_pconf)
 
-        for cmd in d.deploy_commands():
+        # each host is a separate task, so the app's pool bounds the number
+        # of concurrent deployments.
+        for host, job, args in d.host_jobs():
             task = app.add('task')
-            task.args = ' '.join(cmd)
-            task.job = deploy_target
-
-            if c.runstate.dry_run is True:
-                logger.info('dry run: {0}'.format(' '.join(cmd)))
+            task.job = job
+            task.args = args
+            task.description = 'deploying {0} to {1}'.format(target, host)
+
+            if c.runstate.dry_run is True and job is deploy_host:
+                for cmd, _ in args[1]:
+                    logger.info('dry run: {0}'.format(' '.join(cmd)))
+            elif c.runstate.dry_run is True:
+                logger.info('dry run: delta deploy of {0} to {1}'.format(target, host))
 
     logger.info('completed deploy for: {0}'.format(' '.join(c.runstate.push_targets)))
 
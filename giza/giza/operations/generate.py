@@ -244,7 +244,8 @@ def source(args):
 
     with BuildApp.new(pool_type=conf.runstate.runner,
                       pool_size=conf.runstate.pool_size,
-                      force=conf.runstate.force).context() as app:
+                      force=conf.runstate.force,
+                      cache=conf.system.task_cache).context() as app:
         sphinx_content_preperation(app, conf)
 
 
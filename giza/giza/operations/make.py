@@ -66,6 +66,13 @@ def derive_command(name, conf):
         if conf.runstate.serial_sphinx is True:
             cmd.append('--serial_sphinx')
 
+        if conf.runstate.shared_env is True:
+            cmd.append('--shared_env')
+
+        if conf.runstate.since is not None:
+            cmd.append('--since')
+            cmd.append(conf.runstate.since)
+
         if len(conf.runstate.builder) > 0:
             cmd.append('--builder')
             cmd.append(' '.join(conf.runstate.builder))
@@ -127,6 +134,8 @@ def add_sphinx_build_options(action_spec, action, options, conf):
 
 @argh.arg('make_target', nargs="*")
 @argh.arg('--serial_sphinx', action='store_true')
+@argh.arg('--shared_env', action='store_true')
+@argh.arg('--since', default=None)
 @argh.named('make')
 @argh.expects_obj
 def main(args):
@@ -220,7 +229,8 @@ def run_make_operations(targets, conf):
 
     app = BuildApp.new(pool_type=conf.runstate.runner,
                        force=conf.runstate.force,
-                       pool_size=conf.runstate.pool_size)
+                       pool_size=conf.runstate.pool_size,
+                       cache=conf.system.task_cache)
 
     if sphinx_opts in tasks:
         conf.runstate.languages_to_build = list(sphinx_opts['languages'])
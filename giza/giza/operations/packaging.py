@@ -20,7 +20,6 @@ share and deploy artifacts and build environment data.
 import logging
 import datetime
 import os
-import tarfile
 import contextlib
 from six.moves import urllib
 
@@ -28,7 +27,9 @@ import argh
 import giza.libgiza.app
 
 from giza.config.helper import fetch_config
-from giza.tools.files import safe_create_directory, FileNotFoundError
+from giza.tools.archive import (create_archive as write_archive, extract_archive,
+                                archive_manifest_fn, load_archive_manifest)
+from giza.tools.files import FileNotFoundError
 from giza.operations.deploy import deploy_tasks
 
 logger = logging.getLogger('giza.operations.packaging')
@@ -55,14 +56,11 @@ def package_filename(target, conf):
     return fn
 
 
-def create_archive(files_to_archive, tarball_name):
+def create_archive(files_to_archive, tarball_name, conf=None):
     # ready to write the tarball
 
-    safe_create_directory(os.path.dirname(tarball_name))
-
-    with tarfile.open(tarball_name, 'w:gz') as t:
-        for fn, arc_fn in files_to_archive:
-            t.add(name=fn, arcname=arc_fn)
+    threads = None if conf is None else conf.runstate.pool_size
+    write_archive(tarball_name, files_to_archive, threads=threads)
 
 # Worker Functions
 
@@ -99,7 +97,7 @@ def create_package(target, conf):
 
     archive_fn = package_filename(target, conf)
 
-    create_archive(files_to_archive, archive_fn)
+    create_archive(files_to_archive, archive_fn, conf)
 
     logger.info('wrote build package to: {0}'.format(archive_fn))
 
@@ -116,8 +114,14 @@ def extract_package(conf):
         logger.critical(m)
         raise FileNotFoundError(m)
 
-    with tarfile.open(path, "r:gz") as t:
-        t.extractall(os.path.join(conf.paths.projectroot, conf.paths.public))
+    extract_archive(path, os.path.join(conf.paths.projectroot, conf.paths.public),
+                    conf.runstate.pool_size)
+
+
+def download_file(url, fn):
+    with contextlib.closing(urllib.request.urlopen(url)) as u:
+        with open(fn, 'wb') as f:
+            f.write(u.read())
 
 
 def fetch_package(path, conf):
@@ -130,10 +134,18 @@ def fetch_package(path, conf):
                                 local_path)
 
         if not os.path.exists(tar_path):
-            with contextlib.closing(urllib.request.urlopen(path)) as u:
-                with open(tar_path, 'w') as f:
-                    f.write(u.read())
+            download_file(path, tar_path)
             logger.info('downloaded {0}'.format(local_path))
+
+            # differential archives need their manifest and base archives.
+            try:
+                download_file(archive_manifest_fn(path), archive_manifest_fn(tar_path))
+            except urllib.error.URLError:
+                logger.debug('{0} has no manifest'.format(local_path))
+            else:
+                manifest = load_archive_manifest(tar_path)
+                if manifest is not None and manifest['base'] is not None:
+                    fetch_package('/'.join((path.rsplit('/', 1)[0], manifest['base'])), conf)
         else:
             logger.info('{0} exists locally, not downloading.'.format(local_path))
 
@@ -18,10 +18,14 @@ Main controlling operations for running Sphinx builds.
 
 import itertools
 import logging
+import os.path
+
 import argh
 
+from giza.changes import get_change_set
 from giza.config.helper import fetch_config, get_builder_jobs, get_restricted_builder_jobs
 from giza.libgiza.app import BuildApp
+from giza.libgiza.cache import get_document_cache
 from giza.libgiza.task import Task
 
 from giza.content.robots import robots_txt_tasks
@@ -30,13 +34,16 @@ from giza.content.intersphinx import intersphinx_tasks
 from giza.content.hash import hash_tasks
 from giza.content.source import source_tasks, latex_image_transfer_tasks
 from giza.content.dependencies import refresh_dependency_tasks, dump_file_hash_tasks
-from giza.content.sphinx import sphinx_tasks, output_sphinx_stream
+from giza.content.sphinx import (sphinx_tasks, get_doctree_dir, stable_deduplicate,
+                                 print_build_messages, in_process_builder_app)
 from giza.content.post.sphinx import finalize_sphinx_build
 from giza.content.migrations import migration_tasks
 from giza.content.assets import assets_tasks
+from giza.content.helper import load_content_tasks, content_task_groups
 
+from giza.tools.files import expand_tree
+from giza.tools.manifest import write_manifest
 from giza.tools.timing import Timer
-from functools import reduce
 
 logger = logging.getLogger('giza.operations.sphinx')
 
@@ -45,18 +52,22 @@ logger = logging.getLogger('giza.operations.sphinx')
 @argh.arg('--language', '-l', nargs='*', dest='languages_to_build')
 @argh.arg('--builder', '-b', nargs='*', default='html')
 @argh.arg('--serial_sphinx', action='store_true')
+@argh.arg('--shared_env', action='store_true')
+@argh.arg('--since', default=None)
 @argh.named('sphinx')
 @argh.expects_obj
 def main(args):
     """
     Use Sphinx to generate build artifacts. Can generate artifacts for multiple
-    output types, content editions and translations.
+    output types, content editions and translations. With ``--since <commit>``,
+    only processes the files that changed in git since ``<commit>``.
     """
     conf = fetch_config(args)
 
     app = BuildApp.new(pool_type=conf.runstate.runner,
                        pool_size=conf.runstate.pool_size,
-                       force=conf.runstate.force)
+                       force=conf.runstate.force,
+                       cache=conf.system.task_cache)
 
     with Timer("full sphinx build process"):
         # In general we try to avoid passing the "app" object between functions
@@ -113,16 +124,45 @@ def sphinx_publication(conf, app):
 
 
 def sphinx_builder_tasks(app, conf):
+    # in shared environment mode, the first builder for each source tree parses
+    # the source, and the remaining builders start from a copy of its
+    # environment once it completes.
+    env_builds = {}
+    if conf.runstate.shared_env is True:
+        builder_app = in_process_builder_app(app)
+    else:
+        builder_app = app
+
     for ((edition, language, builder), (build_config, sconf)) in get_builder_jobs(conf):
-        sphinx_job = sphinx_tasks(sconf, build_config)
+        if conf.runstate.shared_env is True:
+            source_dir = build_config.paths.branch_source
+
+            if source_dir in env_builds:
+                env_job, env_source = env_builds[source_dir]
+                sphinx_job = sphinx_tasks(sconf, build_config, env_source)
+                sphinx_job.requires = env_job
+            else:
+                sphinx_job = sphinx_tasks(sconf, build_config)
+                env_builds[source_dir] = (sphinx_job, get_doctree_dir(sconf, build_config))
+        else:
+            sphinx_job = sphinx_tasks(sconf, build_config)
+
         sphinx_job.finalizers = finalize_sphinx_build(sconf, build_config)
 
-        app.extend_queue(sphinx_job)
+        builder_app.extend_queue(sphinx_job)
         logger.info("adding builder job for {0} ({1}, {2})".format(builder, language, edition))
 
     logger.debug("sphinx build configured, running the build now.")
     app.run()
     logger.debug("sphinx build complete.")
+
+    # record the content of the public output, so that delta deploys only
+    # transfer the files that changed.
+    public = os.path.join(conf.paths.projectroot, conf.paths.public)
+    if os.path.isdir(public):
+        with Timer('write public output manifest'):
+            write_manifest(public)
+
     logger.info('builds finalized. sphinx output and errors to follow')
 
     # process the sphinx build. These oeprations allow us to de-duplicate
@@ -134,18 +174,18 @@ def sphinx_builder_tasks(app, conf):
         # this happens (rarely) if the deps on the sphinx task do *not* trigger
         # sphinx-build to run.
 
-        output = []
         ret_code = 0
     else:
         # add all builders response codes. If they're all then we can return 0,
         # otherwise, exit.
         ret_code = sum([o[0] for o in results])
 
-        output = [o[1].split('\n') for o in results if o != '']
-
-        sphinx_output = list(reduce(itertools.chain, output))
+        # each builder returns its own filtered and de-duplicated messages;
+        # merge them, in order, to remove messages repeated between builders.
         try:
-            output_sphinx_stream(sphinx_output, conf)
+            sphinx_output = stable_deduplicate(itertools.chain.from_iterable(o[1] for o in results))
+            logger.info('sphinx builds have {0} lines of output'.format(len(sphinx_output)))
+            print_build_messages(sphinx_output)
         except:
             logger.error('problem parsing sphinx output, exiting')
             raise SystemExit(1)
@@ -157,34 +197,57 @@ def sphinx_builder_tasks(app, conf):
 
 
 def sphinx_content_preperation(app, conf):
-    # Download embedded git repositories and then run migrations before doing
-    # anything else.
-    with app.context() as asset_app:
-        asset_app.extend_queue(assets_tasks(conf))
-
-    with app.context() as migration_app:
-        migration_app.extend_queue(migration_tasks(conf))
-
-    # Copy all source to the ``build/<branch>/source`` directory.
-    with Timer('migrating source to build'):
-        with app.context(randomize=True) as source_app:
-            for (_, (build_config, sconf)) in get_restricted_builder_jobs(conf):
-                source_app.extend_queue(source_tasks(build_config, sconf))
-
-    # load all generated content and create tasks.
-    with Timer('loading generated content'):
-        for (_, (build_config, sconf)) in get_restricted_builder_jobs(conf):
-            for content, func in build_config.system.content.task_generators:
-                app.add(Task(job=func,
-                             args=[build_config],
-                             target=True))
-
-        app.randomize = True
-        results = app.run()
-        app.reset()
-
-        for task_group in results:
-            app.extend_queue(task_group)
+    # Download embedded git repositories, run migrations, copy all source to the
+    # ``build/<branch>/source`` directory, and load generated content. These
+    # operations run as a single dependency graph rather than as a sequence of
+    # phases, so that, for example, content for one edition loads while the
+    # source for another edition is still transferring.
+
+    # resolve the changed files of incremental builds once, before starting
+    # the worker processes.
+    get_change_set(conf)
+
+    # parse all content files before the loaders run, in parallel, so that the
+    # loaders only need to read the parsed documents from the cache. Worker
+    # processes load the cache file again when it changes.
+    with Timer('parsing content yaml files'):
+        includes_dir = os.path.join(conf.paths.projectroot, conf.paths.includes)
+        get_document_cache(conf.system.yaml_cache).preload(expand_tree(includes_dir, 'yaml'),
+                                                           conf.runstate.pool_size)
+
+    app.create_pool()
+    prep_app = app.sub_app()
+    prep_app.scheduler = 'graph'
+
+    asset_jobs = assets_tasks(conf)
+    prep_app.extend_queue(asset_jobs)
+
+    migration_jobs = migration_tasks(conf)
+    for job in migration_jobs:
+        job.requires = asset_jobs
+    prep_app.extend_queue(migration_jobs)
+
+    for (_, (build_config, sconf)) in get_restricted_builder_jobs(conf):
+        source_jobs = source_tasks(build_config, sconf)
+        for job in source_jobs:
+            job.requires = migration_jobs
+        prep_app.extend_queue(source_jobs)
+
+        for content, func in build_config.system.content.task_generators:
+            loader = Task(job=load_content_tasks,
+                          args=[func, build_config],
+                          target=True,
+                          description='loading {0} content'.format(content.name))
+            loader.requires = source_jobs
+            prep_app.add(loader)
+
+    with Timer('migrating source to build and loading generated content'):
+        results = prep_app.run()
+
+    # the content loaders return lists of tasks that generate the content; the
+    # other tasks in the graph return their own results, which aren't tasks.
+    for task_group in content_task_groups(results):
+        app.extend_queue(task_group)
 
     for ((edition, language, builder), (build_config, sconf)) in get_restricted_builder_jobs(conf):
         # these functions all return tasks
@@ -0,0 +1,318 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Creates and extracts the tarballs of build artifacts and build environments.
+
+Archives are written as a stream: :class:`~giza.tools.archive.ParallelGzipWriter()`
+compresses blocks of the tar stream in a pool of threads (``zlib`` releases
+the GIL), and writes each block as a separate gzip member, which all gzip
+readers, including :mod:`tarfile`, read as a single stream. Archives with a
+``.zst`` extension use Zstandard's multi-threaded compression, if the
+``zstandard`` package is installed.
+
+Each archive has a manifest, stored next to the archive, that maps every path
+in the archive to the digest of its content. A differential archive only
+contains the files that changed since its ``base`` archive, and lists the
+files that were deleted. Extracting a differential archive extracts its base
+archive first.
+
+Extraction reads the tar stream in order, and writes files in a pool of
+threads.
+"""
+
+import collections
+import logging
+import multiprocessing
+import multiprocessing.dummy
+import os
+import shutil
+import tarfile
+import zlib
+
+from giza.tools.files import safe_create_directory
+from giza.tools.manifest import build_manifest, file_digest
+from giza.tools.sync import load_manifest, dump_manifest
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger('giza.tools.archive')
+
+# files larger than this are extracted directly rather than in the thread pool.
+max_buffered_size = 8 * 1024 * 1024
+
+
+def archive_manifest_fn(fn):
+    return fn + '.manifest.json'
+
+
+def load_archive_manifest(fn):
+    """
+    :returns: The manifest of the archive ``fn``, with ``files``, ``deleted``,
+       ``base`` and ``depth`` fields, or ``None`` if the archive has no
+       manifest.
+    """
+
+    manifest = load_manifest(archive_manifest_fn(fn))
+
+    if 'files' not in manifest:
+        return None
+    else:
+        return manifest
+
+
+class ParallelGzipWriter(object):
+    """
+    A write-only file object that compresses its input in blocks of
+    ``block_size`` bytes, in ``threads`` threads, and writes the compressed
+    blocks, in order, to ``fileobj``.
+    """
+
+    def __init__(self, fileobj, level=6, threads=None, block_size=4 * 1024 * 1024):
+        self.fileobj = fileobj
+        self.level = level
+        self.threads = threads or multiprocessing.cpu_count()
+        self.block_size = block_size
+        self.buffer = []
+        self.buffered = 0
+        self.pending = collections.deque()
+        self.pool = multiprocessing.dummy.Pool(self.threads)
+
+    def compress(self, data):
+        # wbits of 31 writes a gzip header and trailer.
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+
+    def write(self, data):
+        self.buffer.append(data)
+        self.buffered += len(data)
+
+        if self.buffered >= self.block_size:
+            self.submit()
+
+    def submit(self):
+        if self.buffered == 0:
+            return
+
+        block = b''.join(self.buffer)
+        self.buffer = []
+        self.buffered = 0
+
+        self.pending.append(self.pool.apply_async(self.compress, (block,)))
+
+        # bound the amount of memory that pending blocks use.
+        while len(self.pending) > self.threads * 2:
+            self.fileobj.write(self.pending.popleft().get())
+
+    def close(self):
+        try:
+            self.submit()
+            while len(self.pending) > 0:
+                self.fileobj.write(self.pending.popleft().get())
+        finally:
+            self.pool.close()
+            self.pool.join()
+
+
+def open_writer(f, fn, level, threads):
+    if fn.endswith('.zst'):
+        if zstandard is None:
+            raise ImportError('writing {0} requires the zstandard package'.format(fn))
+
+        compressor = zstandard.ZstdCompressor(level=min(level, 19), threads=threads or -1)
+        return compressor.stream_writer(f)
+    else:
+        return ParallelGzipWriter(f, level, threads)
+
+
+def open_reader(f, fn):
+    if fn.endswith('.zst'):
+        if zstandard is None:
+            raise ImportError('reading {0} requires the zstandard package'.format(fn))
+
+        return tarfile.open(fileobj=zstandard.ZstdDecompressor().stream_reader(f), mode='r|')
+    else:
+        return tarfile.open(fileobj=f, mode='r|*')
+
+
+def collect_files(paths, exclusions=None):
+    """
+    :param list paths: A list of ``(path, arcname)`` tuples of files and
+       directories.
+
+    :returns: A tuple of a dictionary that maps archive names to paths, and a
+       dictionary that maps archive names to digests.
+    """
+
+    exclusions = exclusions or []
+    names = {}
+    digests = {}
+
+    for path, arcname in paths:
+        arcname = arcname.strip('/')
+
+        if os.path.isdir(path) and not os.path.islink(path):
+            manifest = build_manifest(path, exclusions=exclusions)
+            for rel, digest in manifest['files'].items():
+                name = '/'.join((arcname, rel)) if arcname else rel
+                names[name] = os.path.join(path, rel)
+                digests[name] = digest
+        else:
+            names[arcname] = path
+            digests[arcname] = file_digest(path)
+
+    return names, digests
+
+
+def create_archive(fn, paths, exclusions=None, base=None, max_depth=5, level=6, threads=None):
+    """
+    Writes a tarball of the files in ``paths``, a list of ``(path,
+    arcname)`` tuples, to ``fn``, and writes its manifest.
+
+    :param string base: The file name of a previous archive of the same
+       paths. If specified and fewer than ``max_depth`` archives deep, the
+       new archive is a differential archive that only contains the files that
+       changed since ``base``.
+
+    :returns: The manifest of the archive.
+    """
+
+    names, digests = collect_files(paths, exclusions)
+
+    previous = None
+    if base is not None:
+        previous = load_archive_manifest(base)
+
+        if previous is None:
+            logger.warning('archive {0} has no manifest, writing a full archive'.format(base))
+        elif previous['depth'] + 1 >= max_depth:
+            logger.info('archive {0} has {1} bases, writing a full archive'.format(
+                base, previous['depth']))
+            previous = None
+
+    if previous is None:
+        manifest = {'files': digests, 'deleted': [], 'base': None, 'depth': 0}
+        members = sorted(names)
+    else:
+        manifest = {'files': digests,
+                    'deleted': sorted(set(previous['files']) - set(digests)),
+                    'base': os.path.basename(base),
+                    'depth': previous['depth'] + 1}
+        members = sorted(name for name, digest in digests.items()
+                         if previous['files'].get(name) != digest)
+
+    safe_create_directory(os.path.dirname(fn))
+
+    tmp_fn = fn + '.tmp'
+    try:
+        with open(tmp_fn, 'wb') as f:
+            writer = open_writer(f, fn, level, threads)
+            try:
+                with tarfile.open(fileobj=writer, mode='w|') as t:
+                    for name in members:
+                        t.add(names[name], arcname=name, recursive=False)
+            finally:
+                writer.close()
+
+        os.rename(tmp_fn, fn)
+    finally:
+        if os.path.exists(tmp_fn):
+            os.remove(tmp_fn)
+
+    dump_manifest(archive_manifest_fn(fn), manifest)
+
+    m = 'wrote {0} of {1} files to {2}'
+    logger.info(m.format(len(members), len(digests), fn))
+
+    return manifest
+
+
+def is_safe_member(member):
+    parts = member.name.split('/')
+    return not (member.name.startswith('/') or '..' in parts)
+
+
+def write_member(fn, data, mode, mtime):
+    if os.path.lexists(fn):
+        os.remove(fn)
+
+    with open(fn, 'wb') as f:
+        f.write(data)
+
+    os.chmod(fn, mode)
+    os.utime(fn, (mtime, mtime))
+
+
+def extract_archive(fn, path, threads=None):
+    """
+    Extracts the archive ``fn`` into ``path``, writing files in a pool of
+    ``threads`` threads. For differential archives, first extracts the base
+    archive, which must be in the same directory as ``fn``, and then removes
+    deleted files.
+    """
+
+    manifest = load_archive_manifest(fn)
+
+    if manifest is not None and manifest['base'] is not None:
+        base = os.path.join(os.path.dirname(fn), manifest['base'])
+        if not os.path.isfile(base):
+            raise IOError('base archive {0} of {1} does not exist'.format(base, fn))
+
+        extract_archive(base, path, threads)
+
+    threads = threads or multiprocessing.cpu_count()
+    pool = multiprocessing.dummy.Pool(threads)
+    pending = collections.deque()
+    count = 0
+
+    try:
+        with open(fn, 'rb') as f:
+            with open_reader(f, fn) as t:
+                for member in t:
+                    if not is_safe_member(member):
+                        logger.warning('skipping unsafe path {0} in {1}'.format(member.name, fn))
+                        continue
+
+                    target = os.path.join(path, member.name)
+                    safe_create_directory(os.path.dirname(target))
+                    count += 1
+
+                    if member.isfile() and member.size <= max_buffered_size:
+                        data = t.extractfile(member).read()
+                        pending.append(pool.apply_async(write_member, (target, data, member.mode,
+                                                                       member.mtime)))
+
+                        while len(pending) > threads * 4:
+                            pending.popleft().get()
+                    else:
+                        if os.path.isdir(target) and not member.isdir():
+                            shutil.rmtree(target)
+                        t.extract(member, path)
+
+                while len(pending) > 0:
+                    pending.popleft().get()
+    finally:
+        pool.close()
+        pool.join()
+
+    if manifest is not None:
+        for name in manifest['deleted']:
+            target = os.path.join(path, name)
+            if os.path.lexists(target) and not os.path.isdir(target):
+                os.remove(target)
+
+    logger.info('extracted {0} files from {1}'.format(count, fn))
@@ -0,0 +1,426 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A benchmark harness for the build operations whose cost grows with the size
+of a project: scanning includes, refreshing dependencies, ingesting and
+rendering inherited content, scheduling tasks, and writing generated output.
+
+Each benchmark synthesizes its input at a configurable scale (the number of
+files) in a scratch directory, so that results are reproducible without a
+real project, and measures each operation several times. Results are plain
+dictionaries that :func:`dump_results()` stores as JSON, and that
+:func:`compare_results()` compares with an earlier run, to find regressions
+before rolling out a new version of giza.
+"""
+
+import collections
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import tempfile
+import time
+
+import giza
+import giza.libgiza.app
+import giza.libgiza.inheritance
+import giza.libgiza.task
+
+from rstcloth.rstcloth import RstCloth
+
+from giza.config.main import Configuration
+from giza.config.runtime import RuntimeStateConfig
+from giza.content.dependencies import _refresh_deps
+from giza.content.output import write_content_batch
+from giza.includes import IncludeIndex
+from giza.libgiza.cache import stat_signature
+from giza.tools.files import md5_file, safe_create_directory
+from giza.tools.sync import sync_tree
+
+logger = logging.getLogger('giza.tools.benchmark')
+
+# the number of files for each of the named scales.
+scales = {'1k': 1000, '10k': 10000, '50k': 50000}
+
+
+def measure(operation, repeat=3, setup=None):
+    """
+    Calls ``operation`` ``repeat`` times, calling ``setup``, if specified,
+    before each call, outside of the measurement.
+
+    :returns: A dictionary of the ``min``, ``median`` and ``max`` durations,
+       in seconds.
+    """
+
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+
+        start = time.time()
+        operation()
+        times.append(time.time() - start)
+
+    times.sort()
+    return {'min': times[0],
+            'median': times[len(times) // 2],
+            'max': times[-1],
+            'repeat': repeat}
+
+
+def write_file(fn, content):
+    with open(fn, 'w') as f:
+        f.write(content)
+
+
+# Synthetic Input
+
+
+def synthesize_source(path, num_files, include_depth=4, includes_per_file=3, seed=0):
+    """
+    Creates a source tree with ``num_files`` pages in ``path``, and one
+    include file for every two pages. Each page includes
+    ``includes_per_file`` include files, and include files form chains that
+    are ``include_depth`` files deep.
+
+    :returns: The path of the source directory.
+    """
+
+    rnd = random.Random(seed)
+
+    source = os.path.join(path, 'source')
+    includes = os.path.join(source, 'includes')
+    safe_create_directory(includes)
+
+    num_includes = max(include_depth, num_files // 2)
+
+    for idx in range(num_includes):
+        content = ['Fact {0}'.format(idx), '', 'Some text. ' * 20, '']
+        if (idx + 1) % include_depth != 0 and idx + 1 < num_includes:
+            content.append('.. include:: /includes/fact-{0}.rst'.format(idx + 1))
+
+        write_file(os.path.join(includes, 'fact-{0}.rst'.format(idx)), '\n'.join(content))
+
+    for idx in range(num_files):
+        dirname = os.path.join(source, 'section-{0}'.format(idx % 20))
+        if not os.path.isdir(dirname):
+            safe_create_directory(dirname)
+
+        content = ['=' * 10, 'Page {0}'.format(idx), '=' * 10, '']
+        for _ in range(includes_per_file):
+            content.extend(['.. include:: /includes/fact-{0}.rst'.format(
+                rnd.randrange(num_includes)), ''])
+
+        write_file(os.path.join(dirname, 'page-{0}.txt'.format(idx)), '\n'.join(content))
+
+    return source
+
+
+def synthesize_content(path, num_files, units_per_file=5, inheritance_depth=5):
+    """
+    Creates ``num_files`` content YAML files in ``path``, each with
+    ``units_per_file`` units. Every unit inherits from the unit with the same
+    position in the previous file, forming chains of ``inheritance_depth``
+    files.
+
+    :returns: A list of the paths of the files.
+    """
+
+    safe_create_directory(path)
+
+    files = []
+    for idx in range(num_files):
+        fn = os.path.join(path, 'steps-content-{0}.yaml'.format(idx))
+        docs = []
+
+        for unit in range(units_per_file):
+            doc = ['ref: unit-{0}'.format(unit)]
+
+            if idx % inheritance_depth == 0:
+                doc.extend(['title: Unit {0} in file {1}'.format(unit, idx),
+                            'pre: |',
+                            '  Text for {{program}} that is replaced when rendering.',
+                            'replacement:',
+                            '  program: mongod'])
+            else:
+                doc.extend(['source:',
+                            '  file: {0}'.format(files[-1]),
+                            '  ref: unit-{0}'.format(unit),
+                            'post: Additional text for {{program}}.'])
+
+            docs.append('\n'.join(doc))
+
+        write_file(fn, '\n---\n'.join(docs) + '\n...\n')
+        files.append(fn)
+
+    return files
+
+
+class BenchmarkPaths(object):
+    """
+    The paths that the dependency refresh uses. Stands in for
+    :class:`~giza.config.paths.PathsConfig()`, which derives the branch paths
+    from a git repository that synthetic projects don't have.
+    """
+
+    source = 'source'
+    branch_source = os.path.join('build', 'master', 'source')
+
+    def __init__(self, projectroot):
+        self.projectroot = projectroot
+        self.includes = os.path.join(projectroot, self.source, 'includes')
+
+
+class BenchmarkConfig(object):
+    def __init__(self, projectroot):
+        self.paths = BenchmarkPaths(projectroot)
+
+
+def get_content_config(path):
+    conf = Configuration()
+    conf.runstate = RuntimeStateConfig()
+    conf.paths = {'includes': os.path.join(path, 'source', 'includes')}
+
+    return conf
+
+
+# Benchmarks
+
+
+def bench_include_index(path, num_files, repeat):
+    source = synthesize_source(path, num_files)
+    fn = os.path.join(path, 'include-index.json')
+
+    def scan():
+        IncludeIndex(source).refresh()
+
+    def persistent_scan():
+        index = IncludeIndex(source, fn)
+        index.refresh()
+        index.dump()
+        index.graph()
+
+    persistent_scan()
+
+    return {'scan': measure(scan, repeat),
+            'rescan': measure(persistent_scan, repeat)}
+
+
+def bench_refresh_deps(path, num_files, repeat):
+    source = synthesize_source(path, num_files)
+    conf = BenchmarkConfig(path)
+    branch_source = os.path.join(path, conf.paths.branch_source)
+    sync_tree(source, branch_source)
+
+    index = IncludeIndex(source)
+    index.refresh()
+    graph = index.graph()
+
+    files = [os.path.join(root, name) for root, _, names in os.walk(source) for name in names]
+    dep_map = dict((fn, md5_file(fn)) for fn in files)
+    signatures = dict((fn, stat_signature(fn)) for fn in files)
+
+    changed = sorted(files)[::100]
+
+    def change():
+        for fn in changed:
+            with open(fn, 'a') as f:
+                f.write('\n')
+
+    return {'unchanged': measure(lambda: _refresh_deps(graph, dep_map, conf, signatures),
+                                 repeat),
+            'one_percent_changed': measure(
+                lambda: _refresh_deps(graph, dep_map, conf, signatures), repeat, setup=change)}
+
+
+def bench_data_cache(path, num_files, repeat):
+    files = synthesize_content(os.path.join(path, 'source', 'includes'), num_files)
+    conf = get_content_config(path)
+
+    def ingest():
+        giza.libgiza.inheritance.DataCache(files, conf)
+
+    def render():
+        data = giza.libgiza.inheritance.DataCache(files, conf)
+        for _, unit in data.content_iter():
+            unit.render()
+
+    return {'ingest': measure(ingest, repeat),
+            'ingest_and_render': measure(render, repeat)}
+
+
+def noop(value):
+    return value
+
+
+def bench_scheduling(path, num_files, repeat):
+    num_tasks = max(1, num_files // 10)
+    results = collections.OrderedDict()
+
+    for pool_type in ('serial', 'thread', 'process'):
+        for scheduler in ('queue', 'graph'):
+            def run():
+                app = giza.libgiza.app.BuildApp.new(pool_type=pool_type, pool_size=2)
+                app.scheduler = scheduler
+
+                previous = None
+                for idx in range(num_tasks):
+                    task = giza.libgiza.task.Task(job=noop, args=[idx],
+                                                  description='task {0}'.format(idx))
+                    if scheduler == 'graph' and previous is not None and idx % 10 != 0:
+                        task.requires = previous
+                    app.add(task)
+                    previous = task
+
+                app.run()
+                app.close_pool()
+
+            results['_'.join((pool_type, scheduler))] = measure(run, repeat)
+
+    return results
+
+
+def render_page(idx):
+    r = RstCloth()
+    r.title('Generated page {0}'.format(idx))
+    r.newline()
+    r.content('Generated content. ' * 20)
+    return r
+
+
+def bench_output(path, num_files, repeat):
+    output = os.path.join(path, 'output')
+    batch = [(render_page, (idx,), os.path.join(output, 'page-{0}.rst'.format(idx)))
+             for idx in range(num_files)]
+
+    def clear():
+        if os.path.isdir(output):
+            shutil.rmtree(output)
+
+    return {'initial': measure(lambda: write_content_batch(batch, 'benchmark'), repeat,
+                               setup=clear),
+            'unchanged': measure(lambda: write_content_batch(batch, 'benchmark'), repeat)}
+
+
+benchmarks = collections.OrderedDict([
+    ('include_index', bench_include_index),
+    ('refresh_deps', bench_refresh_deps),
+    ('data_cache', bench_data_cache),
+    ('scheduling', bench_scheduling),
+    ('output', bench_output),
+])
+
+
+def run_benchmarks(num_files, names=None, repeat=3, workdir=None):
+    """
+    Runs the benchmarks in ``names`` (all benchmarks, by default), each in a
+    new scratch directory, with ``num_files`` files.
+
+    :returns: A dictionary that describes the environment and holds the
+       results of each benchmark.
+    """
+
+    if names is None or len(names) == 0:
+        names = list(benchmarks.keys())
+
+    results = {'giza': giza.__version__,
+               'python': platform.python_version(),
+               'platform': platform.platform(),
+               'time': datetime.datetime.utcnow().isoformat(),
+               'num_files': num_files,
+               'repeat': repeat,
+               'results': {}}
+
+    for name in names:
+        if name not in benchmarks:
+            raise KeyError('{0} is not a benchmark'.format(name))
+
+        path = tempfile.mkdtemp(prefix='giza-benchmark-', dir=workdir)
+        try:
+            cwd = os.getcwd()
+            os.chdir(path)
+            try:
+                logger.info('running {0} benchmark with {1} files'.format(name, num_files))
+                results['results'][name] = benchmarks[name](path, num_files, repeat)
+            finally:
+                os.chdir(cwd)
+        finally:
+            shutil.rmtree(path)
+
+    return results
+
+
+def dump_results(results, fn):
+    dirname = os.path.dirname(fn)
+    if dirname != '':
+        safe_create_directory(dirname)
+
+    with open(fn, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load_results(fn):
+    with open(fn, 'r') as f:
+        return json.load(f)
+
+
+def compare_results(previous, current, threshold=0.1):
+    """
+    Compares the median durations of the measurements in two sets of results.
+
+    :returns: A list of ``(name, previous, current, ratio, regressed)``
+       tuples, where ``regressed`` is ``True`` if the current duration is more
+       than ``threshold`` (a fraction) slower.
+    """
+
+    comparison = []
+
+    for name, measurements in sorted(current['results'].items()):
+        for measurement, timing in sorted(measurements.items()):
+            try:
+                before = previous['results'][name][measurement]['median']
+            except KeyError:
+                continue
+
+            after = timing['median']
+            ratio = after / before if before > 0 else 1.0
+
+            comparison.append(('.'.join((name, measurement)), before, after, ratio,
+                               ratio > 1 + threshold))
+
+    return comparison
+
+
+def render_results(results, comparison=None):
+    "Returns a list of lines that report ``results`` and an optional ``comparison``."
+
+    lines = ['giza {0}, python {1}, {2} files'.format(
+        results['giza'], results['python'], results['num_files'])]
+
+    for name, measurements in sorted(results['results'].items()):
+        for measurement, timing in sorted(measurements.items()):
+            lines.append('  {0:<40} {1:>9.4f}s (min {2:.4f}s)'.format(
+                '.'.join((name, measurement)), timing['median'], timing['min']))
+
+    if comparison is not None:
+        lines.append('compared with previous results:')
+        for name, before, after, ratio, regressed in comparison:
+            lines.append('  {0:<40} {1:>9.4f}s -> {2:.4f}s ({3:.2f}x){4}'.format(
+                name, before, after, ratio, ' REGRESSION' if regressed else ''))
+
+    return lines
@@ -141,6 +141,35 @@ def md5_file(file, block_size=2 ** 20):
     return md5.hexdigest()
 
 
+def write_if_changed(fn, content):
+    """
+    Writes the string ``content`` to ``fn``, unless ``fn`` already holds
+    exactly that content, so that the ``mtime`` of unchanged files does not
+    change. The new content is written to a temporary file and renamed into
+    place, so readers never see a partially written file.
+
+    :returns: ``True`` if ``fn`` was written, and ``False`` otherwise.
+    """
+
+    if not isinstance(content, bytes):
+        content = content.encode('utf-8')
+
+    if os.path.isfile(fn) and os.path.getsize(fn) == len(content):
+        if md5_file(fn) == hashlib.md5(content).hexdigest():
+            return False
+
+    dirname = os.path.dirname(fn)
+    if dirname != '' and not os.path.isdir(dirname):
+        safe_create_directory(dirname)
+
+    tmp_fn = '{0}.{1}.tmp'.format(fn, os.getpid())
+    with open(tmp_fn, 'wb') as f:
+        f.write(content)
+    os.rename(tmp_fn, fn)
+
+    return True
+
+
 def copy_if_needed(source_file, target_file, name='build'):
     if os.path.isfile(source_file) is False or os.path.isdir(source_file):
         msg = "{0}: Input file '{1}' does not exist.".format(name, source_file)
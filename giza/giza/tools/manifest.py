@@ -0,0 +1,151 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Content manifests map the relative path of every file in a directory of build
+output to a digest of its content. Deploys compare the manifest of the local
+output with the manifest stored on the target by the previous deploy, and
+only transfer the files that changed.
+
+Manifests also record the stat signature of each file, so that rebuilding a
+manifest only reads the files that changed since the last manifest. The local
+manifest of a directory is stored next to it, rather than in it, so that it is
+never published with the directory's content.
+"""
+
+import logging
+import os
+
+from giza.libgiza.cache import stat_signature, digest_file
+from giza.tools.sync import load_manifest, dump_manifest, walk_source
+
+logger = logging.getLogger('giza.tools.manifest')
+
+manifest_name = '.giza-manifest.json'
+
+
+def file_digest(fn):
+    "Returns the digest of ``fn``, or ``link:<target>`` if ``fn`` is a symbolic link."
+
+    if os.path.islink(fn):
+        return 'link:' + os.readlink(fn)
+    else:
+        return digest_file(fn)
+
+
+def build_manifest(path, previous=None, exclusions=None):
+    """
+    :returns: A manifest of all files in ``path``, as a dictionary with a
+       ``files`` field that maps relative paths to digests, and a
+       ``signatures`` field that maps relative paths to stat
+       signatures. Symbolic links have a digest of ``link:<target>``. Reuses
+       the digests in the ``previous`` manifest for unchanged files. Skips
+       paths that match ``exclusions``, which have the same format as for
+       :func:`~giza.tools.sync.sync_tree()`.
+    """
+
+    if previous is None:
+        previous = {}
+
+    previous_files = previous.get('files', {})
+    previous_signatures = previous.get('signatures', {})
+
+    manifest = {'files': {}, 'signatures': {}}
+
+    _, files = walk_source(path, [manifest_name] + (exclusions or []), set())
+
+    hashed = 0
+    for rel, kind in files.items():
+        fn = os.path.join(path, rel)
+
+        if kind == 'link':
+            manifest['files'][rel] = file_digest(fn)
+            continue
+
+        signature = stat_signature(fn)
+        manifest['signatures'][rel] = signature
+
+        if previous_signatures.get(rel) == signature and rel in previous_files:
+            manifest['files'][rel] = previous_files[rel]
+        else:
+            manifest['files'][rel] = digest_file(fn)
+            hashed += 1
+
+    m = 'built manifest of {0}, hashing {1} of {2} files'
+    logger.debug(m.format(path, hashed, len(files)))
+
+    return manifest
+
+
+def local_manifest_fn(path):
+    "Returns the name of the file that stores the local manifest of ``path``."
+
+    return path.rstrip(os.path.sep) + '.manifest.json'
+
+
+def write_manifest(path):
+    """
+    Builds a manifest of ``path``, reusing and then replacing the manifest
+    stored next to ``path``.
+
+    :returns: The manifest.
+    """
+
+    # earlier builds stored the manifest in ``path`` itself.
+    legacy_fn = os.path.join(path, manifest_name)
+    if os.path.isfile(legacy_fn):
+        os.remove(legacy_fn)
+
+    fn = local_manifest_fn(path)
+    previous = load_manifest(fn)
+    manifest = build_manifest(path, previous)
+
+    if manifest != previous:
+        dump_manifest(fn, manifest)
+
+    return manifest
+
+
+def subset_manifest(manifest, prefix):
+    """
+    :returns: A manifest of the files in the ``prefix`` directory of
+       ``manifest``, with paths relative to ``prefix``.
+    """
+
+    prefix = prefix.strip('/') + '/'
+    subset = {'files': {}, 'signatures': {}}
+
+    for field in subset:
+        for rel, value in manifest.get(field, {}).items():
+            if rel.startswith(prefix):
+                subset[field][rel[len(prefix):]] = value
+
+    return subset
+
+
+def diff_manifests(previous, current):
+    """
+    :returns: A tuple of sorted lists of the paths that are new or changed in
+       the ``current`` manifest, and the paths that are in the ``previous``
+       manifest but not the ``current`` manifest.
+    """
+
+    previous_files = previous.get('files', {})
+    current_files = current.get('files', {})
+
+    changed = [rel for rel, digest in current_files.items()
+               if previous_files.get(rel) != digest]
+    deleted = [rel for rel in previous_files if rel not in current_files]
+
+    return sorted(changed), sorted(deleted)
@@ -0,0 +1,439 @@
+# Copyright 2015 MongoDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+An incremental, in-process directory synchronization, used in place of ``rsync
+--checksum --delete`` to populate the "proxy-source" directories in
+``build/<branch>/``.
+
+:func:`~giza.tools.sync.sync_tree()` persists a manifest that records, for
+every file, the stat signature of the source file, its digest, and the stat
+signature of the copy it produced. On subsequent runs, files whose source and
+target are both unchanged since the last sync are not read at all, and files
+whose content is identical are not rewritten, so their ``mtime`` does not
+change.
+
+Excluded paths use ``rsync`` semantics: they are neither copied nor deleted
+from the target. Redacted paths are never copied and are removed from the
+target if they exist.
+
+When the changed files are already known (e.g. from git),
+:func:`~giza.tools.sync.sync_paths()` updates only those files, without
+walking either tree.
+"""
+
+import errno
+import fnmatch
+import json
+import logging
+import os
+import shutil
+
+from giza.libgiza.cache import stat_signature, digest_file
+from giza.tools.files import safe_create_directory
+
+logger = logging.getLogger('giza.tools.sync')
+
+# ioctl request number for FICLONE on Linux (_IOW(0x94, 9, int)).
+FICLONE = 0x40049409
+
+# pairs of (source, target) devices where reflinks failed, so we don't keep
+# trying on filesystems that don't support them.
+_reflink_unsupported = set()
+
+
+def is_excluded(rel, patterns):
+    """
+    :returns: ``True`` if the ``/`` separated relative path, ``rel``, matches
+       one of the ``patterns``. Patterns without a ``/`` match the last path
+       component; patterns with a ``/`` match the trailing components of the
+       path; patterns that begin with a ``/`` match the whole path.
+    """
+
+    parts = rel.split('/')
+
+    for pattern in patterns:
+        if pattern.startswith('/'):
+            if fnmatch.fnmatchcase(rel, pattern.strip('/')):
+                return True
+        elif '/' in pattern:
+            pattern = pattern.rstrip('/')
+            depth = pattern.count('/') + 1
+            if len(parts) >= depth and fnmatch.fnmatchcase('/'.join(parts[-depth:]), pattern):
+                return True
+        elif fnmatch.fnmatchcase(parts[-1], pattern):
+            return True
+
+    return False
+
+
+def reflink(source, target):
+    """
+    Creates ``target`` as a copy-on-write clone of ``source``.
+
+    :returns: ``True`` if the clone succeeded and ``False`` if the filesystem
+       does not support cloning.
+    """
+
+    try:
+        import fcntl
+    except ImportError:
+        return False
+
+    devices = (os.stat(source).st_dev, os.stat(os.path.dirname(target)).st_dev)
+    if devices in _reflink_unsupported:
+        return False
+
+    with open(source, 'rb') as src:
+        with open(target, 'wb') as dst:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                return True
+            except (IOError, OSError):
+                _reflink_unsupported.add(devices)
+
+    os.remove(target)
+    return False
+
+
+def copy_file(source, target, hardlink=False):
+    """
+    Replaces ``target`` with the contents of ``source``, using a hardlink (if
+    ``hardlink`` is ``True``), a reflink, or a regular copy, in that order of
+    preference. The new file is written next to ``target`` and renamed into
+    place, so that ``target`` is never partially written and any existing
+    links to ``target`` are not modified.
+
+    :returns: The method used: ``'hardlink'``, ``'reflink'``, or ``'copy'``.
+    """
+
+    tmp_target = target + '.giza-sync'
+    if os.path.lexists(tmp_target):
+        os.remove(tmp_target)
+
+    method = None
+    if hardlink is True:
+        try:
+            os.link(source, tmp_target)
+            method = 'hardlink'
+        except (AttributeError, OSError):
+            pass
+
+    if method is None:
+        if reflink(source, tmp_target):
+            method = 'reflink'
+        else:
+            shutil.copyfile(source, tmp_target)
+            method = 'copy'
+
+        shutil.copymode(source, tmp_target)
+
+    os.rename(tmp_target, target)
+
+    return method
+
+
+def remove_path(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+def load_manifest(fn):
+    if fn is None or not os.path.isfile(fn):
+        return {}
+
+    with open(fn, 'r') as f:
+        try:
+            return json.load(f)
+        except ValueError:
+            logger.warning('sync manifest {0} is not valid, ignoring'.format(fn))
+            return {}
+
+
+def dump_manifest(fn, manifest):
+    if fn is None:
+        return
+
+    safe_create_directory(os.path.dirname(fn))
+
+    tmp_fn = fn + '.tmp'
+    with open(tmp_fn, 'w') as f:
+        json.dump(manifest, f)
+    os.rename(tmp_fn, fn)
+
+
+def walk_source(source, exclusions, redactions, protected=frozenset()):
+    """
+    :returns: A tuple of a set of the relative paths of all directories, and a
+       dictionary that maps the relative paths of all files and symbolic links
+       in ``source`` to ``'file'`` or ``'link'``, skipping excluded and
+       redacted paths.
+    """
+
+    directories = set()
+    files = {}
+
+    for root, dirs, filenames in os.walk(source):
+        rel_root = os.path.relpath(root, source)
+        if rel_root == '.':
+            rel_root = ''
+        else:
+            rel_root = rel_root.replace(os.path.sep, '/')
+            directories.add(rel_root)
+
+        for name in list(dirs):
+            rel = '/'.join((rel_root, name)) if rel_root else name
+
+            if rel in redactions or rel in protected or is_excluded(rel, exclusions):
+                dirs.remove(name)
+            elif os.path.islink(os.path.join(root, name)):
+                dirs.remove(name)
+                files[rel] = 'link'
+
+        for name in filenames:
+            rel = '/'.join((rel_root, name)) if rel_root else name
+
+            if rel in redactions or rel in protected or is_excluded(rel, exclusions):
+                continue
+            elif os.path.islink(os.path.join(root, name)):
+                files[rel] = 'link'
+            else:
+                files[rel] = 'file'
+
+    return directories, files
+
+
+def prune_target(target, directories, files, exclusions, redactions, protected=frozenset()):
+    """
+    Removes all paths in ``target`` that are not in the source tree, or are
+    redacted, without touching excluded paths.
+
+    :returns: The number of paths removed.
+    """
+
+    removed = 0
+
+    for root, dirs, filenames in os.walk(target):
+        rel_root = os.path.relpath(root, target)
+        rel_root = '' if rel_root == '.' else rel_root.replace(os.path.sep, '/')
+
+        for name in list(dirs):
+            rel = '/'.join((rel_root, name)) if rel_root else name
+            path = os.path.join(root, name)
+
+            if rel in redactions:
+                pass
+            elif rel in protected or is_excluded(rel, exclusions):
+                dirs.remove(name)
+                continue
+            elif rel in directories and not os.path.islink(path):
+                continue
+            elif rel in files and os.path.islink(path):
+                dirs.remove(name)
+                continue
+
+            dirs.remove(name)
+            remove_path(path)
+            removed += 1
+
+        for name in filenames:
+            rel = '/'.join((rel_root, name)) if rel_root else name
+
+            if rel in redactions:
+                pass
+            elif rel in files or rel in protected or is_excluded(rel, exclusions):
+                continue
+
+            os.remove(os.path.join(root, name))
+            removed += 1
+
+    return removed
+
+
+def sync_link(source_fn, target_fn):
+    link = os.readlink(source_fn)
+
+    if os.path.islink(target_fn):
+        if os.readlink(target_fn) == link:
+            return False
+        os.remove(target_fn)
+    elif os.path.lexists(target_fn):
+        remove_path(target_fn)
+
+    os.symlink(link, target_fn)
+    return True
+
+
+def sync_file(source_fn, target_fn, record, hardlink=False):
+    """
+    Brings ``target_fn`` up to date with ``source_fn``.
+
+    :returns: A tuple of the method used to update the file (or ``None`` if it
+       was current) and the new manifest record for the file.
+    """
+
+    source_signature = stat_signature(source_fn)
+
+    if record is not None and record[0] == source_signature:
+        digest = record[1]
+    else:
+        digest = None
+
+    if os.path.isfile(target_fn) and not os.path.islink(target_fn):
+        target_signature = stat_signature(target_fn)
+
+        if digest is not None and record[2] == target_signature:
+            return None, record
+
+        if digest is None:
+            digest = digest_file(source_fn)
+
+        if target_signature[0] == source_signature[0] and digest_file(target_fn) == digest:
+            return None, [source_signature, digest, target_signature]
+    elif os.path.lexists(target_fn):
+        remove_path(target_fn)
+
+    if digest is None:
+        digest = digest_file(source_fn)
+
+    method = copy_file(source_fn, target_fn, hardlink)
+
+    return method, [source_signature, digest, stat_signature(target_fn)]
+
+
+def sync_tree(source, target, exclusions=None, redactions=None, manifest=None, hardlink=False,
+              protected=None):
+    """
+    Makes the contents of the ``target`` directory identical to the ``source``
+    directory, except for ``exclusions`` (a list of ``rsync`` style patterns)
+    and ``redactions`` (a list of paths relative to ``source``, with or without
+    a leading ``/``).
+
+    :param string manifest: The path of a file that persists file signatures
+       and digests between runs. If ``None``, every file that exists in both
+       trees is compared by content.
+
+    :param bool hardlink: If ``True``, link files into ``target`` rather than
+       copying them. Only use hardlinks if no process modifies files in the
+       ``target`` in place.
+
+    :param set protected: Paths relative to ``target`` that another process
+       writes directly, which are neither copied nor deleted. Unlike
+       ``exclusions``, these are exact paths, and are cheap to check in bulk.
+
+    :returns: A dictionary that counts the files that were ``copied``,
+       ``unchanged``, and ``removed``.
+    """
+
+    exclusions = exclusions or []
+    redactions = set(fn.strip('/') for fn in redactions or [])
+    protected = set(protected or [])
+
+    directories, files = walk_source(source, exclusions, redactions, protected)
+
+    safe_create_directory(target)
+    removed = prune_target(target, directories, files, exclusions, redactions, protected)
+
+    for rel in sorted(directories):
+        path = os.path.join(target, rel)
+        if not os.path.isdir(path):
+            safe_create_directory(path)
+
+    previous = load_manifest(manifest)
+    current = {}
+    stats = {'copied': 0, 'unchanged': 0, 'removed': removed}
+
+    for rel, kind in files.items():
+        source_fn = os.path.join(source, rel)
+        target_fn = os.path.join(target, rel)
+
+        if kind == 'link':
+            changed = sync_link(source_fn, target_fn)
+        else:
+            try:
+                method, current[rel] = sync_file(source_fn, target_fn, previous.get(rel), hardlink)
+            except (IOError, OSError) as e:
+                if e.errno == errno.ENOENT:
+                    # the file disappeared between the walk and the copy.
+                    continue
+                raise
+
+            changed = method is not None
+
+        if changed is True:
+            stats['copied'] += 1
+        else:
+            stats['unchanged'] += 1
+
+    if manifest is not None and current != previous:
+        dump_manifest(manifest, current)
+
+    logger.debug('synced {0} to {1}: {2}'.format(source, target, stats))
+
+    return stats
+
+
+def sync_paths(source, target, paths, exclusions=None, redactions=None, hardlink=False):
+    """
+    Brings the files in ``paths`` (a list of paths relative to ``source``, with
+    or without a leading ``/``) up to date in ``target``, copying files that
+    exist in ``source`` and removing files that don't. ``exclusions`` and
+    ``redactions`` have the same meaning as for
+    :func:`~giza.tools.sync.sync_tree()`, and apply to all components of each
+    path.
+
+    :returns: A dictionary that counts the files that were ``copied``,
+       ``unchanged``, and ``removed``.
+    """
+
+    exclusions = exclusions or []
+    redactions = set(fn.strip('/') for fn in redactions or [])
+    stats = {'copied': 0, 'unchanged': 0, 'removed': 0}
+
+    for rel in paths:
+        rel = rel.strip('/')
+        parts = rel.split('/')
+        prefixes = ['/'.join(parts[:idx + 1]) for idx in range(len(parts))]
+
+        if any(is_excluded(prefix, exclusions) for prefix in prefixes):
+            continue
+
+        source_fn = os.path.join(source, rel)
+        target_fn = os.path.join(target, rel)
+
+        if any(prefix in redactions for prefix in prefixes) or not os.path.lexists(source_fn):
+            if os.path.lexists(target_fn):
+                remove_path(target_fn)
+                stats['removed'] += 1
+            continue
+
+        safe_create_directory(os.path.dirname(target_fn))
+
+        if os.path.islink(source_fn):
+            changed = sync_link(source_fn, target_fn)
+        elif os.path.isfile(source_fn):
+            changed = sync_file(source_fn, target_fn, None, hardlink)[0] is not None
+        else:
+            continue
+
+        if changed is True:
+            stats['copied'] += 1
+        else:
+            stats['unchanged'] += 1
+
+    logger.debug('synced {0} paths from {1} to {2}: {3}'.format(len(paths), source, target, stats))
+
+    return stats
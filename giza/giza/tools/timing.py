@@ -15,6 +15,8 @@
 import logging
 import time
 
+from giza.libgiza.profile import get_profiler
+
 logger = logging.getLogger('giza.tools.timing')
 
 
@@ -30,5 +32,10 @@ class Timer():
         self.start = time.time()
 
     def __exit__(self, *args):
+        end = time.time()
         logger.debug('time elapsed for "{0}" was: {1}'.format(
-            self.name, str(time.time() - self.start)))
+            self.name, str(end - self.start)))
+
+        profiler = get_profiler()
+        if profiler is not None:
+            profiler.add_phase(self.name, self.start, end)
@@ -13,6 +13,8 @@
 # limitations under the License.
 
 import logging
+import re
+import sys
 
 import giza.libgiza.task
 
@@ -20,6 +22,9 @@ from giza.tools.files import copy_always, copy_if_needed
 
 logger = logging.getLogger('giza.transformation')
 
+if sys.version_info >= (3, 0):
+    basestring = str
+
 
 class ProcessingError(Exception):
     pass
@@ -49,8 +54,53 @@ def munge_page(fn, regex, out_fn=None, tag='build'):
         logger.warning('{0}: did not write {1}'.format(tag, out_fn))
 
 
+class CombinedSubstitution(object):
+    """
+    Applies a list of ``(regex, substitution)`` pairs to content in a single
+    pass, by combining all patterns into one alternation. Where patterns match
+    at the same position, the pattern earliest in the list wins. Unlike
+    sequential substitution, the output of one substitution is never matched
+    by a later pattern, and substitutions must be literal strings.
+
+    Patterns can only share an alternation if they use the same flags (e.g.
+    :data:`re.IGNORECASE`); otherwise, the substitutions apply one at a time,
+    in order.
+    """
+
+    def __init__(self, regexes):
+        self.substitutions = {}
+        self.regexes = [(re.compile(regex) if isinstance(regex, basestring) else regex, subst)
+                        for regex, subst in regexes]
+
+        flags = set(regex.flags for regex, _ in self.regexes)
+        if len(flags) > 1:
+            self.regex = None
+            return
+
+        patterns = []
+        for idx, (regex, subst) in enumerate(self.regexes):
+            name = 'sub' + str(idx)
+            patterns.append('(?P<{0}>{1})'.format(name, regex.pattern))
+            self.substitutions[name] = subst
+
+        self.regex = re.compile('|'.join(patterns), flags.pop() if len(flags) == 1 else 0)
+
+    def replace(self, match):
+        return self.substitutions[match.lastgroup]
+
+    def sub(self, content):
+        if self.regex is None:
+            for regex, subst in self.regexes:
+                content = regex.sub(subst, content)
+            return content
+        else:
+            return self.regex.sub(self.replace, content)
+
+
 def munge_content(content, regex):
-    if isinstance(regex, list):
+    if isinstance(regex, CombinedSubstitution):
+        return regex.sub(content)
+    elif isinstance(regex, list):
         for cregex, subst in regex:
             content = cregex.sub(subst, content)
         return content
@@ -105,18 +155,37 @@ def truncate_file(fn, start_after=None, end_before=None):
 
 
 def append_to_file(fn, text):
+    """
+    Appends ``text`` to ``fn``, unless ``fn`` already ends with ``text``, so
+    that incremental builds, which don't overwrite unchanged files, don't
+    append ``text`` again.
+    """
+
+    with open(fn, 'r') as f:
+        body = f.read()
+
+    if body.endswith('\n' + text):
+        return
+
     with open(fn, 'a') as f:
         f.write('\n')
         f.write(text)
 
 
 def prepend_to_file(fn, text):
+    """
+    Prepends ``text`` to ``fn``, unless ``fn`` already starts with ``text``.
+    """
+
     with open(fn, 'r') as f:
-        body = f.readlines()
+        body = f.read()
+
+    if body.startswith(text):
+        return
 
     with open(fn, 'w') as f:
         f.write(text)
-        f.writelines(body)
+        f.write(body)
 
 
 def process_page_task(fn, output_fn, regex, builder='processor', copy='always'):
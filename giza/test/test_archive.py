@@ -0,0 +1,121 @@
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+
+from unittest import TestCase
+
+from giza.tools.archive import (ParallelGzipWriter, create_archive, extract_archive,
+                                load_archive_manifest)
+
+
+def write_file(fn, content):
+    dirname = os.path.dirname(fn)
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+
+    with open(fn, 'w') as f:
+        f.write(content)
+
+
+def read_file(fn):
+    with open(fn, 'r') as f:
+        return f.read()
+
+
+class TestParallelGzipWriter(TestCase):
+    def test_blocks_are_one_stream(self):
+        buf = io.BytesIO()
+        writer = ParallelGzipWriter(buf, threads=2, block_size=1024)
+
+        with tarfile.open(fileobj=writer, mode='w|') as t:
+            data = b'giza ' * 10000
+            info = tarfile.TarInfo('data.txt')
+            info.size = len(data)
+            t.addfile(info, io.BytesIO(data))
+        writer.close()
+
+        buf.seek(0)
+        with tarfile.open(fileobj=buf, mode='r:gz') as t:
+            self.assertEqual(t.extractfile('data.txt').read(), data)
+
+
+class TestArchive(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.dir, 'build', 'master')
+        self.archives = os.path.join(self.dir, 'archive')
+        self.target = os.path.join(self.dir, 'extracted')
+
+        write_file(os.path.join(self.source, 'html', 'index.html'), 'index')
+        write_file(os.path.join(self.source, 'html', 'tutorial', 'install.html'), 'install')
+        write_file(os.path.join(self.source, 'source', '.git', 'HEAD'), 'ref')
+        write_file(os.path.join(self.dir, 'build', 'deps.json'), '{}')
+        os.symlink('index.html', os.path.join(self.source, 'html', 'contents.html'))
+
+        os.utime(os.path.join(self.source, 'html', 'index.html'), (1000000000, 1000000000))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def archive(self, name, base=None, max_depth=5):
+        fn = os.path.join(self.archives, name)
+        create_archive(fn, [(self.source, 'master'),
+                            (os.path.join(self.dir, 'build', 'deps.json'), 'deps.json')],
+                       exclusions=['.git'], base=base, max_depth=max_depth, threads=2)
+        return fn
+
+    def target_path(self, *args):
+        return os.path.join(self.target, *args)
+
+    def test_round_trip(self):
+        fn = self.archive('one.tar.gz')
+        extract_archive(fn, self.target, threads=2)
+
+        self.assertEqual(read_file(self.target_path('master', 'html', 'tutorial',
+                                                    'install.html')), 'install')
+        self.assertEqual(read_file(self.target_path('deps.json')), '{}')
+        self.assertEqual(os.readlink(self.target_path('master', 'html', 'contents.html')),
+                         'index.html')
+        self.assertEqual(os.stat(self.target_path('master', 'html', 'index.html')).st_mtime,
+                         1000000000)
+        self.assertFalse(os.path.exists(self.target_path('master', 'source', '.git')))
+
+    def test_differential_archive(self):
+        base = self.archive('one.tar.gz')
+
+        write_file(os.path.join(self.source, 'html', 'index.html'), 'new index')
+        os.remove(os.path.join(self.source, 'html', 'tutorial', 'install.html'))
+        fn = self.archive('two.tar.gz', base=base)
+
+        manifest = load_archive_manifest(fn)
+        self.assertEqual(manifest['base'], 'one.tar.gz')
+        self.assertEqual(manifest['depth'], 1)
+        self.assertEqual(manifest['deleted'], ['master/html/tutorial/install.html'])
+
+        with tarfile.open(fn, 'r:gz') as t:
+            self.assertEqual(t.getnames(), ['master/html/index.html'])
+
+        extract_archive(fn, self.target)
+        self.assertEqual(read_file(self.target_path('master', 'html', 'index.html')),
+                         'new index')
+        self.assertTrue(os.path.isfile(self.target_path('deps.json')))
+        self.assertFalse(os.path.exists(self.target_path('master', 'html', 'tutorial',
+                                                         'install.html')))
+
+    def test_max_depth_writes_full_archive(self):
+        base = self.archive('one.tar.gz')
+        fn = self.archive('two.tar.gz', base=base, max_depth=1)
+
+        self.assertIsNone(load_archive_manifest(fn)['base'])
+
+    def test_unsafe_members_skipped(self):
+        fn = os.path.join(self.archives, 'unsafe.tar.gz')
+        os.makedirs(self.archives)
+
+        with tarfile.open(fn, 'w:gz') as t:
+            t.add(os.path.join(self.dir, 'build', 'deps.json'), arcname='../escape.json')
+
+        extract_archive(fn, self.target)
+        self.assertFalse(os.path.exists(os.path.join(self.dir, 'escape.json')))
@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+
+from giza.tools.benchmark import (run_benchmarks, compare_results, dump_results,
+                                  load_results, render_results, synthesize_content)
+from giza.libgiza.cache import load_yaml_documents
+
+
+class TestBenchmark(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.results = run_benchmarks(20, repeat=1)
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_all_benchmarks_run(self):
+        self.assertEqual(sorted(self.results['results'].keys()),
+                         ['data_cache', 'include_index', 'output', 'refresh_deps', 'scheduling'])
+        self.assertIn('thread_graph', self.results['results']['scheduling'])
+
+        for measurements in self.results['results'].values():
+            for timing in measurements.values():
+                self.assertLessEqual(timing['min'], timing['median'])
+
+    def test_results_persist(self):
+        fn = os.path.join(self.dir, 'results', 'benchmark.json')
+        dump_results(self.results, fn)
+
+        self.assertEqual(load_results(fn), self.results)
+
+    def test_compare_results(self):
+        previous = {'results': {'output': {'initial': {'median': 1.0},
+                                           'unchanged': {'median': 1.0}}}}
+        current = {'results': {'output': {'initial': {'median': 1.5},
+                                          'unchanged': {'median': 1.05}},
+                               'new': {'benchmark': {'median': 1.0}}}}
+
+        self.assertEqual(compare_results(previous, current),
+                         [('output.initial', 1.0, 1.5, 1.5, True),
+                          ('output.unchanged', 1.0, 1.05, 1.05, False)])
+
+    def test_render_results(self):
+        lines = render_results(self.results, compare_results(self.results, self.results))
+        self.assertTrue(lines[0].endswith('20 files'))
+        self.assertFalse(any(line.endswith('REGRESSION') for line in lines))
+
+    def test_synthesized_content_inherits(self):
+        files = synthesize_content(self.dir, 3, units_per_file=2, inheritance_depth=2)
+        docs = load_yaml_documents(files[1])
+
+        self.assertEqual(len(docs), 2)
+        self.assertEqual(docs[0]['source'], {'file': files[0], 'ref': 'unit-0'})
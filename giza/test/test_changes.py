@@ -0,0 +1,81 @@
+import os
+import shutil
+import subprocess
+import tempfile
+
+from unittest import TestCase
+
+from giza.changes import ChangeSet
+from giza.libgiza.git import GitRepo
+
+
+def write_file(fn, content):
+    dirname = os.path.dirname(fn)
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+
+    with open(fn, 'w') as f:
+        f.write(content)
+
+
+class Paths(object):
+    source = 'source'
+    branch_source = 'build/master/source'
+
+    def __init__(self, projectroot):
+        self.projectroot = projectroot
+
+
+class Conf(object):
+    def __init__(self, projectroot):
+        self.paths = Paths(projectroot)
+
+
+class TestChangeSet(TestCase):
+    def setUp(self):
+        self.dir = os.path.realpath(tempfile.mkdtemp())
+        self.repo = GitRepo(self.dir)
+        self.conf = Conf(self.dir)
+
+        write_file(os.path.join(self.dir, 'source', 'index.txt'), 'index')
+        write_file(os.path.join(self.dir, 'source', 'install.txt'), 'install')
+        write_file(os.path.join(self.dir, 'config', 'build_conf.yaml'), 'project: {}')
+
+        for args in (['init', '-q'],
+                     ['add', '.'],
+                     ['-c', 'user.name=giza', '-c', 'user.email=giza@example.net',
+                      'commit', '-q', '-m', 'initial']):
+            subprocess.check_call(['git'] + args, cwd=self.dir)
+
+        write_file(os.path.join(self.dir, 'source', 'index.txt'), 'new index')
+        write_file(os.path.join(self.dir, 'source', 'new.txt'), 'new')
+        os.remove(os.path.join(self.dir, 'source', 'install.txt'))
+
+        self.changes = ChangeSet('HEAD', self.dir, 'source')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_changed_files(self):
+        self.assertEqual(sorted(self.repo.changed_files('HEAD')),
+                         ['source/index.txt', 'source/install.txt', 'source/new.txt'])
+
+    def test_source_files(self):
+        self.assertEqual(self.changes.source_files,
+                         set(['/index.txt', '/install.txt', '/new.txt']))
+
+    def test_relative_paths(self):
+        self.assertEqual(self.changes.relative('/includes/a.rst', self.conf), '/includes/a.rst')
+        self.assertEqual(self.changes.relative('source/index.txt', self.conf), '/index.txt')
+        self.assertEqual(self.changes.relative(
+            os.path.join(self.dir, 'build', 'master', 'source', 'index.txt'), self.conf),
+            '/index.txt')
+        self.assertIsNone(self.changes.relative('config/build_conf.yaml', self.conf))
+
+    def test_is_affected(self):
+        self.changes._content = set()
+
+        self.assertTrue(self.changes.is_affected(
+            [os.path.join(self.dir, 'build', 'master', 'source', 'new.txt')], self.conf))
+        self.assertFalse(self.changes.is_affected('config/build_conf.yaml', self.conf))
+        self.assertTrue(self.changes.is_affected(None, self.conf))
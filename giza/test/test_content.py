@@ -1,6 +1,7 @@
 from nose.tools import nottest, istest
 
 import os
+from unittest import TestCase
 
 # this runs tests of the inheritance.py baseclasses, as is.
 from giza.libgiza.test.test_inheritance import (TestDataCache, TestDataContentBase,
@@ -30,6 +31,9 @@ import giza.content.release.inheritance
 import giza.content.release.models
 import giza.content.examples.inheritance
 import giza.content.examples.models
+import giza.content.apiargs.inheritance
+
+from giza.libgiza.inheritance import InheritableContentError
 
 def get_local_data_path():
     return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
@@ -332,3 +336,64 @@ class TestExamplesInheritedContentResolution(GizaInheritedContentResolutionBase)
         self.short_name = 'examples'
         self.len_source_docs = 9
         self.num_docs = 2
+
+# Inheritance between files, through the unit index
+
+class CrossFileInheritanceBase(object):
+    def setUp(self):
+        self.c = Configuration()
+        self.c.runstate = RuntimeStateConfig()
+        self.c.project = {'name': 'test'}
+        self.c.state['git'] = giza.config.git.GitConfig({}, self.c, os.getcwd())
+
+        path = get_local_data_path()
+        self.c.paths = {'includes': path,
+                        'source': path,
+                        'projectroot': path,
+                        'output': path}
+
+        class DataCache(self.DataCache):
+            search_paths = [path]
+
+        # ingest the inheriting file first, so that resolving it loads the
+        # file it inherits from by name.
+        self.files = [os.path.join(path, self.short_name + '-two.yaml'),
+                      os.path.join(path, self.short_name + '-one.yaml')]
+        self.data = DataCache(self.files, self.c)
+
+    def test_inherits_across_files(self):
+        content = self.data.cache[self.files[0]].fetch(self.ref)
+
+        self.assertTrue(content.source.resolved)
+        self.assertEqual(content.description, self.description)
+
+    def test_fetch_by_name(self):
+        data = self.data.__class__([], self.c)
+        content = data.fetch(self.short_name + '-one.yaml', self.source_ref)
+
+        self.assertIn(self.files[1], data)
+        self.assertIs(content, data.cache[self.files[1]].fetch(self.source_ref))
+
+    def test_missing_ref_raises(self):
+        with self.assertRaises(InheritableContentError):
+            self.data.fetch(self.short_name + '-one.yaml', self.missing_ref)
+
+
+@istest
+class TestOptionsCrossFileInheritance(CrossFileInheritanceBase, TestCase):
+    DataCache = giza.content.options.inheritance.OptionDataCache
+    short_name = 'options'
+    ref = ('mongodump', 'help')
+    source_ref = ('_shared', 'help')
+    missing_ref = ('mongodump', 'help')
+    description = 'Returns information on the options and use of {{program}}.\n'
+
+
+@istest
+class TestApiArgsCrossFileInheritance(CrossFileInheritanceBase, TestCase):
+    DataCache = giza.content.apiargs.inheritance.ApiArgDataCache
+    short_name = 'apiargs'
+    ref = 'query'
+    source_ref = 'query'
+    missing_ref = 'limit'
+    description = 'Optional. Specifies selection criteria for {{operation}}.\n\n'
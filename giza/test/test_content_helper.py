@@ -0,0 +1,54 @@
+import subprocess
+import sys
+
+from unittest import TestCase
+
+from giza.content.helper import ContentTasks, load_content_tasks, content_task_groups
+from giza.libgiza.app import BuildApp
+from giza.libgiza.task import Task
+
+
+def generate_tasks(conf):
+    return [Task(job=sum, args=[[conf, 1]], target=True, description='generate content'),
+            Task(job=sum, args=[[conf, 2]], target=True, description='generate content')]
+
+
+class TestContentTaskGroups(TestCase):
+    def setUp(self):
+        self.prep_app = BuildApp.new(pool_type='serial')
+        self.prep_app.scheduler = 'graph'
+
+        # asset tasks return the exit code of the command that generates them.
+        self.asset = Task(job=subprocess.call,
+                          args=[[sys.executable, '-c', 'pass']],
+                          target=True,
+                          description='generate assets')
+        self.prep_app.add(self.asset)
+
+        self.loader = Task(job=load_content_tasks,
+                           args=[generate_tasks, 1],
+                           target=True,
+                           description='loading content')
+        self.loader.requires = [self.asset]
+        self.prep_app.add(self.loader)
+
+    def test_load_content_tasks(self):
+        tasks = load_content_tasks(generate_tasks, 1)
+
+        self.assertIsInstance(tasks, ContentTasks)
+        self.assertEqual(len(tasks), 2)
+
+    def test_groups_ignore_other_results(self):
+        results = self.prep_app.run()
+        self.assertIn(0, results)
+
+        groups = content_task_groups(results)
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(len(groups[0]), 2)
+
+    def test_groups_extend_queue(self):
+        app = BuildApp.new(pool_type='serial')
+        for task_group in content_task_groups(self.prep_app.run()):
+            app.extend_queue(task_group)
+
+        self.assertEqual(app.run(), [2, 3])
@@ -0,0 +1,162 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from unittest import TestCase
+
+from rstcloth.rstcloth import RstCloth
+
+from giza.content.output import write_content_batch, content_output_tasks
+from giza.tools.files import write_if_changed
+
+
+def render_title(text):
+    r = RstCloth()
+    r.title(text)
+    return r
+
+
+class RunState(object):
+    pool_size = 2
+
+    def __init__(self, since=None):
+        self.since = since
+
+
+class Paths(object):
+    projectroot = None
+    source = 'source'
+    branch_source = 'build/master/source'
+
+
+class Conf(object):
+    def __init__(self, projectroot, since=None):
+        self.runstate = RunState(since)
+        self.paths = Paths()
+        self.paths.projectroot = projectroot
+
+
+class TestWriteIfChanged(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.fn = os.path.join(self.dir, 'includes', 'steps-test.rst')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_writes_new_file(self):
+        self.assertTrue(write_if_changed(self.fn, 'content\n'))
+
+        with open(self.fn, 'r') as f:
+            self.assertEqual(f.read(), 'content\n')
+
+    def test_unchanged_file_not_written(self):
+        write_if_changed(self.fn, 'content\n')
+        past = time.time() - 100
+        os.utime(self.fn, (past, past))
+
+        self.assertFalse(write_if_changed(self.fn, 'content\n'))
+        self.assertEqual(os.path.getmtime(self.fn), past)
+
+    def test_changed_file_written(self):
+        write_if_changed(self.fn, 'content\n')
+
+        self.assertTrue(write_if_changed(self.fn, 'new content\n'))
+        self.assertEqual(os.listdir(os.path.dirname(self.fn)), ['steps-test.rst'])
+
+
+class TestContentOutput(TestCase):
+    def setUp(self):
+        self.dir = os.path.realpath(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_batch_reports_changed_files(self):
+        batch = [(render_title, ('one',), os.path.join(self.dir, 'one.rst')),
+                 (render_title, ('two',), os.path.join(self.dir, 'two.rst'))]
+
+        self.assertEqual(write_content_batch(batch, 'test'), [batch[0][2], batch[1][2]])
+
+        batch[1] = (render_title, ('three',), batch[1][2])
+        self.assertEqual(write_content_batch(batch, 'test'), [batch[1][2]])
+
+    def test_output_matches_rstcloth(self):
+        fn = os.path.join(self.dir, 'one.rst')
+        render_title('one').write(fn)
+
+        self.assertEqual(write_content_batch([(render_title, ('one',), fn)], 'test'), [])
+
+    def test_tasks_are_batched(self):
+        outputs = [(render_title, (str(idx),), os.path.join(self.dir, '{0}.rst'.format(idx)),
+                    os.path.join(self.dir, 'source.yaml'))
+                   for idx in range(200)]
+
+        tasks = content_output_tasks(outputs, Conf(self.dir), 'test')
+
+        self.assertEqual(len(tasks), 4)
+        self.assertEqual(sum(len(task.args[0]) for task in tasks), 200)
+        self.assertEqual(tasks[0].dependency, [os.path.join(self.dir, 'source.yaml')])
+        self.assertEqual(content_output_tasks([], Conf(self.dir), 'test'), [])
+
+    def get_outputs(self, count):
+        source = os.path.join(self.dir, 'source.yaml')
+        with open(source, 'w') as f:
+            f.write('source')
+
+        past = time.time() - 100
+        os.utime(source, (past, past))
+
+        return [(render_title, (str(idx),), os.path.join(self.dir, '{0}.rst'.format(idx)), source)
+                for idx in range(count)]
+
+    def test_batch_touches_stamp(self):
+        task = content_output_tasks(self.get_outputs(2), Conf(self.dir), 'test')[0]
+        self.assertTrue(task.needs_rebuild)
+
+        task.run()
+        self.assertTrue(os.path.isfile(task.target))
+
+        # unchanged output files keep their mtime, but the stamp is newer
+        # than the dependencies.
+        self.assertFalse(task.needs_rebuild)
+        self.assertFalse(content_output_tasks(self.get_outputs(2), Conf(self.dir),
+                                              'test')[0].needs_rebuild)
+
+    def test_missing_output_rebuilds(self):
+        outputs = self.get_outputs(2)
+        content_output_tasks(outputs, Conf(self.dir), 'test')[0].run()
+        os.remove(outputs[1][2])
+
+        task = content_output_tasks(outputs, Conf(self.dir), 'test')[0]
+        self.assertTrue(task.needs_rebuild)
+
+        task.run()
+        self.assertTrue(os.path.isfile(outputs[1][2]))
+
+    def test_incremental_batches_are_stable(self):
+        outputs = []
+        for idx in range(200):
+            dependency = os.path.join(self.dir, 'data', '{0}.yaml'.format(idx))
+            write_if_changed(dependency, str(idx))
+            outputs.append((render_title, (str(idx),),
+                            os.path.join(self.dir, '{0}.rst'.format(idx)), dependency))
+
+        stamps = [task.target for task in content_output_tasks(outputs, Conf(self.dir), 'test')]
+        for task in content_output_tasks(outputs, Conf(self.dir), 'test'):
+            task.run()
+
+        for args in (['init', '-q'],
+                     ['add', 'data'],
+                     ['-c', 'user.name=giza', '-c', 'user.email=giza@example.net',
+                      'commit', '-q', '-m', 'initial']):
+            subprocess.check_call(['git'] + args, cwd=self.dir)
+
+        write_if_changed(outputs[5][3], 'changed')
+
+        tasks = content_output_tasks(outputs, Conf(self.dir, since='HEAD'), 'test')
+        self.assertEqual(len(tasks), 1)
+        self.assertEqual(tasks[0].args[0], [outputs[5][:3]])
+        self.assertIn(tasks[0].target, stamps)
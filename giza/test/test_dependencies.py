@@ -0,0 +1,168 @@
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from unittest import TestCase
+
+from giza.content.dependencies import (dump_file_hashes, load_dependency_cache,
+                                       check_hashed_dependency, _refresh_deps)
+from giza.libgiza.cache import stat_signature
+from giza.tools.files import md5_file
+
+
+def write_file(fn, content):
+    dirname = os.path.dirname(fn)
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+
+    with open(fn, 'w') as f:
+        f.write(content)
+
+
+class Settings(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class TestDependencyCache(TestCase):
+    def setUp(self):
+        self.dir = os.path.realpath(tempfile.mkdtemp())
+        self.conf = Settings(paths=Settings(projectroot=self.dir,
+                                            source='source',
+                                            branch_source='build/master/source'),
+                             system=Settings(dependency_cache=os.path.join(self.dir, 'build',
+                                                                           'deps.json')),
+                             runstate=Settings(since=None))
+
+        self.source_fn = os.path.join(self.dir, 'source', 'includes', 'install.rst')
+        self.index_fn = os.path.join(self.dir, 'build', 'master', 'source', 'index.txt')
+        self.branch_fn = os.path.join(self.dir, 'build', 'master', 'source',
+                                      'includes', 'install.rst')
+        self.generated_fn = os.path.join(self.dir, 'build', 'master', 'source',
+                                         'includes', 'steps', 'install.rst')
+
+        write_file(self.source_fn, 'install')
+        write_file(self.branch_fn, 'install')
+        write_file(self.generated_fn, 'steps')
+        write_file(self.index_fn, '.. include:: /includes/install.rst')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def bump_mtime(self, fn, offset=10):
+        future = time.time() + offset
+        os.utime(fn, (future, future))
+
+    def load(self):
+        return load_dependency_cache(self.conf.system.dependency_cache)
+
+    def test_dump_file_hashes(self):
+        dump_file_hashes(self.conf)
+        cache = self.load()
+
+        self.assertEqual(cache['files'][self.branch_fn], md5_file(self.branch_fn))
+        self.assertEqual(cache['signatures'][self.branch_fn], stat_signature(self.branch_fn))
+
+    def test_unchanged_signature_not_hashed(self):
+        dump_file_hashes(self.conf)
+
+        # a digest that hashing the file can't produce shows that the file
+        # wasn't hashed again.
+        cache = self.load()
+        cache['files'][self.branch_fn] = 'cached'
+        with open(self.conf.system.dependency_cache, 'w') as f:
+            json.dump(cache, f)
+
+        dump_file_hashes(self.conf)
+        self.assertEqual(self.load()['files'][self.branch_fn], 'cached')
+
+        self.bump_mtime(self.branch_fn)
+        dump_file_hashes(self.conf)
+        self.assertEqual(self.load()['files'][self.branch_fn], md5_file(self.branch_fn))
+
+    def test_changed_mtime_same_content_not_rebuilt(self):
+        dep_map = {self.source_fn: md5_file(self.source_fn)}
+        signatures = {self.source_fn: stat_signature(self.source_fn)}
+        self.bump_mtime(self.source_fn)
+
+        self.assertFalse(check_hashed_dependency('/includes/install.rst', dep_map,
+                                                 self.conf, signatures))
+
+        self.bump_mtime(self.index_fn, offset=-100)
+        mtime = os.stat(self.index_fn).st_mtime
+        _refresh_deps({'/includes/install.rst': ['/index.txt']}, dep_map, self.conf, signatures)
+        self.assertEqual(os.stat(self.index_fn).st_mtime, mtime)
+
+    def test_changed_content_rebuilt(self):
+        dep_map = {self.source_fn: md5_file(self.source_fn)}
+        signatures = {self.source_fn: stat_signature(self.source_fn)}
+        write_file(self.source_fn, 'new install')
+        self.bump_mtime(self.source_fn)
+
+        self.assertTrue(check_hashed_dependency('/includes/install.rst', dep_map,
+                                                self.conf, signatures))
+
+        self.bump_mtime(self.index_fn, offset=-100)
+        mtime = os.stat(self.index_fn).st_mtime
+        _refresh_deps({'/includes/install.rst': ['/index.txt']}, dep_map, self.conf, signatures)
+        self.assertNotEqual(os.stat(self.index_fn).st_mtime, mtime)
+
+    def test_legacy_cache_loads(self):
+        write_file(self.conf.system.dependency_cache,
+                   json.dumps({'time': '0', 'files': {self.branch_fn: 'legacy'}}))
+
+        cache = self.load()
+        self.assertEqual(cache['files'], {self.branch_fn: 'legacy'})
+        self.assertEqual(cache['signatures'], {})
+
+        # without signatures, every file is hashed again.
+        dump_file_hashes(self.conf)
+        self.assertEqual(self.load()['files'][self.branch_fn], md5_file(self.branch_fn))
+
+    def test_invalid_cache(self):
+        write_file(self.conf.system.dependency_cache, 'not json')
+        self.assertIsNone(self.load())
+
+    def test_changed_generated_file_touches_dependents(self):
+        dep_map = {self.generated_fn: md5_file(self.generated_fn)}
+        signatures = {self.generated_fn: stat_signature(self.generated_fn)}
+        write_file(self.generated_fn, 'new steps')
+        self.bump_mtime(self.generated_fn)
+
+        self.bump_mtime(self.index_fn, offset=-100)
+        mtime = os.stat(self.index_fn).st_mtime
+        _refresh_deps({'/includes/steps/install.rst': ['/index.txt']},
+                      dep_map, self.conf, signatures)
+        self.assertNotEqual(os.stat(self.index_fn).st_mtime, mtime)
+
+    def test_unchanged_generated_file_not_rebuilt(self):
+        dep_map = {self.generated_fn: md5_file(self.generated_fn)}
+        signatures = {self.generated_fn: stat_signature(self.generated_fn)}
+
+        self.bump_mtime(self.index_fn, offset=-100)
+        mtime = os.stat(self.index_fn).st_mtime
+        _refresh_deps({'/includes/steps/install.rst': ['/index.txt']},
+                      dep_map, self.conf, signatures)
+        self.assertEqual(os.stat(self.index_fn).st_mtime, mtime)
+
+    def test_incremental_dump_hashes_generated_files(self):
+        for args in (['init', '-q'],
+                     ['add', 'source'],
+                     ['-c', 'user.name=giza', '-c', 'user.email=giza@example.net',
+                      'commit', '-q', '-m', 'initial']):
+            subprocess.check_call(['git'] + args, cwd=self.dir)
+
+        dump_file_hashes(self.conf)
+
+        write_file(self.generated_fn, 'new steps')
+        self.bump_mtime(self.generated_fn)
+        self.conf.runstate.since = 'HEAD'
+        dump_file_hashes(self.conf)
+
+        cache = self.load()
+        self.assertEqual(cache['files'][self.generated_fn], md5_file(self.generated_fn))
+        self.assertEqual(cache['signatures'][self.generated_fn],
+                         stat_signature(self.generated_fn))
@@ -0,0 +1,181 @@
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+
+from giza.deploy import Deploy, deploy_host, delta_deploy_host, parse_rsync_stats
+from giza.tools.manifest import manifest_name, write_manifest
+
+
+class Branches(object):
+    current = 'master'
+
+
+class Git(object):
+    branches = Branches()
+
+
+class Paths(object):
+    output = 'build'
+
+
+class Conf(object):
+    paths = Paths()
+    git = Git()
+
+
+def write_file(fn, content):
+    dirname = os.path.dirname(fn)
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+
+    with open(fn, 'w') as f:
+        f.write(content)
+
+
+def shell(script):
+    return ['sh', '-c', script]
+
+
+class TestDeploy(TestCase):
+    def setUp(self):
+        self.deploy = Deploy(Conf())
+        self.deploy.name = 'push'
+        self.deploy.local_path = 'public'
+        self.deploy.remote_path = '/srv/www/docs'
+        self.deploy.deploy_env = {}
+        self.deploy.hosts = ['web1', 'web2']
+        self.deploy.static_files = ['.htaccess', 'robots.txt']
+        self.deploy.delete = True
+
+    def test_static_files_share_one_transfer(self):
+        transfers = self.deploy.host_transfers('web1')
+
+        self.assertEqual(len(transfers), 2)
+        self.assertEqual(transfers[0],
+                         (['rsync', '-cltz', '--stats', '--delete', '--recursive',
+                           'build/public/', 'web1:/srv/www/docs'], None))
+        self.assertEqual(transfers[1],
+                         (['rsync', '-cltz', '--stats', '--files-from=-',
+                           'build/public/', 'web1:/srv/www/docs'], ['.htaccess', 'robots.txt']))
+
+    def test_htaccess_only_from_master(self):
+        Branches.current = 'v3.0'
+        try:
+            self.assertEqual(self.deploy.host_transfers('web1')[1][1], ['robots.txt'])
+        finally:
+            Branches.current = 'master'
+
+    def test_deploy_commands(self):
+        self.assertEqual(len(list(self.deploy.deploy_commands())), 4)
+
+    def test_run_deploys_all_hosts(self):
+        self.deploy.host_transfers = lambda host: [(shell('exit 0'), None)]
+        self.deploy.parallel = 2
+
+        results = self.deploy.run()
+        self.assertEqual([r['host'] for r in results], ['web1', 'web2'])
+        self.assertEqual([r['code'] for r in results], [0, 0])
+
+
+class TestDeployHost(TestCase):
+    def test_stats(self):
+        output = ('Number of regular files transferred: 1,024\\n'
+                  'Total transferred file size: 2,097,152 bytes\\n')
+        result = deploy_host('web1', [(shell("printf '{0}'".format(output)), None)])
+
+        self.assertEqual(result['code'], 0)
+        self.assertEqual(result['files'], 1024)
+        self.assertEqual(result['bytes'], 2097152)
+
+    def test_files_from_stdin(self):
+        result = deploy_host('web1', [(shell('grep -q robots.txt'), ['.htaccess', 'robots.txt'])])
+        self.assertEqual(result['code'], 0)
+
+    def test_retries_transient_errors(self):
+        marker = os.path.join(tempfile.mkdtemp(), 'attempted')
+        try:
+            script = 'test -f {0} || {{ touch {0}; exit 12; }}'.format(marker)
+            result = deploy_host('web1', [(shell(script), None)], retries=1, retry_delay=0)
+        finally:
+            shutil.rmtree(os.path.dirname(marker))
+
+        self.assertEqual(result['code'], 0)
+
+    def test_gives_up_after_retries(self):
+        self.assertEqual(deploy_host('web1', [(shell('exit 12'), None)],
+                                     retries=1, retry_delay=0)['code'], 12)
+
+    def test_stops_at_failed_transfer(self):
+        result = deploy_host('web1', [(shell('exit 1'), None), (shell('exit 0'), None)],
+                             retries=1, retry_delay=0)
+        self.assertEqual(result['code'], 1)
+
+    def test_parse_missing_stats(self):
+        self.assertEqual(parse_rsync_stats(''), {'files': 0, 'bytes': 0})
+
+
+class TestDeltaDeploy(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.dir, 'build', 'public')
+        self.host = os.path.join(self.dir, 'host')
+        self.target = os.path.join(self.host, 'srv', 'www', 'docs')
+
+        write_file(os.path.join(self.source, 'index.html'), 'index')
+        write_file(os.path.join(self.source, 'tutorial', 'install.html'), 'install')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def deploy(self):
+        return delta_deploy_host(self.host, self.source, '/srv/www/docs',
+                                 write_manifest(self.source), ['rsync'])
+
+    def test_initial_deploy(self):
+        result = self.deploy()
+
+        self.assertEqual(result['code'], 0)
+        self.assertEqual(result['files'], 2)
+        self.assertTrue(os.path.isfile(os.path.join(self.target, 'tutorial', 'install.html')))
+        self.assertTrue(os.path.isfile(os.path.join(self.target, manifest_name)))
+
+    def test_only_changes_transferred(self):
+        self.deploy()
+        write_file(os.path.join(self.source, 'index.html'), 'new index')
+        os.remove(os.path.join(self.source, 'tutorial', 'install.html'))
+
+        result = self.deploy()
+        self.assertEqual(result['files'], 1)
+        self.assertFalse(os.path.exists(os.path.join(self.target, 'tutorial', 'install.html')))
+
+        with open(os.path.join(self.target, 'index.html')) as f:
+            self.assertEqual(f.read(), 'new index')
+
+        self.assertEqual(self.deploy()['files'], 0)
+
+    def test_branched_deploy(self):
+        d = Deploy(Conf())
+        d.name = 'push'
+        d.local_path = 'public'
+        d.remote_path = '/srv/www/docs'
+        d.deploy_env = {}
+        d.hosts = [self.host]
+        d.static_files = ['robots.txt']
+        d.branched = True
+        d.delta = True
+
+        Paths.output = os.path.join(self.dir, 'build')
+        try:
+            write_file(os.path.join(self.source, 'robots.txt'), 'robots')
+            write_file(os.path.join(self.source, 'master', 'index.html'), 'index')
+
+            self.assertEqual([r['code'] for r in d.run()], [0])
+        finally:
+            Paths.output = 'build'
+
+        self.assertTrue(os.path.isfile(os.path.join(self.target, 'robots.txt')))
+        self.assertTrue(os.path.isfile(os.path.join(self.target, 'master', 'index.html')))
+        self.assertTrue(os.path.isfile(os.path.join(self.target, 'master', manifest_name)))
+        self.assertFalse(os.path.exists(os.path.join(self.target, 'tutorial')))
@@ -0,0 +1,116 @@
+import multiprocessing.dummy
+import os
+import shutil
+import tempfile
+import time
+
+from unittest import TestCase
+
+from giza.includes import IncludeIndex, scan_includes
+
+
+def write_file(fn, content):
+    dirname = os.path.dirname(fn)
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+
+    with open(fn, 'w') as f:
+        f.write(content)
+
+
+class TestIncludeIndex(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.dir, 'source')
+        self.index_fn = os.path.join(self.dir, 'build', 'include-index.json')
+
+        write_file(os.path.join(self.source, 'index.txt'),
+                   'title\n\n.. include:: /includes/intro.rst\n')
+        write_file(os.path.join(self.source, 'tutorial', 'install.txt'),
+                   '.. only:: html\n\n   .. include:: /includes/intro.rst\n'
+                   '.. include:: /includes/steps/install.rst\n')
+        write_file(os.path.join(self.source, 'includes', 'intro.rst'),
+                   'no includes here\n')
+        write_file(os.path.join(self.source, 'reference', 'overview.rst'),
+                   '.. include:: /includes/intro.rst\n')
+
+        self.index = IncludeIndex(self.source, self.index_fn)
+        self.index.refresh()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_scan_includes(self):
+        self.assertEqual(scan_includes(os.path.join(self.source, 'tutorial', 'install.txt')),
+                         ['/includes/intro.rst', '/includes/steps/install.rst'])
+
+    def test_scan_binary_file(self):
+        fn = os.path.join(self.source, 'image.png')
+        with open(fn, 'wb') as f:
+            f.write(b'\0\0.. include:: /includes/intro.rst\n')
+
+        self.assertEqual(scan_includes(fn), [])
+
+    def test_graph(self):
+        self.assertEqual(self.index.graph(),
+                         {'/includes/intro.rst': ['/index.txt', '/tutorial/install.txt'],
+                          '/includes/steps/install.rst': ['/tutorial/install.txt']})
+
+    def test_lookups(self):
+        self.assertEqual(self.index.includes('/index.txt'), ['/includes/intro.rst'])
+        self.assertEqual(self.index.included_by('/includes/steps/install.rst'),
+                         ['/tutorial/install.txt'])
+        self.assertEqual(self.index.included_by('/includes/missing.rst'), [])
+
+    def test_refresh_rescans_changed_files(self):
+        fn = os.path.join(self.source, 'index.txt')
+        write_file(fn, '.. include:: /includes/other.rst\n')
+        future = time.time() + 10
+        os.utime(fn, (future, future))
+
+        self.index.refresh()
+        self.assertEqual(self.index.includes('/index.txt'), ['/includes/other.rst'])
+        self.assertEqual(self.index.included_by('/includes/other.rst'), ['/index.txt'])
+
+    def test_refresh_drops_removed_files(self):
+        os.remove(os.path.join(self.source, 'tutorial', 'install.txt'))
+
+        self.index.refresh()
+        self.assertNotIn('/includes/steps/install.rst', self.index.graph())
+
+    def test_persisted_index_is_reused(self):
+        self.index.dump()
+        self.assertTrue(os.path.isfile(self.index_fn))
+
+        index = IncludeIndex(self.source, self.index_fn)
+        self.assertEqual(index.files, self.index.files)
+
+        index.refresh()
+        self.assertFalse(index._changed)
+        self.assertEqual(index.graph(), self.index.graph())
+
+    def test_parallel_scan(self):
+        for i in range(100):
+            write_file(os.path.join(self.source, 'many', '{0}.txt'.format(i)),
+                       '.. include:: /includes/intro.rst\n')
+
+        self.index.refresh()
+        self.assertEqual(len(self.index.included_by('/includes/intro.rst')), 102)
+
+    def test_concurrent_refresh_and_graph(self):
+        def refresh(idx):
+            write_file(os.path.join(self.source, 'many', '{0}.txt'.format(idx)),
+                       '.. include:: /includes/intro.rst\n')
+            self.index.refresh()
+            self.index.dump()
+            return len(self.index.graph()['/includes/intro.rst'])
+
+        pool = multiprocessing.dummy.Pool(8)
+        try:
+            counts = pool.map(refresh, range(200))
+        finally:
+            pool.close()
+            pool.join()
+
+        self.assertTrue(all(count >= 3 for count in counts))
+        self.assertEqual(len(self.index.included_by('/includes/intro.rst')), 202)
@@ -0,0 +1,121 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+
+from unittest import TestCase
+
+from giza.content.post.json_output import (json_substitutions, process_json_batch,
+                                           load_json_cache, remove_json_cache)
+from giza.tools.transformation import munge_content
+
+
+class Project(object):
+    url = 'https://docs.example.net'
+    basepath = 'manual'
+    branched = False
+
+
+class Conf(object):
+    project = Project()
+
+
+class TestJsonSubstitutions(TestCase):
+    def setUp(self):
+        self.sequential = [
+            (re.compile(r'<a class=\"headerlink\"'), '<a'),
+            (re.compile(r'<[^>]*>'), ''),
+            (re.compile(r'&#8220;'), '"'),
+            (re.compile(r'&#8221;'), '"'),
+            (re.compile(r'&#8216;'), "'"),
+            (re.compile(r'&#8217;'), "'"),
+            (re.compile(r'&#\d{4};'), ''),
+            (re.compile(r'&nbsp;'), ''),
+            (re.compile(r'&gt;'), '>'),
+            (re.compile(r'&lt;'), '<')
+        ]
+
+    def test_matches_sequential_substitution(self):
+        content = ('<h1>Title<a class="headerlink" href="#title">&#182;</a></h1>\n'
+                   '<p>&#8220;quoted&#8221; and &#8216;single&#8217;&nbsp;text, '
+                   '&lt;b&gt; is literal &#8212; done</p>')
+
+        self.assertEqual(munge_content(content, json_substitutions),
+                         munge_content(content, self.sequential))
+        self.assertEqual(munge_content(content, json_substitutions),
+                         'Title&#182;\n"quoted" and \'single\'text, <b> is literal  done')
+
+
+class TestJsonBatch(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.dir)
+
+        self.input_fn = os.path.join('build', 'master', 'json', 'index.fjson')
+        self.output_fn = os.path.join(self.dir, 'public', 'json', 'index.json')
+        self.cache_dir = os.path.join(self.dir, 'build', 'master', 'json-cache')
+
+        os.makedirs(os.path.dirname(self.input_fn))
+        self.write_input('<p>text</p>')
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.dir)
+
+    def write_input(self, body):
+        with open(self.input_fn, 'w') as f:
+            json.dump({'title': '<em>Index</em>', 'body': body}, f)
+
+    def run_batch(self, idx=0):
+        previous, generation = load_json_cache(self.cache_dir, 'https://docs.example.net/manual')
+        return process_json_batch([(self.input_fn, self.output_fn)], previous,
+                                  self.cache_dir, idx, generation, Conf())
+
+    def read_output(self):
+        with open(self.output_fn, 'r') as f:
+            return json.load(f)
+
+    def test_processes_document(self):
+        self.assertEqual(self.run_batch(), 1)
+
+        doc = self.read_output()
+        self.assertEqual(doc['title'], 'Index')
+        self.assertEqual(doc['text'], 'text')
+        self.assertEqual(doc['url'], 'https://docs.example.net/manual/index/')
+
+    def test_skips_unchanged_documents(self):
+        self.run_batch()
+        self.assertEqual(self.run_batch(), 0)
+
+        # rewriting the same content changes the signature, but not the digest.
+        self.write_input('<p>text</p>')
+        self.assertEqual(self.run_batch(), 0)
+
+        self.write_input('<p>new text</p>')
+        self.assertEqual(self.run_batch(), 1)
+
+    def test_missing_output_reprocessed(self):
+        self.run_batch()
+        os.remove(self.output_fn)
+
+        self.assertEqual(self.run_batch(), 1)
+
+    def test_newest_record_wins(self):
+        # the number of batches changed between builds, so the document has
+        # records in two batches.
+        self.run_batch(idx=2)
+        self.write_input('<p>new text</p>')
+        self.assertEqual(self.run_batch(idx=10), 1)
+
+        self.write_input('<p>text</p>')
+        self.assertEqual(self.run_batch(idx=10), 1)
+        self.assertEqual(self.read_output()['text'], 'text')
+
+    def test_remove_records_of_old_batches(self):
+        for idx in (0, 2, 10):
+            self.run_batch(idx=idx)
+
+        remove_json_cache(self.cache_dir, 2)
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), ['batch-0.json'])
@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+
+from giza.tools.manifest import (manifest_name, build_manifest, write_manifest,
+                                 local_manifest_fn, subset_manifest, diff_manifests)
+
+
+def write_file(fn, content):
+    dirname = os.path.dirname(fn)
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+
+    with open(fn, 'w') as f:
+        f.write(content)
+
+
+class TestManifest(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.dir = os.path.join(self.root, 'public')
+
+        write_file(os.path.join(self.dir, 'index.html'), 'index')
+        write_file(os.path.join(self.dir, 'master', 'install.html'), 'install')
+        os.symlink('master', os.path.join(self.dir, 'current'))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_build_manifest(self):
+        manifest = build_manifest(self.dir)
+
+        self.assertEqual(sorted(manifest['files']), ['current', 'index.html',
+                                                     'master/install.html'])
+        self.assertEqual(manifest['files']['current'], 'link:master')
+        self.assertNotIn('current', manifest['signatures'])
+
+    def test_write_manifest_reuses_digests(self):
+        write_manifest(self.dir)
+        self.assertEqual(local_manifest_fn(self.dir), self.dir + '.manifest.json')
+        self.assertTrue(os.path.isfile(local_manifest_fn(self.dir)))
+
+        previous = build_manifest(self.dir)
+        previous['files']['index.html'] = 'cached'
+        self.assertEqual(build_manifest(self.dir, previous)['files']['index.html'], 'cached')
+        self.assertNotIn(manifest_name, write_manifest(self.dir)['files'])
+
+    def test_manifest_not_in_output(self):
+        # the manifest of earlier builds.
+        write_file(os.path.join(self.dir, manifest_name), '{}')
+
+        write_manifest(self.dir)
+        self.assertEqual(sorted(os.listdir(self.dir)), ['current', 'index.html', 'master'])
+
+    def test_subset_manifest(self):
+        subset = subset_manifest(build_manifest(self.dir), 'master')
+        self.assertEqual(list(subset['files']), ['install.html'])
+
+    def test_diff_manifests(self):
+        previous = build_manifest(self.dir)
+
+        write_file(os.path.join(self.dir, 'index.html'), 'new index')
+        write_file(os.path.join(self.dir, 'master', 'new.html'), 'new')
+        os.remove(os.path.join(self.dir, 'master', 'install.html'))
+
+        self.assertEqual(diff_manifests(previous, build_manifest(self.dir)),
+                         (['index.html', 'master/new.html'], ['master/install.html']))
+        self.assertEqual(diff_manifests({}, previous)[0], sorted(previous['files']))
@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+
+from giza.content.sphinx import (get_in_process_workers, run_sphinx_in_process,
+                                 in_process_builder_app)
+from giza.libgiza.app import BuildApp
+from giza.libgiza.pool import get_process_pool
+from giza.libgiza.task import Task
+
+
+class Settings(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+    def __contains__(self, key):
+        return key in self.__dict__
+
+
+def get_conf(root, pool_size=4):
+    return Settings(paths=Settings(projectroot=root,
+                                   branch_source='build/master/source',
+                                   branch_output='build/master'),
+                    project=Settings(name='test', edition=None),
+                    git=Settings(branches=Settings(current='master')),
+                    runstate=Settings(pool_size=pool_size, builder=['html']))
+
+
+def get_sconf(root):
+    return Settings(builder='html',
+                    build_output='html',
+                    fq_build_output=os.path.join(root, 'build', 'master', 'html'),
+                    language=None,
+                    edition=None)
+
+
+def build_html(root):
+    return run_sphinx_in_process('html', get_sconf(root), get_conf(root))
+
+
+class TestInProcessWorkers(TestCase):
+    def test_parallel_in_main_process(self):
+        self.assertEqual(get_in_process_workers(get_sconf('/srv'), get_conf('/srv')), 4)
+
+    def test_serial_in_pool_worker(self):
+        pool = get_process_pool(2)
+        self.assertEqual(pool.apply(get_in_process_workers,
+                                    (get_sconf('/srv'), get_conf('/srv', pool_size=1))), 0)
+
+    def test_parallel_in_pool_worker_uses_subprocess(self):
+        pool = get_process_pool(2)
+        self.assertIsNone(pool.apply(get_in_process_workers,
+                                     (get_sconf('/srv'), get_conf('/srv'))))
+
+    def test_builder_app_runs_parallel_builds_in_process(self):
+        # the default configuration: a process pool and parallel builds.
+        app = BuildApp.new(pool_type='process', pool_size=2)
+        builder_app = in_process_builder_app(app)
+        builder_app.add(Task(job=get_in_process_workers,
+                             args=(get_sconf('/srv'), get_conf('/srv')),
+                             target=True))
+
+        self.assertEqual(app.run(), [4])
+
+
+class TestRunSphinxInProcess(TestCase):
+    # the source directory doesn't exist, so all builds fail.
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_reports_build_errors(self):
+        return_code, lines = run_sphinx_in_process('html', get_sconf(self.root),
+                                                   get_conf(self.root))
+
+        self.assertEqual(return_code, 1)
+        self.assertTrue(any('sphinx build raised' in line for line in lines))
+        self.assertTrue(os.path.isdir(get_sconf(self.root).fq_build_output))
+
+    def test_pool_worker_runs_parallel_build_in_subprocess(self):
+        return_code, lines = get_process_pool(2).apply(build_html, (self.root,))
+
+        self.assertNotEqual(return_code, 0)
+        self.assertFalse(any('sphinx build raised' in line for line in lines))
+
+    def test_builder_app_builds_in_process(self):
+        app = BuildApp.new(pool_type='process', pool_size=2)
+        builder_app = in_process_builder_app(app)
+        builder_app.add(Task(job=build_html, args=(self.root,), target=True))
+
+        [(return_code, lines)] = app.run()
+        self.assertEqual(return_code, 1)
+        self.assertTrue(any('sphinx build raised' in line for line in lines))
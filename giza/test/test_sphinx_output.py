@@ -0,0 +1,50 @@
+from unittest import TestCase
+
+from giza.content.sphinx import SphinxOutputFilter
+
+
+class Paths(object):
+    projectroot = '/srv/docs'
+    branch_output = 'build/master'
+
+
+class Conf(object):
+    paths = Paths()
+
+
+class TestSphinxOutputFilter(TestCase):
+    def setUp(self):
+        self.output = SphinxOutputFilter(Conf())
+
+    def test_normalizes_paths(self):
+        line = self.output.process('/srv/docs/build/master/source/index.txt:4: WARNING: bad\n')
+
+        self.assertEqual(line, 'source/index.txt:4: WARNING: bad')
+        self.assertEqual(self.output.warnings, 1)
+
+    def test_removes_duplicates(self):
+        self.output.extend(['build/master/source/a.txt:1: ERROR: one',
+                            'source/a.txt:1: ERROR: one',
+                            'source/b.txt:1: ERROR: two'])
+
+        self.assertEqual(self.output.lines, ['source/a.txt:1: ERROR: one',
+                                             'source/b.txt:1: ERROR: two'])
+        self.assertEqual(self.output.count, 3)
+        self.assertEqual(self.output.errors, 2)
+
+    def test_removes_unworthy_messages(self):
+        self.assertIsNone(self.output.process(''))
+        self.assertIsNone(self.output.process('WARNING: search index couldn\'t be loaded'))
+        self.assertIsNone(self.output.process('source/a.txt:4: WARNING: duplicate object '
+                                              'description of "x", other instance in '
+                                              'build/master/source/a.txt'))
+        self.assertEqual(self.output.lines, [])
+
+    def test_input_error_joins_previous_message(self):
+        self.output.process('source/a.txt:1: SEVERE: Problems with "include" directive path:')
+        self.output.process("InputError: [Errno 2] No such file or directory: "
+                            "'build/master/source/includes/missing.rst'.")
+
+        self.assertEqual(self.output.lines,
+                         ['source/a.txt:1: SEVERE: Problems with "include" directive path: '
+                          'source/includes/missing.rst'])
@@ -0,0 +1,160 @@
+import os
+import shutil
+import tempfile
+import time
+
+from unittest import TestCase
+
+from giza.tools.sync import sync_tree, sync_paths, is_excluded
+
+
+def write_file(fn, content):
+    dirname = os.path.dirname(fn)
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+
+    with open(fn, 'w') as f:
+        f.write(content)
+
+
+def read_file(fn):
+    with open(fn, 'r') as f:
+        return f.read()
+
+
+class TestSyncTree(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.dir, 'source')
+        self.target = os.path.join(self.dir, 'build', 'source')
+        self.manifest = self.target + '.sync.json'
+        self.exclusions = ['includes/generated', 'images/*.png']
+
+        write_file(os.path.join(self.source, 'index.txt'), 'index')
+        write_file(os.path.join(self.source, 'tutorial', 'install.txt'), 'install')
+        write_file(os.path.join(self.source, 'includes', 'generated', 'toc.rst'), 'toc')
+        write_file(os.path.join(self.source, 'images', 'diagram.png'), 'png')
+        write_file(os.path.join(self.source, 'images', 'diagram.svg'), 'svg')
+        write_file(os.path.join(self.source, 'internal', 'secret.txt'), 'secret')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def sync(self):
+        return sync_tree(self.source, self.target,
+                         exclusions=self.exclusions,
+                         redactions=['/internal'],
+                         manifest=self.manifest)
+
+    def target_path(self, *args):
+        return os.path.join(self.target, *args)
+
+    def test_is_excluded(self):
+        self.assertTrue(is_excluded('includes/generated', ['includes/generated']))
+        self.assertTrue(is_excluded('a/includes/generated', ['includes/generated']))
+        self.assertTrue(is_excluded('images/diagram.png', ['images/*.png']))
+        self.assertTrue(is_excluded('foo.swp', ['*.swp']))
+        self.assertFalse(is_excluded('a/images', ['/images']))
+        self.assertFalse(is_excluded('images/diagram.svg', ['images/*.png']))
+
+    def test_initial_sync(self):
+        stats = self.sync()
+
+        self.assertEqual(stats['copied'], 3)
+        self.assertEqual(read_file(self.target_path('tutorial', 'install.txt')), 'install')
+        self.assertTrue(os.path.isfile(self.target_path('images', 'diagram.svg')))
+        self.assertFalse(os.path.exists(self.target_path('images', 'diagram.png')))
+        self.assertFalse(os.path.exists(self.target_path('includes', 'generated')))
+        self.assertFalse(os.path.exists(self.target_path('internal')))
+        self.assertTrue(os.path.isfile(self.manifest))
+
+    def test_unchanged_files_not_copied(self):
+        self.sync()
+        mtime = os.stat(self.target_path('index.txt')).st_mtime
+
+        # touching the source does not change the content.
+        future = time.time() + 10
+        os.utime(os.path.join(self.source, 'index.txt'), (future, future))
+
+        stats = self.sync()
+        self.assertEqual(stats['copied'], 0)
+        self.assertEqual(stats['unchanged'], 3)
+        self.assertEqual(os.stat(self.target_path('index.txt')).st_mtime, mtime)
+
+    def test_changed_files_copied(self):
+        self.sync()
+        write_file(os.path.join(self.source, 'index.txt'), 'new index')
+
+        stats = self.sync()
+        self.assertEqual(stats['copied'], 1)
+        self.assertEqual(read_file(self.target_path('index.txt')), 'new index')
+
+    def test_modified_target_restored(self):
+        self.sync()
+        write_file(self.target_path('index.txt'), 'local change')
+
+        self.assertEqual(self.sync()['copied'], 1)
+        self.assertEqual(read_file(self.target_path('index.txt')), 'index')
+
+    def test_deletes_stale_files_but_not_excluded(self):
+        self.sync()
+        write_file(self.target_path('includes', 'generated', 'steps.rst'), 'generated')
+        write_file(self.target_path('internal', 'secret.txt'), 'secret')
+        os.remove(os.path.join(self.source, 'tutorial', 'install.txt'))
+
+        stats = self.sync()
+        self.assertEqual(stats['removed'], 2)
+        self.assertFalse(os.path.exists(self.target_path('tutorial', 'install.txt')))
+        self.assertFalse(os.path.exists(self.target_path('internal')))
+        self.assertTrue(os.path.isfile(self.target_path('includes', 'generated', 'steps.rst')))
+
+    def test_symlinks_preserved(self):
+        os.symlink('index.txt', os.path.join(self.source, 'contents.txt'))
+        self.sync()
+
+        self.assertTrue(os.path.islink(self.target_path('contents.txt')))
+        self.assertEqual(os.readlink(self.target_path('contents.txt')), 'index.txt')
+
+    def test_hardlinks(self):
+        sync_tree(self.source, self.target, hardlink=True)
+
+        self.assertEqual(os.stat(self.target_path('index.txt')).st_ino,
+                         os.stat(os.path.join(self.source, 'index.txt')).st_ino)
+
+    def test_protected_paths(self):
+        self.sync()
+        write_file(self.target_path('tutorial', 'install.json'), 'processed')
+        write_file(os.path.join(self.source, 'tutorial', 'install.json'), 'stale')
+
+        sync_tree(self.source, self.target, protected=set(['tutorial/install.json']))
+        self.assertEqual(read_file(self.target_path('tutorial', 'install.json')), 'processed')
+
+
+class TestSyncPaths(TestCase):
+    setUp = TestSyncTree.setUp
+    tearDown = TestSyncTree.tearDown
+    sync = TestSyncTree.sync
+    target_path = TestSyncTree.target_path
+
+    def test_sync_changed_paths(self):
+        self.sync()
+        write_file(os.path.join(self.source, 'index.txt'), 'new index')
+        write_file(os.path.join(self.source, 'images', 'new.png'), 'png')
+        os.remove(os.path.join(self.source, 'tutorial', 'install.txt'))
+
+        stats = sync_paths(self.source, self.target,
+                           ['/index.txt', '/images/new.png', '/tutorial/install.txt',
+                            '/internal/secret.txt'],
+                           exclusions=self.exclusions, redactions=['/internal'])
+
+        self.assertEqual(stats, {'copied': 1, 'unchanged': 0, 'removed': 1})
+        self.assertEqual(read_file(self.target_path('index.txt')), 'new index')
+        self.assertFalse(os.path.exists(self.target_path('images', 'new.png')))
+        self.assertFalse(os.path.exists(self.target_path('tutorial', 'install.txt')))
+
+    def test_excluded_directories(self):
+        write_file(os.path.join(self.source, 'includes', 'generated', 'new.rst'), 'new')
+
+        stats = sync_paths(self.source, self.target, ['includes/generated/new.rst'],
+                           exclusions=self.exclusions)
+        self.assertEqual(stats['copied'], 0)
@@ -0,0 +1,92 @@
+import os
+import re
+import shutil
+import tempfile
+
+from unittest import TestCase
+
+from giza.content.extract.views import get_include_statement
+from giza.tools.transformation import append_to_file, prepend_to_file, CombinedSubstitution
+
+
+def write_file(fn, content):
+    with open(fn, 'w') as f:
+        f.write(content)
+
+
+def read_file(fn):
+    with open(fn, 'r') as f:
+        return f.read()
+
+
+class TestIncludeStatements(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.fn = os.path.join(self.dir, 'install.txt')
+        self.include = get_include_statement('/includes/extracts/install.rst')
+
+        write_file(self.fn, 'Install\n=======\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_append(self):
+        append_to_file(self.fn, self.include)
+        self.assertEqual(read_file(self.fn), 'Install\n=======\n\n' + self.include)
+
+    def test_append_twice(self):
+        append_to_file(self.fn, self.include)
+        append_to_file(self.fn, self.include)
+
+        self.assertEqual(read_file(self.fn).count('.. include::'), 1)
+
+    def test_prepend(self):
+        prepend_to_file(self.fn, self.include)
+        self.assertEqual(read_file(self.fn), self.include + 'Install\n=======\n')
+
+    def test_prepend_twice(self):
+        prepend_to_file(self.fn, self.include)
+        prepend_to_file(self.fn, self.include)
+
+        self.assertEqual(read_file(self.fn).count('.. include::'), 1)
+
+    def test_prepend_and_append(self):
+        for _ in range(2):
+            prepend_to_file(self.fn, self.include)
+            append_to_file(self.fn, self.include)
+
+        self.assertEqual(read_file(self.fn).count('.. include::'), 2)
+
+
+class TestCombinedSubstitution(TestCase):
+    def test_single_pass(self):
+        subst = CombinedSubstitution([(re.compile(r'<[^>]*>'), ''),
+                                      ('&#8220;', '"')])
+
+        self.assertIsNotNone(subst.regex)
+        self.assertEqual(subst.sub('<p>&#8220;text</p>'), '"text')
+
+    def test_earliest_pattern_wins(self):
+        subst = CombinedSubstitution([('ab', '1'), ('a', '2')])
+        self.assertEqual(subst.sub('aba'), '12')
+
+    def test_shared_flags(self):
+        subst = CombinedSubstitution([(re.compile('^one', re.MULTILINE), '1'),
+                                      (re.compile('^two', re.MULTILINE), '2')])
+
+        self.assertIsNotNone(subst.regex)
+        self.assertEqual(subst.sub('one\ntwo\n'), '1\n2\n')
+
+    def test_different_flags(self):
+        regexes = [(re.compile('title', re.IGNORECASE), 'heading'),
+                   (re.compile('^text', re.MULTILINE), 'body')]
+        subst = CombinedSubstitution(regexes)
+
+        content = 'Title\ntext\n'
+        expected = content
+        for regex, replacement in regexes:
+            expected = regex.sub(replacement, expected)
+
+        self.assertIsNone(subst.regex)
+        self.assertEqual(subst.sub(content), expected)
+        self.assertEqual(subst.sub(content), 'heading\nbody\n')
@@ -14,6 +14,8 @@
 
 import datetime
 
+from pymongo import ReturnDocument, UpdateOne
+
 from flask_app import app, db
 
 def get_sentences_in_file(fp, source_language, target_language, curr_db=db):
@@ -56,7 +58,7 @@ def get_fileIDs(source_language, target_language, curr_db=db):
     '''
     return curr_db['files'].find({'source_language': source_language,
                                   'target_language': target_language},
-                                 {'_id': 1}).sort('priority', 1)
+                                 {'_id': 1, 'file_path': 1, 'edition': 1}).sort('priority', 1)
 
 def get_file_paths(curr_db=db):
     '''This function  gets all of the file ids for a given pair of languages
@@ -68,24 +70,76 @@ def get_file_paths(curr_db=db):
     return curr_db['files'].distinct('file_path')
 
 
+def create_indexes(curr_db=db):
+    '''This function creates the indexes that the file browser, the editor and
+    the po import and export queries use. Creating an index that already
+    exists does nothing, so this is safe to call at every startup.
+    :param database db: database
+    '''
+    curr_db['files'].create_index([('source_language', 1),
+                                   ('target_language', 1),
+                                   ('priority', 1)])
+    curr_db['files'].create_index([('source_language', 1),
+                                   ('target_language', 1),
+                                   ('file_path', 1)])
+    curr_db['translations'].create_index([('fileID', 1),
+                                          ('file_edition', 1),
+                                          ('status', 1)])
+    curr_db['translations'].create_index([('fileID', 1),
+                                          ('file_edition', 1),
+                                          ('sentence_num', 1)])
+    curr_db['translations'].create_index([('source_language', 1),
+                                          ('target_language', 1),
+                                          ('sentenceID', 1),
+                                          ('file_edition', -1)])
+
+
+def get_file_stats(files, curr_db=db):
+    '''This function counts the sentences, and the reviewed and approved
+    sentences, in the current edition of each file, with a single aggregation.
+    :param list files: list of file records, with _id and edition fields
+    :param database db: database
+    :returns: dictionary of file ids to dictionaries of num_sentences,
+    num_reviewed and num_approved
+    '''
+    if len(files) == 0:
+        return {}
+
+    is_status = lambda status: {'$eq': ['$status', status]}
+    pipeline = [{'$match': {'$or': [{'fileID': f[u'_id'], 'file_edition': f[u'edition']}
+                                    for f in files]}},
+                {'$group': {'_id': '$fileID',
+                            'num_sentences': {'$sum': 1},
+                            'num_reviewed': {'$sum': {'$cond': [{'$or': [is_status('reviewed'),
+                                                                         is_status('approved')]},
+                                                                1, 0]}},
+                            'num_approved': {'$sum': {'$cond': [is_status('approved'), 1, 0]}}}}]
+
+    result = curr_db['translations'].aggregate(pipeline)
+    return dict((r[u'_id'], r) for r in result)
+
+
 def get_files_for_page(page_number, num_files_per_page, fileIDs, curr_db=db):
     '''This function gets all of the stats for a list of files
     :param int page_number: current page number
     :param int num_files_per_page: number of files per page
-    :param list fileIDS: list of file ids
+    :param list fileIDS: cursor of file records, with _id, file_path and edition fields
     :param database db: database
     :returns: cursor of file names
     '''
     page_fileIDs = fileIDs.skip(((page_number-1)*num_files_per_page) if page_number > 0 else 0).limit(num_files_per_page)
+    page_files = list(page_fileIDs)
+    stats = get_file_stats(page_files, curr_db=curr_db)
+
     l = []
-    for f in page_fileIDs:
-        f = File(oid=f[u'_id'])
-        if f.num_sentences == 0:
+    for f in page_files:
+        if f[u'_id'] not in stats:
+            # files without sentences
             continue
-        data = {'file_path': f.file_path,
-                'num_sentences': f.num_sentences,
-                'num_reviewed': f.num_reviewed(),
-                'num_approved': f.num_approved()}
+        data = {'file_path': f[u'file_path'],
+                'num_sentences': stats[f[u'_id']][u'num_sentences'],
+                'num_reviewed': stats[f[u'_id']][u'num_reviewed'],
+                'num_approved': stats[f[u'_id']][u'num_approved']}
         if data['num_sentences'] != data['num_approved']:
             l.append(data)
 
@@ -115,6 +169,32 @@ def audit(action, last_editor, current_user, doc, new_target_sentence=None, curr
                                   'original_document': doc,
                                   'timestamp': datetime.datetime.utcnow() })
 
+def grab_file_lock(fileID, userID, curr_db=db):
+    '''This function atomically takes or extends the lock on a file if the lock
+    has expired or the user already holds it.
+    :param ObjectId fileID: _id of the file to lock
+    :param string userID: _id of the user who is trying to grab the lock
+    :returns: The file's lock fields if the user now holds the lock, or None
+    '''
+    now = datetime.datetime.utcnow()
+    lock_exp = now + datetime.timedelta(minutes=app.config['SESSION_LENGTH'])
+    return curr_db['files'].find_one_and_update({'_id': fileID,
+                                                 '$or': [{'lock_exp': {'$lt': now}},
+                                                         {'lock_id': userID}]},
+                                                {'$set': {'lock_exp': lock_exp,
+                                                          'lock_id': userID}},
+                                                projection={'lock_exp': 1, 'lock_id': 1},
+                                                return_document=ReturnDocument.AFTER)
+
+def increment_user_counters(counters, curr_db=db):
+    '''This function atomically increments the counters of one or more users
+    in a single round trip.
+    :param list counters: tuples of the user's _id, the counter's name and the amount
+    '''
+    curr_db['users'].bulk_write([UpdateOne({'_id': userID}, {'$inc': {counter: amount}})
+                                 for userID, counter, amount in counters],
+                                ordered=False)
+
 def find_file(source_language, target_language, file_path, curr_db=db):
     '''This function finds the record of a file by it's languages and file_path,
     which should ideally be unique. If these aren't unique this could create
@@ -217,20 +297,14 @@ class File(object):
         :param string userID: _id of the user who is trying to grab the lock
         :returns: True or False if you grabbed the lock or not
         '''
-        now = datetime.datetime.utcnow()
-        time_diff =datetime.timedelta(minutes=app.config['SESSION_LENGTH'])
-        if self.state[u'lock_exp'] < now:
-            self.state[u'lock_exp'] = now + time_diff
-            self.state[u'lock_id'] = userID
-            self.save()
-            return True
-        elif self.state[u'lock_id'] == userID:
-            self.state[u'lock_exp'] = now + time_diff
-            self.save()
-            return True
-        else:
+        record = grab_file_lock(self._id, userID, curr_db=self.db)
+        if record is None:
             return False
 
+        self.state[u'lock_exp'] = record[u'lock_exp']
+        self.state[u'lock_id'] = record[u'lock_id']
+        return True
+
     def num_approved(self):
             return self.db['translations'].find({'fileID': self._id, 'file_edition': self.edition, 'status': 'approved'}).count()
 
@@ -239,7 +313,8 @@ class File(object):
 
     def get_num_sentences(self):
         self.state[u'num_sentences'] = self.db['translations'].find({'fileID': self._id, 'file_edition': self.edition}).count()
-        self.save()
+        self.db['files'].update_one({'_id': self._id},
+                                    {'$set': {'num_sentences': self.num_sentences}})
         return self.num_sentences
 
     @property
@@ -296,8 +371,49 @@ class Sentence(object):
                 self.state[k] = v
 
     def check_lock(self, userID):
-        f = File(oid=self.fileID, curr_db=self.db)
-        return f.grab_lock(userID)
+        return grab_file_lock(self.fileID, userID, curr_db=self.db) is not None
+
+    def lock_file(self, user, action):
+        '''This function grabs the lock on the sentence's file for the user
+        or raises a LockError if someone else holds it.
+        :param User user: the user who is trying to change the sentence
+        :param string action: edit, approve, or unapprove
+        '''
+        if self.check_lock(user._id) is False:
+            app.logger.error("can't {0} without lock".format(action))
+            f = self.db['files'].find_one({'_id': self.fileID}, {'file_path': 1})
+            raise LockError("Someone else is already editing this file", f[u'file_path'], user.username, self.target_language)
+
+    def update(self, query, update):
+        '''This function atomically applies an update to the sentence, as long
+        as no one else changed it since it was loaded and it matches the query.
+        Every update increments the update number.
+        :param dict query: additional conditions the sentence must match
+        :param dict update: the update to apply to the sentence
+        :returns: the sentence's original document
+        '''
+        query = dict(query)
+        query[u'_id'] = self.state[u'_id']
+        query[u'update_number'] = self.update_number
+        update.setdefault('$inc', {})[u'update_number'] = 1
+
+        doc = self.db['translations'].find_one_and_update(query, update,
+                                                          return_document=ReturnDocument.BEFORE)
+        if doc is None:
+            err = "Sentence was changed by someone else"
+            app.logger.error(err)
+            raise MyError(err, 409)
+
+        for k, v in update.get('$set', {}).items():
+            self.state[k] = v
+        for k, v in update['$inc'].items():
+            self.state[k] += v
+        for k, v in update.get('$push', {}).items():
+            self.state[k].append(v)
+        for k, v in update.get('$pull', {}).items():
+            self.state[k].remove(v)
+
+        return doc
 
     def edit(self, new_editor, new_target_sentence):
         '''This function edits the current sentence.
@@ -312,27 +428,20 @@ class Sentence(object):
             err = "No change made"
             app.logger.error(err)
             raise MyError(err, 403)
-        if self.status is 'approved':
+        if self.status == 'approved':
             err = "Can't edit approved sentence"
             app.logger.error(err)
             raise MyError(err, 403)
 
-        f = File(oid=self.fileID, curr_db=self.db)
-        if f.grab_lock(new_editor._id) is False:
-            app.logger.error("can't edit without lock")
-            raise LockError("Someone else is already editing this file", f.file_path, new_editor.username, self.target_language)
-
-        audit("edit", self.userID, new_editor._id, self.state, new_target_sentence)
-        self.increment_update_number()
-        self.userID = new_editor._id
-        self.target_sentence = new_target_sentence
-        self.status = 'reviewed'
-        self.state['approvers'] = []
+        self.lock_file(new_editor, "edit")
 
+        doc = self.update({'status': {'$ne': 'approved'}},
+                          {'$set': {u'userID': new_editor._id,
+                                    u'target_sentence': new_target_sentence,
+                                    u'status': u'reviewed',
+                                    u'approvers': []}})
+        audit("edit", doc[u'userID'], new_editor._id, doc, new_target_sentence, curr_db=self.db)
         new_editor.increment_num_reviewed()
-        self.save()
-        new_editor.save()
-
 
     def approve(self, approver):
         '''This function approves the current sentence.
@@ -352,23 +461,22 @@ class Sentence(object):
             app.logger.error(err)
             raise MyError(err, 403)
 
-        f = File(oid=self.fileID, curr_db=self.db)
-        if f.grab_lock(approver._id) is False:
-            app.logger.error("can't approve without lock")
-            raise LockError("Someone else is already editing this file", f.file_path, approver.username, self.target_language)
-
-        prev_editor = User(oid=self.userID, curr_db=self.db)
-        audit("approve", prev_editor._id, approver._id, self.state)
-        self.increment_update_number()
-        self.status = 'reviewed'
-        approver.increment_user_approved()
-        self.add_approver(approver._id)
-        prev_editor.increment_got_approved()
-        if approver.trust_level is 'full':
-            self.status = 'approved'
-        prev_editor.save()
-        approver.save()
-        self.save()
+        self.lock_file(approver, "approve")
+
+        status = u'reviewed'
+        if (approver.trust_level == 'full' or
+                self.num_approves() + 1 >= app.config['APPROVAL_THRESHOLD']):
+            status = u'approved'
+
+        doc = self.update({'userID': {'$ne': approver._id},
+                           'approvers': {'$ne': approver._id}},
+                          {'$set': {u'status': status},
+                           '$push': {u'approvers': approver._id}})
+        audit("approve", doc[u'userID'], approver._id, doc, curr_db=self.db)
+        increment_user_counters([(approver._id, u'num_user_approved', 1),
+                                 (doc[u'userID'], u'num_got_approved', 1)],
+                                curr_db=self.db)
+        approver.state[u'num_user_approved'] += 1
 
     def unapprove(self, unapprover):
         '''This function unapproves the current sentence.
@@ -380,20 +488,18 @@ class Sentence(object):
             app.logger.error(err)
             raise MyError(err, 403)
 
-        f = File(oid=self.fileID, curr_db=self.db)
-        if f.grab_lock(unapprover._id) is False:
-            app.logger.error("can't unapprove without lock")
-            raise LockError("Someone else is already editing this file", f.file_path, unapprover.username, self.target_language)
-
-        prev_editor = User(oid=self.userID, curr_db=self.db)
-        audit("unapprove", prev_editor._id, unapprover._id, self.state)
-        self.increment_update_number()
-        self.remove_approver(unapprover._id)
-        unapprover.decrement_user_approved()
-        prev_editor.decrement_got_approved()
-        prev_editor.save()
-        unapprover.save()
-        self.save()
+        self.lock_file(unapprover, "unapprove")
+
+        update = {'$pull': {u'approvers': unapprover._id}}
+        if self.num_approves() - 1 < app.config['APPROVAL_THRESHOLD']:
+            update['$set'] = {u'status': u'reviewed'}
+
+        doc = self.update({'approvers': unapprover._id}, update)
+        audit("unapprove", doc[u'userID'], unapprover._id, doc, curr_db=self.db)
+        increment_user_counters([(unapprover._id, u'num_user_approved', -1),
+                                 (doc[u'userID'], u'num_got_approved', -1)],
+                                curr_db=self.db)
+        unapprover.state[u'num_user_approved'] -= 1
 
     def save(self):
         self.state[u'_id'] = self.db['translations'].save(self.state)
@@ -543,6 +649,18 @@ class User(object):
         app.logger.info(self.state)
         self.state[u'_id'] = self.db['users'].save(self.state)
 
+    def increment(self, counter, amount):
+        '''This method atomically adds amount to one of the user's counters
+        and refreshes the counter from the result.
+        :param string counter: the name of the counter
+        :param int amount: the amount to add, which may be negative
+        '''
+        record = self.db['users'].find_one_and_update({'_id': self._id},
+                                                      {'$inc': {counter: amount}},
+                                                      projection={counter: 1},
+                                                      return_document=ReturnDocument.AFTER)
+        self.state[counter] = record[counter]
+
     @property
     def _id(self):
         return self.state[u'_id']
@@ -560,30 +678,30 @@ class User(object):
         return self.state[u'num_reviewed']
 
     def increment_num_reviewed(self):
-        self.state[u'num_reviewed'] += 1
+        self.increment(u'num_reviewed', 1)
 
     def decrement_num_reviewed(self):
-        self.state[u'num_reviewed'] -= 1
+        self.increment(u'num_reviewed', -1)
 
     @property
     def num_user_approved(self):
         return self.state[u'num_user_approved']
 
     def increment_user_approved(self):
-        self.state[u'num_user_approved'] += 1
+        self.increment(u'num_user_approved', 1)
 
     def decrement_user_approved(self):
-        self.state[u'num_user_approved'] -= 1
+        self.increment(u'num_user_approved', -1)
 
     @property
     def num_got_approved(self):
         return self.state[u'num_got_approved']
 
     def increment_got_approved(self):
-        self.state[u'num_got_approved'] += 1
+        self.increment(u'num_got_approved', 1)
 
     def decrement_got_approved(self):
-        self.state[u'num_got_approved'] -= 1
+        self.increment(u'num_got_approved', -1)
 
     @property
     def trust_level(self):
@@ -18,11 +18,11 @@ from math import ceil
 import zlib
 
 from bson import json_util
-from flask import  request, redirect, render_template, make_response
+from flask import  request, redirect, render_template, make_response, Response, stream_with_context
 
 from flask_app import app, db
 import models
-from pharaoh.mongo_to_po import generate_fresh_po_text, generate_all_po_files
+from pharaoh.mongo_to_po import generate_fresh_po_text, stream_all_po_files
 from pharaoh.po_to_mongo import put_po_data_in_mongo
 
 @app.route('/')
@@ -158,16 +158,29 @@ def download_single_po_approved(language, file):
     response.headers["Content-Disposition"] = "attachment; filename={0}.po".format(file)
     return response
 
+def stream_po_archive(language, is_all):
+    ''' This function streams a tar of the po files for a language as each
+    file is generated, gzipped unless the gzip query argument is false
+    '''
+    compress = request.args.get('gzip', 'true').lower() not in ('0', 'false', 'no')
+    po = stream_all_po_files('en', language, db, is_all, compress)
+    if compress is True:
+        filename = "{0}.tar.gz".format(language)
+        mimetype = "application/gzip"
+    else:
+        filename = "{0}.tar".format(language)
+        mimetype = "application/x-tar"
+    response = Response(stream_with_context(po), mimetype=mimetype)
+    response.headers["Content-Disposition"] = "attachment; filename={0}".format(filename)
+    return response
+
 @app.route('/download-all/<language>/')
 @app.route('/download-all/<language>')
 def download_all_po(language):
     ''' This function downloads all translations from all
     po files
     '''
-    po = generate_all_po_files( 'en', language, db, True)
-    response = make_response(po)
-    response.headers["Content-Disposition"] = "attachment; filename={0}.tar.gz".format(language)
-    return response
+    return stream_po_archive(language, True)
 
 @app.route('/download-approved/<language>/')
 @app.route('/download-approved/<language>')
@@ -175,10 +188,7 @@ def download_all_po_approved(language):
     ''' This function downloads all approved translations from all
     po files
     '''
-    po = generate_all_po_files( 'en', language, db, False)
-    response = make_response(po)
-    response.headers["Content-Disposition"] = "attachment; filename={0}.tar.gz".format(language)
-    return response
+    return stream_po_archive(language, False)
 
 @app.route('/admin', methods=['GET'])
 def admin():
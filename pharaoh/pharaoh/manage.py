@@ -18,6 +18,7 @@ from app import flask_app
 app = flask_app.app
 from app import views
 from app import filters
+from app import models
 
 from pharaoh.gunicorn_application import StandaloneApplication
 
@@ -26,6 +27,7 @@ PHARAOH_PATH = os.path.abspath(os.path.join('..', os.path.dirname(__file__)))
 def runserver(conf, server_host, server_port):
     app.debug = app.config['DEBUG']
     app.logger.setLevel(conf.runstate.level)
+    models.create_indexes()
     options = {
         'bind': '%s:%s' % (server_host, 5000),
         'workers': app.config['WORKERS'],
@@ -18,8 +18,10 @@ reload(sys)
 sys.setdefaultencoding("utf-8")
 import logging
 import datetime
-import cStringIO
+import multiprocessing
 import tarfile
+import time
+import zlib
 
 import polib
 from pymongo import MongoClient
@@ -35,6 +37,38 @@ to have a backup in case it messes up.
 logger = logging.getLogger('pharaoh.mongo_to_po')
 
 
+# number of sentenceIDs in each query
+query_batch_size = 1000
+
+# the database connection of each worker process
+worker_db = None
+
+
+def find_translations(sentenceIDs, source_language, target_language, db, is_all):
+    ''' finds the translations of many sentences, with one query for each batch of sentenceIDs
+    :param list sentenceIDs: the sentenceIDs of the sentences
+    :param string source_language: language to translate from
+    :param string target_language: language to translate to
+    :param database db: mongodb database
+    :param boolean is_all: whether or not you want all or just approved translations
+    :returns: dictionary of sentenceIDs to lists of translations
+    '''
+    translations = dict((sentenceID, []) for sentenceID in sentenceIDs)
+    sentenceIDs = list(translations)
+
+    for idx in range(0, len(sentenceIDs), query_batch_size):
+        query = {"sentenceID": {"$in": sentenceIDs[idx:idx + query_batch_size]},
+                 "source_language": source_language,
+                 "target_language": target_language}
+        if is_all is False:
+            query["status"] = "approved"
+
+        for t in db['translations'].find(query, {'_id': 0, 'sentenceID': 1, 'target_sentence': 1}):
+            translations[t['sentenceID']].append(t['target_sentence'])
+
+    return translations
+
+
 def write_po_file(po_fn, source_language, target_language, db, is_all):
     ''' writes approved or all trnalstions to file
     :param string po_fn: the path to the current po file to write
@@ -46,26 +80,39 @@ def write_po_file(po_fn, source_language, target_language, db, is_all):
 
     logger.info("writing " + po_fn)
     po = polib.pofile(po_fn)
-    for entry in po.untranslated_entries():
-        if is_all is False:
-            t = db['translations'].find({"status": "approved", "sentenceID": entry.tcomment, "source_language": source_language, "target_language": target_language})
-        else:
-            t = db['translations'].find({"sentenceID": entry.tcomment, "source_language": source_language, "target_language": target_language})
+    entries = po.untranslated_entries()
+    translations = find_translations([entry.tcomment for entry in entries],
+                                     source_language, target_language, db, is_all)
+
+    for entry in entries:
+        t = translations[entry.tcomment]
 
-        if t.count() > 1:
+        if len(t) > 1:
             logger.info("multiple approved translations with sentenceID: " + entry.tcomment)
             continue
-        if t.count() == 1:
-            entry.msgstr = unicode(t[0]['target_sentence'].strip())
+        if len(t) == 1:
+            entry.msgstr = unicode(t[0].strip())
         else:
-            logger.info("multiple approved translations with sentenceID: " + entry.tcomment)
+            logger.info("no approved translations with sentenceID: " + entry.tcomment)
 
 
     po.save(po_fn)
 
 
-def write_mongo_to_po_files(path, source_language, target_language, db_host, db_port, db_name, is_all):
-    ''' goes through directory tree and writes po files to mongo
+def connect_worker(db_host, db_port, db_name):
+    ''' connects each worker process to the database '''
+    global worker_db
+    worker_db = MongoClient(db_host, db_port)[db_name]
+
+
+def write_po_file_worker(args):
+    po_fn, source_language, target_language, is_all = args
+    write_po_file(po_fn, source_language, target_language, worker_db, is_all)
+
+
+def write_mongo_to_po_files(path, source_language, target_language, db_host, db_port, db_name, is_all, pool_size=None):
+    ''' goes through directory tree and writes po files to mongo, writing
+    several po files at once in worker processes
     :param string path: the path to the top level directory of the po_files
     :param string source_language: language to translate from 
     :param string target_language: language to translate to 
@@ -73,19 +120,31 @@ def write_mongo_to_po_files(path, source_language, target_language, db_host, db_
     :param int db_port: the port of the database
     :param string db_name: the name of the database
     :param boolean is_all: whether or not you want all or just approved translations
+    :param int pool_size: the number of worker processes
     '''
 
     if not os.path.exists(path):
         logger.error("{0} doesn't exist".format(path))
         return
 
-    db = MongoClient(db_host, db_port)[db_name]
-
     logger.info("walking directory " + path)
     file_list = get_file_list(path, ["po", "pot"])
 
-    for fn in file_list:
-        write_po_file(fn, source_language, target_language, db, is_all)
+    if len(file_list) <= 1:
+        db = MongoClient(db_host, db_port)[db_name]
+        for fn in file_list:
+            write_po_file(fn, source_language, target_language, db, is_all)
+        return
+
+    # MongoClient is not fork safe, so each worker process has its own connection.
+    pool = multiprocessing.Pool(pool_size or multiprocessing.cpu_count(),
+                                connect_worker, (db_host, db_port, db_name))
+    try:
+        pool.map(write_po_file_worker,
+                 [(fn, source_language, target_language, is_all) for fn in file_list])
+    finally:
+        pool.close()
+        pool.join()
 
 def generate_fresh_po_text(po_fn, source_language, target_language, db, is_all):
     ''' goes through all of the sentences in a po file in the database and writes them out to a fresh po file
@@ -95,6 +154,19 @@ def generate_fresh_po_text(po_fn, source_language, target_language, db, is_all):
     :param database db: the instance of the database
     :param boolean is_all: whether or not you want all or just approved translations
     '''
+    f = db['files'].find_one({'source_language': source_language,
+                              'target_language': target_language,
+                              'file_path': po_fn},
+                             {'_id': 1})
+    return generate_po_text_for_file(f[u'_id'], target_language, db, is_all)
+
+def generate_po_text_for_file(fileID, target_language, db, is_all):
+    ''' writes out the sentences of the file with the given id to fresh po text
+    :param ObjectId fileID: the id of the file in the database
+    :param string target_language: language to translate to
+    :param database db: the instance of the database
+    :param boolean is_all: whether or not you want all or just approved translations
+    '''
     po = polib.POFile()
     po.metadata = {
         u'Project-Id-Version': 'uMongoDB Manual',
@@ -109,14 +181,11 @@ def generate_fresh_po_text(po_fn, source_language, target_language, db, is_all):
         u'Content-Transfer-Encoding': u'8bit',
         u'Plural-Forms': u'nplurals=2; plural=(n != 1);'
     }
-    f = db['files'].find_one({'source_language': source_language,
-                              'target_language': target_language,
-                              'file_path': po_fn},
-                             {'_id': 1})
-    sentences = db['translations'].find({'fileID': f[u'_id']},
+    sentences = db['translations'].find({'fileID': fileID},
                                         {'_id': 1,
                                          'source_sentence': 1,
                                          'target_sentence': 1,
+                                         'source_location': 1,
                                          'sentenceID': 1,
                                          'status': 1} ).sort('sentence_num', 1)
     for sentence in sentences:
@@ -133,6 +202,58 @@ def generate_fresh_po_text(po_fn, source_language, target_language, db, is_all):
         po.append(entry)
     return getattr(po, '__unicode__')()
 
+def tar_member(name, data):
+    ''' returns a tar header for a regular file followed by its data, padded
+    out to a whole number of tar blocks
+    :param string name: the path of the file in the archive
+    :param string data: the encoded contents of the file
+    '''
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = int(time.time())
+    info.mode = 0o644
+    padding = (tarfile.BLOCKSIZE - len(data) % tarfile.BLOCKSIZE) % tarfile.BLOCKSIZE
+    return info.tobuf(tarfile.GNU_FORMAT) + data + tarfile.NUL * padding
+
+def stream_all_po_files(source_language, target_language, db, is_all, compress=False):
+    ''' goes through all of the files in the database for a pair of languages and
+    yields a tar archive of fresh po files one file at a time, so that only one
+    po file is held in memory at once
+    :param string source_language: language to translate from
+    :param string target_language: language to translate to
+    :param database db: the instance of the database
+    :param boolean is_all: whether or not you want all or just approved translations
+    :param boolean compress: whether or not to gzip the archive
+    '''
+    file_list = db['files'].find({'source_language': source_language,
+                                  'target_language': target_language},
+                                 {'_id': 1, 'file_path': 1}).sort('file_path', 1)
+
+    if compress is True:
+        # wbits of 31 writes a gzip header and trailer
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    else:
+        compressor = None
+
+    size = 0
+    for f in file_list:
+        logger.debug("tarring " + f['file_path'])
+        text = generate_po_text_for_file(f['_id'], target_language, db, is_all)
+        chunk = tar_member(f['file_path'] + '.po', text.encode('utf-8'))
+        size += len(chunk)
+
+        if compressor is not None:
+            chunk = compressor.compress(chunk)
+        if len(chunk) > 0:
+            yield chunk
+
+    # two empty blocks end the archive, which is padded to a whole record
+    size += 2 * tarfile.BLOCKSIZE
+    chunk = tarfile.NUL * (2 * tarfile.BLOCKSIZE + (-size % tarfile.RECORDSIZE))
+    if compressor is not None:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    yield chunk
+
 def generate_all_po_files(source_language, target_language, db, is_all):
     ''' goes through all of the files in the database for a pair of langauges and 
     writes them all out to fresh po files. It then tars them up before returning
@@ -142,18 +263,5 @@ def generate_all_po_files(source_language, target_language, db, is_all):
     :param database db: the instance of the database
     :param boolean is_all: whether or not you want all or just approved translations
     '''
-    file_list = db['files'].find({'source_language': source_language,
-                                  'target_language': target_language},
-                                 {'_id': 1, 'file_path': 1})
-    tar_string = cStringIO.StringIO()
-    tar = tarfile.open(mode='w', fileobj=tar_string)
-    for f in file_list:
-        print("tarring " + f['file_path'])
-        text = generate_fresh_po_text(f['file_path'], source_language, target_language, db, is_all)
-        fake_file = cStringIO.StringIO(text)
-        fake_tarinfo = tarfile.TarInfo(f['file_path']+'.po')
-        fake_tarinfo.size = len(text)
-        tar.addfile(fake_tarinfo, fake_file)
-    tar.close()
-    return tar_string.getvalue()
+    return ''.join(stream_all_po_files(source_language, target_language, db, is_all))
 
@@ -12,15 +12,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import os.path
+import datetime
 import logging
+import multiprocessing
+import os.path
 import re
 import tarfile
+import time
 
 import polib
 from pymongo import MongoClient
 
-from pharaoh.app.models import File, Sentence
+from pharaoh.app.models import File
 from pharaoh.utils import get_file_list
 
 '''
@@ -29,52 +32,217 @@ to mongodb. This is meant to be used after translate_po.py
 The file should have each entry from the given username
 translated and each other entry untranslated. For every group
 of po files you input them with the appropriate username and status
+
+Worker processes parse the po files, and the main process writes the
+sentences of each file to mongodb in batches of unordered bulk upserts.
 '''
 
 logger = logging.getLogger('pharaoh.po_to_mongo')
 
+# number of upserts in each bulk write
+batch_size = 1000
 
-def write_po_file_to_mongo(po_fn, po_file, userID, status, source_language, target_language, db):
-    '''write a po_file to mongodb
-    :param string po_fn: the file name of the current pofile as it should be put in mongodb
+# sentences that are only a role (e.g. :option:`--port`) are approved automatically
+auto_approve_regex = re.compile('^:[a-zA-Z0-9]+:`(?!.*<.*>.*)[^`]*`$')
+
+
+def parse_po_entries(po_file):
+    '''turns the entries of a po file into a list of plain dictionaries
     :param POFile po_file: the polib pofile instance
+    :returns: list of dictionaries with msgid, msgstr, tcomment, occurrences,
+    translated and auto_approved fields
+    '''
+    entries = []
+    for entry in po_file:
+        msgstr = entry.msgstr.encode('utf-8')
+        match = re.match(auto_approve_regex, msgstr)
+        entries.append({'msgid': entry.msgid.encode('utf-8'),
+                        'msgstr': msgstr,
+                        'tcomment': entry.tcomment.encode('utf-8'),
+                        'occurrences': entry.occurrences,
+                        'translated': entry.translated(),
+                        'auto_approved': match is not None and match.group() == msgstr})
+    return entries
+
+
+def parse_po_file(job):
+    '''parses a po file in a worker process
+    :param tuple job: the file name of the po file as it should be put in mongodb,
+    and the path or the content of the po file
+    :returns: tuple of the file name and the entries of the po file
+    '''
+    po_fn, source = job
+    return po_fn, parse_po_entries(polib.pofile(source))
+
+
+class SentenceWriter(object):
+    '''Writes sentences to the translations collection in batches of
+    unordered bulk upserts, keyed on the file, the file edition and the
+    sentenceID, so that importing the same edition again replaces its
+    sentences rather than duplicating them.
+    '''
+    def __init__(self, db):
+        self.db = db
+        self.bulk = None
+        self.pending = 0
+        self.num_written = 0
+        # the latest version of each sentence in the current batch, which
+        # queries can't find until the batch is flushed
+        self.written = {}
+
+    def previous_sentences(self, sentenceIDs, source_language, target_language):
+        '''finds the latest edition of each of the sentences, like
+        models.find_sentence, with a single query
+        :returns: dictionary of sentenceIDs to sentence records
+        '''
+        previous = {}
+        cursor = self.db['translations'].find({'source_language': source_language,
+                                               'target_language': target_language,
+                                               'sentenceID': {'$in': sentenceIDs}}).sort('file_edition', 1)
+        for s in cursor:
+            previous[s[u'sentenceID']] = s
+
+        for sentenceID in sentenceIDs:
+            if sentenceID in self.written:
+                previous[sentenceID] = self.written[sentenceID]
+
+        return previous
+
+    def add(self, sentence):
+        if self.bulk is None:
+            self.bulk = self.db['translations'].initialize_unordered_bulk_op()
+
+        self.bulk.find({'fileID': sentence[u'fileID'],
+                        'file_edition': sentence[u'file_edition'],
+                        'sentenceID': sentence[u'sentenceID']}).upsert().replace_one(sentence)
+        self.written[sentence[u'sentenceID']] = sentence
+        self.pending += 1
+
+        if self.pending >= batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.pending == 0:
+            return
+
+        self.bulk.execute()
+        self.num_written += self.pending
+        self.bulk = None
+        self.pending = 0
+        self.written = {}
+
+
+def write_po_entries_to_mongo(po_fn, entries, userID, status, source_language, target_language, writer):
+    '''write the entries of a po file to mongodb
+    :param string po_fn: the file name of the current pofile as it should be put in mongodb
+    :param list entries: the entries of the po file, from parse_po_entries
     :param string userID: the ID of the user that translated the po file
     :param string status: the status of the translations
     :param string source_language: The source_language of the translations
     :param string target_language: The target_language of the translations
-    :param database db: the database that you want to write to
+    :param SentenceWriter writer: the writer for the database that you want to write to
     '''
     logger.info(po_fn)
     f = File({u'file_path': po_fn,
               u'priority': 0,
               u'source_language': source_language,
-              u'target_language': target_language}, curr_db=db)
+              u'target_language': target_language}, curr_db=writer.db)
+
+    previous = writer.previous_sentences([entry['tcomment'] for entry in entries],
+                                         source_language, target_language)
 
-    reg = re.compile('^:[a-zA-Z0-9]+:`(?!.*<.*>.*)[^`]*`$')
-    for idx, entry in enumerate(po_file):
-        if entry.translated():
+    for idx, entry in enumerate(entries):
+        if entry['translated']:
             sentence_status = status
             # If sentence should be autoapproved, do so
-            match = re.match(reg, entry.msgstr.encode('utf-8'))
-            if match is not None and match.group() == entry.msgstr.encode('utf-8'):
+            if entry['auto_approved']:
                 sentence_status = "approved"
         else:
             sentence_status = "untranslated"
 
-        t = Sentence({u'source_language': source_language,
-                      u'source_sentence': entry.msgid.encode('utf-8'),
-                      u'sentenceID': entry.tcomment.encode('utf-8'),
-                      u'source_location': entry.occurrences,
-                      u'sentence_num': idx,
-                      u'fileID': f._id,
-                      u'file_edition': f.edition,
-                      u'target_sentence': entry.msgstr.encode('utf-8'),
-                      u'target_language': target_language,
-                      u'userID': userID,
-                      u'status': sentence_status,
-                      u'update_number': 0}, curr_db=db)
-        t.save()
-    f.get_num_sentences()
+        sentence = {u'created_at': datetime.datetime.utcnow(),
+                    u'source_language': source_language,
+                    u'source_sentence': entry['msgid'],
+                    u'sentenceID': entry['tcomment'],
+                    u'source_location': entry['occurrences'],
+                    u'sentence_num': idx,
+                    u'fileID': f._id,
+                    u'file_edition': f.edition,
+                    u'target_sentence': entry['msgstr'],
+                    u'target_language': target_language,
+                    u'userID': userID,
+                    u'status': sentence_status,
+                    u'update_number': 0,
+                    u'approvers': []}
+
+        s = previous.get(entry['tcomment'])
+        if s is not None:
+            # If it's there and not approved, use the old version; if the new one is approved use the new one
+            if not(sentence_status == 'approved' or (s[u'status'] == 'untranslated' and sentence_status != 'untranslated')):
+                s = dict(s)
+                s.pop(u'_id', None)
+                s[u'sentence_num'] = idx
+                s[u'fileID'] = f._id
+                s[u'file_edition'] = f.edition
+                sentence = s
+
+        writer.add(sentence)
+
+    f.state[u'num_sentences'] = len(entries)
+    f.save()
+
+
+def write_po_file_to_mongo(po_fn, po_file, userID, status, source_language, target_language, db):
+    '''write a po_file to mongodb
+    :param string po_fn: the file name of the current pofile as it should be put in mongodb
+    :param POFile po_file: the polib pofile instance
+    :param string userID: the ID of the user that translated the po file
+    :param string status: the status of the translations
+    :param string source_language: The source_language of the translations
+    :param string target_language: The target_language of the translations
+    :param database db: the database that you want to write to
+    '''
+    writer = SentenceWriter(db)
+    write_po_entries_to_mongo(po_fn, parse_po_entries(po_file), userID, status,
+                              source_language, target_language, writer)
+    writer.flush()
+
+
+def write_po_files_to_mongo(jobs, userID, status, source_language, target_language, db, pool_size=None):
+    '''parse po files in worker processes, and write their sentences to mongodb
+    :param list jobs: list of tuples of the file name of each po file as it
+    should be put in mongodb, and the path or the content of the po file
+    :param string userID: the ID of the user that translated the po files
+    :param string status: the status of the translations
+    :param string source_language: The source_language of the translations
+    :param string target_language: The target_language of the translations
+    :param database db: the database that you want to write to
+    :param int pool_size: the number of worker processes
+    '''
+    start = time.time()
+    writer = SentenceWriter(db)
+
+    if len(jobs) <= 1:
+        pool = None
+        results = [parse_po_file(job) for job in jobs]
+    else:
+        pool = multiprocessing.Pool(pool_size or multiprocessing.cpu_count())
+        results = pool.imap(parse_po_file, jobs, chunksize=4)
+
+    try:
+        for po_fn, entries in results:
+            write_po_entries_to_mongo(po_fn, entries, userID, status, source_language,
+                                      target_language, writer)
+        writer.flush()
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    seconds = time.time() - start
+    logger.info('imported {0} sentences from {1} files in {2:.1f} seconds ({3:.1f} sentences/second)'.format(
+        writer.num_written, len(jobs), seconds, writer.num_written / max(seconds, 0.001)))
+
 
 def put_po_files_in_mongo(path, username, status, source_language, target_language, db_host, db_port, db_name):
     '''go through directories and write the po file to mongo
@@ -98,15 +266,9 @@ def put_po_files_in_mongo(path, username, status, source_language, target_langua
 
     logger.info("walking directory " + path)
     file_list = get_file_list(path, ["po", "pot"])
-    if len(file_list) == 1:
-        path = os.path.dirname(path)
 
-    for fn in file_list:
-        po = polib.pofile(fn)
-        rel_fn = os.path.relpath(fn, path)
-        rel_fn = os.path.splitext(rel_fn)[0]
-        write_po_file_to_mongo(fn, po, userID, status, source_language,
-                               target_language, db)
+    write_po_files_to_mongo([(fn, fn) for fn in file_list], userID, status,
+                            source_language, target_language, db)
 
 
 def put_po_data_in_mongo(po_tar, username, status, source_language, target_language, db):
@@ -119,12 +281,14 @@ def put_po_data_in_mongo(po_tar, username, status, source_language, target_langu
     :param database db: the mongodb database
     '''
 
+    userID = db['users'].find_one({'username': username})[u'_id']
+
+    jobs = []
     tar = tarfile.open(fileobj=po_tar)
     for member in tar.getmembers():
         if os.path.splitext(member.name)[1] not in ['.po', '.pot']:
             continue
         po_file = tar.extractfile(member)
-        po = polib.pofile(po_file.read())
-        userID = db['users'].find_one({'username': username})[u'_id']
-        write_po_file_to_mongo(os.path.splitext(member.name)[0], po, userID, status, source_language,
-                               target_language, db)
+        jobs.append((os.path.splitext(member.name)[0], po_file.read()))
+
+    write_po_files_to_mongo(jobs, userID, status, source_language, target_language, db)
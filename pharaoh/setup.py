@@ -2,7 +2,7 @@ import pharaoh
 
 from setuptools import setup, find_packages
 
-REQUIRES = ['argh', 'polib', 'flask', 'gunicorn', 'pymongo', 'pyyaml',
+REQUIRES = ['argh', 'polib', 'flask', 'gunicorn', 'pymongo>=3.0', 'pyyaml',
             'flask-environments']
 
 setup(